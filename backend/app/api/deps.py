@@ -1,21 +1,64 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.session import get_async_session
+from app.db.session import get_async_session, pin_to_primary, read_session_maker
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login")
 
 
+# Запросы, после которых чтения пользователя не идут на реплику
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def _token_user_id(token: str) -> int | None:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return None
+
+
+async def get_user_read_session(token: str = Depends(oauth2_scheme)) -> AsyncSession:
+    """
+    Dependency для GET endpoints: сессия на реплике
+
+    На primary, если реплика отстает или пользователь недавно что-то изменил
+    (иначе только что созданный сайт может еще не дойти до реплики).
+    """
+    session_maker = await read_session_maker(_token_user_id(token))
+    async with session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def get_current_user(
+        request: Request,
         db: AsyncSession = Depends(get_async_session),
         token: str = Depends(oauth2_scheme)
 ) -> User:
     """Get current authenticated user"""
+    user = await _authenticate(db, token)
+    if request.method not in READ_ONLY_METHODS:
+        await pin_to_primary(user.id)
+    return user
+
+
+async def get_current_reader(
+        db: AsyncSession = Depends(get_user_read_session),
+        token: str = Depends(oauth2_scheme)
+) -> User:
+    """Текущий пользователь для GET endpoints: загружается той же сессией чтения, что и данные"""
+    return await _authenticate(db, token)
+
+
+async def _authenticate(db: AsyncSession, token: str) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -40,4 +83,14 @@ async def get_current_user(
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Get current user and require admin rights"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Query, status
+
+from app.api.deps import get_current_admin
+from app.core.config import settings
+from app.db import profiling
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get("/queries")
+async def get_query_stats(
+        limit: int = Query(default=20, ge=1, le=200),
+        order_by: str = Query(default="total_ms", description="Sort field: total_ms, avg_ms, max_ms, calls, rows"),
+        current_user: User = Depends(get_current_admin)
+):
+    """Топ SQL запросов всех процессов (API и воркеры) по времени выполнения"""
+    if order_by not in ["total_ms", "avg_ms", "max_ms", "calls", "rows", "slow_calls"]:
+        order_by = "total_ms"
+
+    return {
+        "enabled": settings.SQL_PROFILING,
+        "slow_query_threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "queries": await profiling.get_top_queries(limit, order_by)
+    }
+
+
+@router.delete("/queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_query_stats(current_user: User = Depends(get_current_admin)):
+    """Сбросить накопленную статистику SQL запросов"""
+    await profiling.reset_stats()
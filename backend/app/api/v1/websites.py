@@ -15,9 +15,10 @@ from app.schemas.website import (
     WebsiteCheckResponse,
     WebsiteListResponse
 )
-from app.api.deps import get_current_user
+from app.api.deps import get_current_reader, get_current_user, get_user_read_session
 from app.core.logger import get_logger
-from app.tasks.monitor import check_website, stop_website_monitoring
+from app.services.site_state import discard_state, overlay_live_state, update_state
+from app.tasks.dispatch import schedule_check, stop_website_monitoring
 from app.services.telegram import validate_telegram_chat_id
 
 router = APIRouter()
@@ -49,6 +50,7 @@ async def create_website(
         timeout=website_data.timeout,
         telegram_chat_id=website_data.telegram_chat_id,
         check_interval=website_data.check_interval,
+        http2=website_data.http2,
         status="pending"
     )
 
@@ -57,7 +59,7 @@ async def create_website(
     await db.refresh(new_website)
 
     # Запускаем первую проверку асинхронно
-    check_website.delay(new_website.id)
+    await schedule_check(new_website.id)
 
     logger.info(f"Website {new_website.id} created by user {current_user.id}")
     return new_website
@@ -65,8 +67,8 @@ async def create_website(
 
 @router.get("/", response_model=WebsiteListResponse)
 async def get_websites(
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_reader),
+        db: AsyncSession = Depends(get_user_read_session),
         page: int = Query(default=1, ge=1, description="Page number"),
         page_size: int = Query(default=10, ge=1, le=100, description="Items per page"),
         sort_by: Optional[str] = Query(default="created_at",
@@ -104,6 +106,8 @@ async def get_websites(
 
     result = await db.execute(query)
     websites = result.scalars().all()
+    # Сортировка по status/last_check идет по БД: при SITE_STATE_STORE=redis она отстает на период записи
+    await overlay_live_state(websites)
 
     return WebsiteListResponse(
         items=websites,
@@ -117,8 +121,8 @@ async def get_websites(
 @router.get("/{website_id}", response_model=WebsiteResponse)
 async def get_website(
         website_id: int,
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_async_session)
+        current_user: User = Depends(get_current_reader),
+        db: AsyncSession = Depends(get_user_read_session)
 ):
     """Получить конкретный сайт"""
 
@@ -136,6 +140,7 @@ async def get_website(
             detail="Website not found"
         )
 
+    await overlay_live_state([website])
     return website
 
 
@@ -178,6 +183,7 @@ async def update_website(
 
     await db.commit()
     await db.refresh(website)
+    await overlay_live_state([website])
 
     logger.info(f"Website {website_id} updated by user {current_user.id}")
     return website
@@ -206,12 +212,14 @@ async def stop_website(
         )
 
     # Останавливаем мониторинг через Celery
-    stop_website_monitoring.delay(website_id)
+    stop_website_monitoring(website_id)
 
     website.status = "stopped"
     website.is_active = False
     await db.commit()
     await db.refresh(website)
+    await update_state(website_id, status="stopped")
+    await overlay_live_state([website])
 
     logger.info(f"Website {website_id} stopped by user {current_user.id}")
     return website
@@ -244,9 +252,11 @@ async def start_website(
     website.consecutive_failures = 0
     await db.commit()
     await db.refresh(website)
+    await update_state(website_id, status="pending", consecutive_failures=0)
+    await overlay_live_state([website])
 
     # Запускаем проверку
-    check_website.delay(website_id)
+    await schedule_check(website_id)
 
     logger.info(f"Website {website_id} started by user {current_user.id}")
     return website
@@ -274,10 +284,12 @@ async def check_website_now(
             detail="Website not found"
         )
 
-    # Запускаем проверку
-    check_website.delay(website_id)
-
-    logger.info(f"Manual check triggered for website {website_id}")
+    # Запускаем проверку, если она уже не в очереди
+    if await schedule_check(website_id):
+        logger.info(f"Manual check triggered for website {website_id}")
+    else:
+        logger.info(f"Manual check for website {website_id} skipped: check already in flight")
+    await overlay_live_state([website])
     return website
 
 
@@ -304,13 +316,14 @@ async def delete_website(
         )
 
     # Останавливаем мониторинг
-    stop_website_monitoring.delay(website_id)
+    stop_website_monitoring(website_id)
 
     # Удаляем из БД
     await db.execute(
         delete(Website).where(Website.id == website_id)
     )
     await db.commit()
+    await discard_state(website_id)
 
     logger.info(f"Website {website_id} deleted by user {current_user.id}")
 
@@ -318,8 +331,8 @@ async def delete_website(
 @router.get("/{website_id}/stats", response_model=WebsiteStatsResponse)
 async def get_website_stats(
         website_id: int,
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_async_session)
+        current_user: User = Depends(get_current_reader),
+        db: AsyncSession = Depends(get_user_read_session)
 ):
     """Получить статистику по сайту"""
 
@@ -367,6 +380,7 @@ async def get_website_stats(
     avg_response = result_avg.scalar()
 
     # Uptime percentage
+    await overlay_live_state([website])
     uptime = 0.0
     if website.total_checks > 0:
         uptime = ((website.total_checks - website.failed_checks) / website.total_checks) * 100
@@ -386,8 +400,8 @@ async def get_website_stats(
 async def get_website_history(
         website_id: int,
         limit: int = Query(default=100, le=1000),
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_async_session)
+        current_user: User = Depends(get_current_reader),
+        db: AsyncSession = Depends(get_user_read_session)
 ):
     """Получить историю проверок сайта"""
 
@@ -1,12 +1,22 @@
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 from app.core.config import settings
+from app.core.logger import stop_logging
+from app.core.metrics import mark_process_dead
+
+# Очереди по классам задач; у каждой свой воркер со своей concurrency,
+# чтобы ручные проверки не ждали за плановым обходом, а обслуживание - за проверками
+INTERACTIVE_QUEUE = "interactive"  # Проверки по запросу пользователя (check-now, новый сайт)
+SCHEDULED_QUEUE = "scheduled"  # Плановые проверки
+MAINTENANCE_QUEUE = "maintenance"  # Тик планировщика, очистка, остановка мониторинга
+NOTIFICATIONS_QUEUE = "notifications"  # Отправка уведомлений в Telegram
 
 celery_app = Celery(
     "website_monitor",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.tasks.monitor"]
+    include=["app.tasks.monitor", "app.tasks.notifications"]
 )
 
 celery_app.conf.update(
@@ -15,26 +25,46 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    task_track_started=True,
+    # Результаты задач никто не читает: не пишем их в Redis (ни STARTED, ни SUCCESS),
+    # а при постановке задачи не подписываемся на канал результата.
+    # Задача, которой результат нужен, может включить его через ignore_result=False
+    task_ignore_result=True,
+    task_store_errors_even_if_ignored=False,
     task_time_limit=300,
     task_soft_time_limit=240,
     worker_prefetch_multiplier=1,  # Уменьшено для избежания проблем с пулом
     worker_max_tasks_per_child=100,  # Уменьшено для перезапуска воркеров
     broker_connection_retry_on_startup=True,
-    broker_pool_limit=None,  # Отключаем лимит пула брокера
+    # None отключает пул полностью: каждая постановка задачи открывала новое соединение.
+    # Пул переиспользует соединения (API, планировщик)
+    broker_pool_limit=10,
     result_backend_transport_options={
         'master_name': 'mymaster',
     },
     # Настройки для лучшей работы с async
     worker_pool='prefork',  # Используем prefork для изоляции
     worker_concurrency=2,  # Ограничиваем количество воркеров
+    # check_website по умолчанию идет в плановую очередь,
+    # ручные проверки ставятся в interactive явно (schedule_check)
+    task_default_queue=SCHEDULED_QUEUE,
+    task_routes={
+        "app.tasks.notifications.*": {"queue": NOTIFICATIONS_QUEUE},
+        "app.tasks.monitor.check_all_websites": {"queue": MAINTENANCE_QUEUE},
+        "app.tasks.monitor.cleanup_old_checks": {"queue": MAINTENANCE_QUEUE},
+        "app.tasks.monitor.flush_site_state": {"queue": MAINTENANCE_QUEUE},
+        "app.tasks.monitor.stop_website_monitoring": {"queue": MAINTENANCE_QUEUE},
+    },
 )
 
 # Динамическое расписание для мониторинга
 celery_app.conf.beat_schedule = {
     "check-all-websites": {
         "task": "app.tasks.monitor.check_all_websites",
-        "schedule": 60.0,  # Каждую минуту проверяем, какие сайты нужно проверить
+        "schedule": float(settings.SCHEDULER_INTERVAL),  # Каждую минуту проверяем, какие сайты нужно проверить
+    },
+    "drain-notification-outbox": {
+        "task": "app.tasks.notifications.drain_notification_outbox",
+        "schedule": 5.0,  # Отправка уведомлений из outbox
     },
     "cleanup-old-checks": {
         "task": "app.tasks.monitor.cleanup_old_checks",
@@ -42,5 +72,24 @@ celery_app.conf.beat_schedule = {
     },
 }
 
-# Для запуска воркера: celery -A app.core.celery_app worker --loglevel=info
+if settings.SITE_STATE_STORE == "redis":
+    celery_app.conf.beat_schedule["flush-site-state"] = {
+        "task": "app.tasks.monitor.flush_site_state",
+        "schedule": settings.SITE_STATE_FLUSH_INTERVAL,  # Запись состояния сайтов из Redis в БД
+    }
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(pid=None, **kwargs):
+    """Убирает метрики завершившегося prefork-процесса и дописывает его логи"""
+    mark_process_dead(pid)
+    # Процесс выходит через os._exit (worker_max_tasks_per_child), atexit не сработает
+    stop_logging()
+
+
+# Для запуска воркеров (по одному на класс очередей):
+#   celery -A app.core.celery_app worker -Q interactive -n interactive@%h --concurrency=2
+#   celery -A app.core.celery_app worker -Q scheduled -n scheduled@%h --concurrency=4
+#   celery -A app.core.celery_app worker -Q maintenance -n maintenance@%h --concurrency=2
+#   celery -A app.core.celery_app worker -Q notifications -n notifier@%h --concurrency=2
 # Для запуска beat: celery -A app.core.celery_app beat --loglevel=info
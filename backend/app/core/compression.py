@@ -0,0 +1,124 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен, остается только gzip
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Кодировки из Accept-Encoding с их q (gzip;q=0.5, br;q=0 - отказ от br)"""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        token, *params = item.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[token] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов с выбором кодировки по Accept-Encoding.
+
+    Brotli используется если клиент его поддерживает и библиотека установлена,
+    иначе запрос передается в стандартный GZipMiddleware.
+    Ответы меньше minimum_size отдаются без сжатия.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            gzip_level: int = 6,
+            brotli_quality: int = 4
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("Accept-Encoding", "")
+        if brotli is not None and accepted_encodings(accept_encoding).get("br", 0.0) > 0:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+            await responder(scope, receive, send)
+            return
+
+        await self.gzip(scope, receive, send)
+
+
+class BrotliResponder:
+    """
+    Буферизует тело ответа и сжимает его brotli целиком
+
+    Потоковые ответы (несколько сообщений тела без Content-Length) отдаются
+    без сжатия, чтобы не держать весь поток в памяти.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self.send: Send = None
+        self.start_message: Message = None
+        self.body = bytearray()
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_brotli)
+
+    async def send_with_brotli(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            # Уже сжатые ответы не трогаем
+            self.passthrough = "content-encoding" in headers
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        more_body = message.get("more_body", False)
+        if self.start_message is not None and not self.body and more_body:
+            # Первое сообщение потокового ответа: сжимаем, только если размер известен
+            self.passthrough = self.passthrough or "content-length" not in Headers(raw=self.start_message["headers"])
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        self.body.extend(message.get("body", b""))
+        if more_body:
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body = bytes(self.body)
+        if len(body) >= self.minimum_size:
+            body = brotli.compress(body, quality=self.quality)
+            headers["Content-Encoding"] = "br"
+            headers.add_vary_header("Accept-Encoding")
+        headers["Content-Length"] = str(len(body))
+
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": body})
@@ -20,6 +20,22 @@ class Settings(BaseSettings):
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    # Read replica (опционально, для GET запросов дашборда)
+    POSTGRES_REPLICA_HOST: str = ""
+    POSTGRES_REPLICA_PORT: int = 5432
+    REPLICA_MAX_LAG_SECONDS: float = 10.0  # При большем отставании чтение идет с primary
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # Как часто проверять отставание реплики
+
+    @property
+    def REPLICA_DATABASE_URL(self) -> str | None:
+        if not self.POSTGRES_REPLICA_HOST:
+            return None
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_REPLICA_HOST}:{self.POSTGRES_REPLICA_PORT}/{self.POSTGRES_DB}"
+
+    # SQL profiling
+    SQL_PROFILING: bool = False  # Сбор статистики по запросам и лог медленных запросов
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0  # Порог медленного запроса (мс)
+
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -30,12 +46,24 @@ class Settings(BaseSettings):
 
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text или json (одна JSON-строка на запись)
+    LOG_QUEUE_SIZE: int = 10000  # Записей в очереди лога; при переполнении записи отбрасываются
+    LOG_SAMPLE_RATES: dict[str, float] = {"tasks.monitor": 0.1}  # Доля записываемых строк об успешных проверках
+
+    # API responses
+    FAST_JSON_RESPONSES: bool = False  # Сериализация ответов через orjson
+    RESPONSE_COMPRESSION: bool = True  # gzip/brotli для больших ответов
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # Минимальный размер ответа для сжатия (байт)
 
     # Celery
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
 
+    @property
+    def REDIS_URL(self) -> str:
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
+
     @property
     def CELERY_BROKER_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
@@ -46,11 +74,67 @@ class Settings(BaseSettings):
 
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = ""  # Токен бота для уведомлений
+    TELEGRAM_GLOBAL_RATE: float = 25.0  # Сообщений в секунду на бота (лимит Telegram ~30)
+    TELEGRAM_CHAT_RATE: float = 1.0  # Сообщений в секунду в один чат
+    TELEGRAM_CHAT_CACHE_TTL: int = 3600  # Сколько секунд помнить валидный chat ID
+    TELEGRAM_CHAT_NEGATIVE_TTL: int = 30  # Сколько секунд помнить невалидный chat ID (кроме "chat not found")
+
+    # Notification outbox
+    NOTIFICATION_BATCH_SIZE: int = 100  # Сколько чатов (со всеми их уведомлениями) захватывать за раз
+    NOTIFICATION_LEASE_SECONDS: int = 300  # Через сколько незавершенная отправка станет доступна снова
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_BACKOFF: int = 30  # Базовая задержка повтора (секунды), удваивается
+    NOTIFICATION_DIGEST_WINDOW: int = 30  # Окно (секунды) объединения событий одного чата в сводку
+    NOTIFICATION_SEND_CONCURRENCY: int = 10  # Сколько чатов drainer отправляет одновременно
 
     # Monitoring defaults
     DEFAULT_CHECK_INTERVAL: int = 300  # 5 минут
     DEFAULT_TIMEOUT: int = 30  # 30 секунд
     MAX_CONCURRENT_CHECKS: int = 100  # Максимум одновременных проверок
+    CHECK_LEASE_TTL: int = 600  # Сколько секунд сайт считается "в очереди" без завершения проверки
+    INTERACTIVE_CHECK_SLO: float = 15.0  # Цель (секунды) от нажатия "Check now" до результата проверки
+
+    # Scheduler
+    SCHEDULER_INTERVAL: int = 60  # Период тика check_all_websites (секунды)
+    SCHEDULER_TARGET_BACKLOG: int = 60  # Сколько секунд работы воркеров держать в очереди
+    SCHEDULER_MIN_DISPATCH: int = 50  # Минимум проверок за тик, пока нет оценки пропускной способности
+    SCHEDULER_MAX_DISPATCH: int = 5000  # Максимум проверок за тик
+    SCHEDULER_USER_QUANTUM: float = 5.0  # Секунд работы воркера на пользователя за раунд распределения
+    SCHEDULER_USER_MAX_IN_FLIGHT: int = 200  # Максимум проверок одного пользователя в очереди
+    SCHEDULE_LOAD_BATCH: int = 10000  # Строк за одно чтение server-side cursor при загрузке расписания
+
+    # Probe daemon (python -m app.probe)
+    CHECK_RUNNER: str = "celery"  # Кто выполняет плановые проверки: celery или probe
+    PROBE_CONCURRENCY: int = 1000  # Одновременных проверок на процесс
+    PROBE_POLL_INTERVAL: float = 5.0  # Как часто (секунды) выбирать сайты, которые пора проверить
+    PROBE_DRAIN_TIMEOUT: float = 60.0  # Сколько ждать завершения начатых проверок при остановке
+    PROBE_SCHEDULE_RELOAD: float = 60.0  # Как часто (секунды) перечитывать расписание из БД
+    PROBE_HTTP2: bool = True  # HTTP/2 и multiplexing проверок одного origin в одном соединении
+
+    # DNS cache (app.services.dns_cache)
+    DNS_CACHE_ENABLED: bool = True  # Кэшировать резолв имен проверяемых сайтов в процессе воркера
+    DNS_MIN_TTL: int = 30  # Нижняя граница TTL записи в кэше (секунды)
+    DNS_MAX_TTL: int = 3600  # Верхняя граница TTL записи в кэше
+    DNS_DEFAULT_TTL: int = 300  # TTL, если резолвер его не сообщает (getaddrinfo без dnspython)
+    DNS_NEGATIVE_TTL: int = 60  # Сколько помнить NXDOMAIN
+    DNS_TIMEOUT: float = 5.0  # Таймаут резолва одного имени
+    DNS_CACHE_SIZE: int = 100000  # Максимум имен в кэше
+
+    # Live website state (app.services.site_state)
+    SITE_STATE_STORE: str = "postgres"  # postgres или redis - состояние в Redis, запись в БД пачками
+    SITE_STATE_FLUSH_INTERVAL: float = 10.0  # Период записи состояния из Redis в БД (секунды)
+    SITE_STATE_FLUSH_BATCH: int = 1000  # Сайтов в одном UPDATE
+    SITE_STATE_TTL: int = 86400  # Сколько хранить в Redis уже записанное в БД состояние
+
+    # Tracing (app.core.tracing)
+    TRACE_EXPORTER: str = ""  # file, console или пусто - трассировка выключена
+    TRACE_SAMPLE_RATE: float = 0.01  # Доля проверок, трассы которых записываются
+    TRACE_SLOW_THRESHOLD: float = 10.0  # Трассы дольше (секунды) пишутся всегда; 0 - только выборка
+    TRACE_FILE: str = "logs/traces.jsonl"  # Файл для TRACE_EXPORTER=file
+
+    # Health checks
+    HEALTH_CACHE_TTL: float = 5.0  # Сколько секунд кэшировать результаты проверок зависимостей
+    HEALTH_PROBE_TIMEOUT: float = 2.0  # Таймаут проверки одной зависимости
 
     USER_AGENT: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36"
 
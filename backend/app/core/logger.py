@@ -1,36 +1,193 @@
+"""
+Логирование приложения
+
+Логгеры приложения не пишут в файл и консоль сами: запись кладется в очередь
+(QueueHandler), а выводом занимается отдельный поток (QueueListener), поэтому
+event loop не ждет файлового I/O. При переполнении очереди (LOG_QUEUE_SIZE)
+записи отбрасываются, а не блокируют вызывающий код.
+
+LOG_FORMAT=json - одна JSON-строка на запись, поля из extra= попадают в JSON.
+
+Массовые строки об успешных проверках помечаются extra=SAMPLED и пишутся с
+вероятностью из LOG_SAMPLE_RATES (по имени логгера, например {"tasks.monitor": 0.1}).
+Строки без пометки и все записи WARNING и выше пишутся всегда.
+
+Трассы (TRACE_EXPORTER=file) идут через ту же очередь: логгер TRACE_LOGGER
+пишет только в TRACE_FILE, без оформления.
+"""
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+
 from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
 
-# Create logs directory
-Path("logs").mkdir(exist_ok=True)
+# Пометка записи, которую можно отбросить выборкой: logger.info(..., extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+ROOT_LOGGER = "telegram_monitor"
+# Экспорт трасс в TRACE_FILE (app.core.tracing)
+TRACE_LOGGER = f"{ROOT_LOGGER}.trace_export"
 
 # Configure logging format
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-# Create formatters
-formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+_exception_formatter = logging.Formatter()
+
+# Атрибуты LogRecord, которые не считаются полями extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает помеченные SAMPLED записи с вероятностью, заданной для логгера"""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Самый длинный префикс - первым
+        self.rates = sorted(
+            ((f"{ROOT_LOGGER}.{name}", rate) for name, rate in rates.items()),
+            key=lambda item: len(item[0]), reverse=True
+        )
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                if random.random() < rate:
+                    return True
+                LOG_RECORDS_DROPPED.labels("sampled").inc()
+                return False
+        return True
+
+
+class ExcludeFilter(logging.Filter):
+    """Отбрасывает записи логгера name и его потомков"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
+
+
+class LazyFileHandler(logging.FileHandler):
+    """Файл лога (и его каталог) создается при первой записи, а не при импорте"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename, encoding="utf-8", delay=True)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler, который отбрасывает запись при переполненной очереди"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и traceback готовятся в вызывающем потоке, оформление - в потоке вывода
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+
+def _build_handlers() -> list[logging.Handler]:
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+
+    # Console handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    # File handler
+    file_handler = LazyFileHandler("logs/app.log")
+    file_handler.setFormatter(formatter)
+    handlers = [console_handler, file_handler]
+    for handler in handlers:
+        handler.addFilter(ExcludeFilter(TRACE_LOGGER))
+
+    # Трассы: JSON Lines в TRACE_FILE
+    if settings.TRACE_EXPORTER == "file":
+        trace_handler = LazyFileHandler(settings.TRACE_FILE)
+        trace_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_handler.addFilter(logging.Filter(TRACE_LOGGER))
+        handlers.append(trace_handler)
+    return handlers
+
+
+_handlers = _build_handlers()
+_queue_handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+_queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATES))
+_listener: QueueListener | None = None
+
+
+def _start_listener() -> None:
+    """Запускает поток вывода логов (заново - в дочернем процессе после fork)"""
+    global _listener
+    _queue_handler.queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(_queue_handler.queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Останавливает поток вывода, дописав накопившиеся записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
-# Console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(formatter)
 
-# File handler
-file_handler = logging.FileHandler("logs/app.log")
-file_handler.setFormatter(formatter)
+_start_listener()
+atexit.register(stop_logging)
+# Поток не переживает fork (prefork-воркеры Celery): в дочернем процессе запускаем свой
+os.register_at_fork(after_in_child=_start_listener)
 
-# Configure root logger
+# Configure root logger: сторонние библиотеки пишут через ту же очередь
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
-    handlers=[console_handler, file_handler]
+    handlers=[_queue_handler]
 )
 
 # Create logger instance
-logger = logging.getLogger("telegram_monitor")
+# Свой обработчик у логгера приложения: Celery заменяет обработчики root-логгера в воркерах
+logger = logging.getLogger(ROOT_LOGGER)
+logger.addHandler(_queue_handler)
+logger.propagate = False
 
 
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance with the given name"""
-    return logging.getLogger(f"telegram_monitor.{name}")
\ No newline at end of file
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
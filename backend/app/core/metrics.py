@@ -0,0 +1,315 @@
+"""
+Метрики Prometheus
+
+Для сбора метрик со всех процессов (воркеры uvicorn и prefork-процессы Celery)
+задайте переменную окружения PROMETHEUS_MULTIPROC_DIR до запуска процессов:
+каждый процесс пишет свои значения в этот каталог, а /metrics агрегирует их.
+Без переменной метрики собираются только текущим процессом.
+
+В docker-compose у каждого контейнера свой подкаталог общего тома
+(docker-entrypoint.sh очищает его при запуске), а /metrics собирает файлы
+всех подкаталогов PROMETHEUS_MULTIPROC_ROOT.
+"""
+import glob
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Бакеты для сетевых задержек: от 5 мс до 60 с
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CHECKS_TOTAL = Counter(
+    "website_checks_total",
+    "Выполненные проверки сайтов по результату",
+    ["result"]
+)
+
+PROBE_DURATION = Histogram(
+    "website_probe_duration_seconds",
+    "Длительность HTTP проверки по фазам (dns, connect, tls, ttfb, transfer, total)",
+    ["phase"],
+    buckets=LATENCY_BUCKETS
+)
+
+PROBE_CONNECTIONS = Counter(
+    "website_probe_connections_total",
+    "Новые соединения, открытые проверками, по версии HTTP (HTTP/2 переиспользует соединение origin)",
+    ["http_version"]
+)
+
+PROBE_HTTP2_FALLBACKS = Counter(
+    "website_probe_http2_fallbacks_total",
+    "Проверки, повторенные по HTTP/1.1 после ошибки протокола HTTP/2"
+)
+
+DNS_CACHE_LOOKUPS = Counter(
+    "website_probe_dns_cache_lookups_total",
+    "Обращения проверок к DNS-кэшу: hit, negative_hit (NXDOMAIN из кэша), miss, shared (ожидание уже идущего резолва)",
+    ["result"]
+)
+
+DNS_RESOLVE_DURATION = Histogram(
+    "website_probe_dns_resolve_duration_seconds",
+    "Длительность резолва имени при промахе DNS-кэша",
+    buckets=LATENCY_BUCKETS
+)
+
+DNS_CACHE_SIZE = Gauge(
+    "website_probe_dns_cache_entries",
+    "Имен в DNS-кэше процесса (включая NXDOMAIN)",
+    multiprocess_mode="max"
+)
+
+CHECKS_DEDUPLICATED = Counter(
+    "website_checks_deduplicated_total",
+    "Проверки, не поставленные в очередь, потому что проверка сайта уже в очереди или выполняется",
+    ["source"]
+)
+
+CHECK_LATENCY = Histogram(
+    "website_check_latency_seconds",
+    "Время от постановки проверки в очередь до ее завершения, по очереди",
+    ["queue"],
+    buckets=(0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300, 600)
+)
+
+CHECK_SLO_VIOLATIONS = Counter(
+    "website_check_slo_violations_total",
+    "Ручные проверки, завершившиеся позже INTERACTIVE_CHECK_SLO",
+    ["queue"]
+)
+
+SCHEDULER_LAG = Histogram(
+    "website_check_scheduler_lag_seconds",
+    "Задержка начала проверки относительно времени, когда она должна была начаться",
+    buckets=(0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+SCHEDULER_DUE = Gauge(
+    "scheduler_due_websites",
+    "Сайты, которые пора проверить, на последнем тике планировщика",
+    multiprocess_mode="mostrecent"
+)
+
+SCHEDULER_DEFERRED = Gauge(
+    "scheduler_deferred_websites",
+    "Сайты, отложенные на следующий тик из-за нехватки мощности воркеров",
+    multiprocess_mode="mostrecent"
+)
+
+SCHEDULER_THROUGHPUT = Gauge(
+    "scheduler_worker_throughput",
+    "Оценка пропускной способности воркеров, проверок в секунду",
+    multiprocess_mode="mostrecent"
+)
+
+SCHEDULER_MAX_OVERDUE = Gauge(
+    "scheduler_max_overdue_seconds",
+    "На сколько секунд просрочена самая старая проверка, которую пора выполнить",
+    multiprocess_mode="mostrecent"
+)
+
+# Метка rank (1..SCHEDULER_LAG_TOP_USERS), а не user_id: в multiprocess-режиме серии
+# не удаляются (clear() не трогает файлы процессов), и число пользователей раздувало бы их
+SCHEDULER_USER_MAX_OVERDUE = Gauge(
+    "scheduler_user_max_overdue_seconds",
+    "Самая просроченная проверка N-го по отставанию пользователя на последнем тике планировщика",
+    ["rank"],
+    multiprocess_mode="mostrecent"
+)
+
+SCHEDULER_USER_DEFERRED = Gauge(
+    "scheduler_user_deferred_websites",
+    "Сайты N-го по отставанию пользователя, отложенные на следующий тик (backpressure, лимит на пользователя)",
+    ["rank"],
+    multiprocess_mode="mostrecent"
+)
+
+SCHEDULER_USERS_DEFERRED = Gauge(
+    "scheduler_users_deferred",
+    "Пользователи, у которых есть отложенные на следующий тик сайты",
+    multiprocess_mode="mostrecent"
+)
+
+CELERY_QUEUE_DEPTH = Gauge(
+    "celery_queue_depth",
+    "Количество задач в очереди брокера",
+    ["queue"],
+    multiprocess_mode="mostrecent"
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Соединения пула БД (primary, replica) по состоянию",
+    ["pool", "state"],
+    multiprocess_mode="livesum"
+)
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время ожидания соединения из пула БД (primary, replica)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+
+TELEGRAM_SEND_DURATION = Histogram(
+    "telegram_send_duration_seconds",
+    "Длительность отправки сообщения в Telegram",
+    ["result"],
+    buckets=LATENCY_BUCKETS
+)
+
+TELEGRAM_DELIVERY_LATENCY = Histogram(
+    "telegram_delivery_latency_seconds",
+    "Время от постановки уведомления в очередь до доставки в Telegram",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Записи лога, не попавшие в вывод: sampled - отброшены выборкой, queue_full - переполнена очередь лога",
+    ["reason"]
+)
+
+SITE_STATE_FLUSHED = Counter(
+    "site_state_flushed_total",
+    "Состояния сайтов, записанные из Redis в БД (SITE_STATE_STORE=redis)"
+)
+
+SITE_STATE_DIRTY = Gauge(
+    "site_state_dirty_websites",
+    "Сайты, состояние которых в Redis еще не записано в БД",
+    multiprocess_mode="mostrecent"
+)
+
+# SQL_PROFILING (app.db.profiling): метка query - нормализованный текст запроса,
+# число серий ограничено числом разных запросов приложения
+DB_QUERY_CALLS = Counter(
+    "db_query_calls_total",
+    "Выполненные SQL запросы (SQL_PROFILING)",
+    ["query"]
+)
+
+DB_QUERY_TIME = Counter(
+    "db_query_time_seconds_total",
+    "Суммарное время выполнения SQL запросов (SQL_PROFILING)",
+    ["query"]
+)
+
+DB_QUERY_ROWS = Counter(
+    "db_query_rows_total",
+    "Строки, возвращенные или измененные SQL запросами (SQL_PROFILING)",
+    ["query"]
+)
+
+DB_QUERY_SLOW = Counter(
+    "db_query_slow_total",
+    "SQL запросы дольше SLOW_QUERY_THRESHOLD_MS (SQL_PROFILING)",
+    ["query"]
+)
+
+DB_QUERY_MAX = Gauge(
+    "db_query_max_seconds",
+    "Самое долгое выполнение SQL запроса с запуска процессов (SQL_PROFILING)",
+    ["query"],
+    multiprocess_mode="max"
+)
+
+DB_QUERY_CALLER = Gauge(
+    "db_query_caller",
+    "Место в коде, из которого выполнен SQL запрос (значение всегда 1, SQL_PROFILING)",
+    ["query", "caller"],
+    multiprocess_mode="max"
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки запросов API по маршруту",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _TreeCollector:
+    """Как MultiProcessCollector, но собирает *.db из каталога и его подкаталогов (по контейнерам)"""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def collect(self):
+        files = glob.glob(os.path.join(self.root, "**", "*.db"), recursive=True)
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Реестр с метриками всех процессов (multiprocess) или только текущего"""
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    registry.register(_TreeCollector(
+        os.environ.get("PROMETHEUS_MULTIPROC_ROOT") or os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    ))
+    return registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текст метрик в формате Prometheus и его content-type"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Удаляет live-метрики завершившегося процесса"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+def _route_template(scope: Scope) -> str:
+    """Шаблон маршрута (/api/v1/websites/{website_id}), чтобы ID не раздували число серий"""
+    # Starlette кладет найденный маршрут в scope при маршрутизации
+    path = getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """Замеряет время обработки запросов API по шаблону маршрута"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=_route_template(scope),
+                status=str(status_code)
+            ).observe(time.perf_counter() - start)
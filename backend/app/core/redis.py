@@ -0,0 +1,21 @@
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    """Общий асинхронный клиент Redis для текущего процесса"""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.REDIS_URL, socket_timeout=5, socket_connect_timeout=5)
+    return _redis
+
+
+async def close_redis() -> None:
+    """Закрывает клиент Redis (при остановке приложения)"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
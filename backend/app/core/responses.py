@@ -0,0 +1,24 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON ответ, сериализуемый через orjson (с откатом на стандартный json)"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def get_default_response_class(enabled: bool) -> type[JSONResponse]:
+    """Класс ответа по умолчанию для приложения"""
+    if enabled and orjson is not None:
+        return FastJSONResponse
+    return JSONResponse
@@ -0,0 +1,199 @@
+"""
+Легковесная трассировка проверок (spans) с локальным экспортом
+
+Трасса - дерево вложенных span'ов одного корня (например, задачи check_website):
+каждый span знает свое имя, время начала, длительность, атрибуты и ошибку.
+Текущий span хранится в contextvar, поэтому вложенность сохраняется и внутри
+задач asyncio, созданных из span'а.
+
+Какие трассы записываются:
+    - TRACE_EXPORTER пуст: трассировка выключена, span() ничего не делает;
+    - иначе корень попадает в выборку с вероятностью TRACE_SAMPLE_RATE;
+    - трассы длиннее TRACE_SLOW_THRESHOLD пишутся всегда (решение принимается
+      при завершении корня), чтобы медленные проверки не терялись при малой выборке.
+
+Экспорт:
+    file    - JSON Lines в TRACE_FILE, одна строка на span (trace_id, span_id,
+              parent_id, name, start, duration_ms, attributes, error), у корня
+              дополнительно phases - длительности всех вложенных span'ов по именам.
+              Файл пишет поток вывода логов (очередь app.core.logger), а не event loop;
+    console - дерево трассы в лог (logger tracing).
+"""
+import json
+import logging
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from app.core.config import settings
+from app.core.logger import TRACE_LOGGER, get_logger
+
+logger = get_logger("tracing")
+# Трассы пишутся независимо от LOG_LEVEL
+_export_logger = logging.getLogger(TRACE_LOGGER)
+_export_logger.setLevel(logging.INFO)
+
+
+class Span:
+    """Участок работы внутри трассы"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "duration", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: str | None, attributes: dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration: float | None = None
+        self.attributes = attributes
+        self.error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        """Добавляет атрибуты span'а"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Span вне выборки: атрибуты отбрасываются"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+class Trace:
+    """Все span'ы одного корня"""
+
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = secrets.token_hex(16)
+        self.sampled = sampled
+        self.spans: list[Span] = []
+
+
+_NOOP = _NoopSpan()
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def enabled() -> bool:
+    return bool(settings.TRACE_EXPORTER)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+    """
+    Открывает span (корень трассы, если текущего span'а нет)
+
+    Пример:
+        with span("http.probe", url=url) as probe:
+            ...
+            probe.set(status_code=200)
+    """
+    if not enabled():
+        yield _NOOP
+        return
+
+    parent = _current.get()
+    if parent is None:
+        trace = Trace(sampled=random.random() < settings.TRACE_SAMPLE_RATE)
+        if not trace.sampled and settings.TRACE_SLOW_THRESHOLD <= 0:
+            yield _NOOP
+            return
+    else:
+        trace = parent.trace
+
+    current = Span(trace, name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    started = time.perf_counter()
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current.reset(token)
+        if parent is None:
+            _finish(trace, current)
+
+
+def record_span(name: str, start: float, end: float, **attributes: Any) -> None:
+    """
+    Добавляет в текущую трассу уже прошедший участок (например, ожидание в очереди)
+
+    start и end - unix-время
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    recorded = Span(parent.trace, name, parent.span_id, attributes)
+    recorded.start = start
+    recorded.duration = max(end - start, 0.0)
+    parent.trace.spans.append(recorded)
+
+
+def _finish(trace: Trace, root: Span) -> None:
+    """Экспортирует трассу, если она в выборке или медленная"""
+    slow = 0 < settings.TRACE_SLOW_THRESHOLD <= root.duration + _recorded_before(trace, root)
+    if not trace.sampled and not slow:
+        return
+
+    root.set(sampled=trace.sampled)
+    phases: dict[str, float] = {}
+    for child in trace.spans[1:]:
+        phases[child.name] = phases.get(child.name, 0.0) + round((child.duration or 0.0) * 1000, 3)
+    try:
+        if settings.TRACE_EXPORTER == "console":
+            _export_console(trace)
+        else:
+            _export_file(trace, phases)
+    except Exception as e:
+        logger.warning(f"Error exporting trace {trace.trace_id}: {e}")
+
+
+def _recorded_before(trace: Trace, root: Span) -> float:
+    """Сколько трасса длилась до корня (ожидание в очереди, добавленное record_span)"""
+    earliest = min(s.start for s in trace.spans)
+    return max(root.start - earliest, 0.0)
+
+
+def _export_file(trace: Trace, phases: dict[str, float]) -> None:
+    lines = []
+    for index, item in enumerate(trace.spans):
+        record = item.to_dict()
+        if index == 0:
+            record["phases"] = phases
+        lines.append(json.dumps(record, default=str, ensure_ascii=False))
+
+    # Одна запись лога на трассу: строки разных процессов не перемешиваются
+    _export_logger.info("\n".join(lines))
+
+
+def _export_console(trace: Trace) -> None:
+    depth: dict[str | None, int] = {None: -1}
+    lines = []
+    for item in trace.spans:
+        depth[item.span_id] = depth.get(item.parent_id, -1) + 1
+        attributes = " ".join(f"{key}={value}" for key, value in item.attributes.items())
+        error = f" error={item.error}" if item.error else ""
+        lines.append(
+            f"{'  ' * depth[item.span_id]}{item.name} {(item.duration or 0.0) * 1000:.1f}ms {attributes}{error}"
+        )
+    logger.info(f"Trace {trace.trace_id}\n" + "\n".join(lines))
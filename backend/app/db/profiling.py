@@ -0,0 +1,213 @@
+"""
+Профилирование SQL запросов
+
+Включается настройкой SQL_PROFILING. На каждый запрос приходится замер времени
+и обновление счетчиков Prometheus (app.core.metrics, DB_QUERY_*) с меткой
+нормализованного SQL; нормализация кэшируется (SQLAlchemy переиспользует одни
+и те же строки запросов), а место вызова в коде определяется только при первом
+появлении запроса в процессе и для медленных запросов.
+
+Счетчики пишутся в multiprocess-каталог метрик, поэтому /api/v1/admin/queries
+показывает запросы всех процессов, в т.ч. проверок в воркерах Celery. Сброс
+статистики запоминает текущие значения в Redis как точку отсчета.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import (
+    DB_QUERY_CALLER,
+    DB_QUERY_CALLS,
+    DB_QUERY_MAX,
+    DB_QUERY_ROWS,
+    DB_QUERY_SLOW,
+    DB_QUERY_TIME,
+    metrics_registry,
+)
+from app.core.redis import get_redis
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+logger = get_logger("db.profiling")
+
+_APP_DIR = str(Path(__file__).resolve().parent.parent)
+_DB_DIR = str(Path(__file__).resolve().parent)
+
+# Точка отсчета статистики после сброса: запрос -> [calls, seconds, rows, slow_calls]
+BASELINE_KEY = "profiling:baseline"
+
+# Запрос -> место вызова и самое долгое выполнение (секунды) в этом процессе
+_callers: dict[str, str] = {}
+_max_seconds: dict[str, float] = {}
+_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)|\bIN\s*\(__\[POSTCOMPILE_\w+\]\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """Нормализованный SQL: литералы и параметры заменены на ?, пробелы схлопнуты"""
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def _caller_location() -> str:
+    """Первая строка кода приложения (вне app/db), из которой выполнен запрос"""
+    # В async режиме запрос выполняется в дочернем greenlet, код вызова - в родительском
+    frame = sys._getframe(2)
+    if greenlet is not None:
+        parent = greenlet.getcurrent().parent
+        if parent is not None and parent.gr_frame is not None:
+            frame = parent.gr_frame
+
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and not filename.startswith(_DB_DIR):
+            relative = filename[len(_APP_DIR) - len("app"):]
+            return f"{relative}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    key = fingerprint(statement)
+    rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+    slow = elapsed_ms >= settings.SLOW_QUERY_THRESHOLD_MS
+
+    DB_QUERY_CALLS.labels(key).inc()
+    DB_QUERY_TIME.labels(key).inc(elapsed_ms / 1000)
+    if rows:
+        DB_QUERY_ROWS.labels(key).inc(rows)
+    if slow:
+        DB_QUERY_SLOW.labels(key).inc()
+    with _lock:
+        longest = elapsed_ms / 1000 > _max_seconds.get(key, -1.0)
+        if longest:
+            _max_seconds[key] = elapsed_ms / 1000
+    if longest:
+        DB_QUERY_MAX.labels(key).set(elapsed_ms / 1000)
+
+    if key not in _callers or slow:
+        caller = _caller_location()
+        with _lock:
+            first = key not in _callers
+            if first:
+                _callers[key] = caller
+        if first:
+            DB_QUERY_CALLER.labels(key, caller).set(1)
+        if slow:
+            logger.warning(f"Slow query {elapsed_ms:.1f}ms rows={rows} at {caller}: {key}")
+
+
+def _handle_error(exception_context):
+    # Ошибка выполнения: убираем незакрытый замер
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def install(engine: Engine) -> None:
+    """Подключает профилирование к синхронному движку (engine.sync_engine для async)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    logger.info(f"SQL profiling enabled, slow query threshold {settings.SLOW_QUERY_THRESHOLD_MS}ms")
+
+
+def _collect_totals() -> dict[str, dict]:
+    """Статистика запросов всех процессов из метрик DB_QUERY_*"""
+    fields = {
+        "db_query_calls_total": "calls",
+        "db_query_time_seconds_total": "total_s",
+        "db_query_rows_total": "rows",
+        "db_query_slow_total": "slow_calls",
+        "db_query_max_seconds": "max_s",
+    }
+    totals: dict[str, dict] = {}
+    for family in metrics_registry().collect():
+        if not family.name.startswith("db_query_"):
+            continue
+        for sample in family.samples:
+            query = sample.labels.get("query")
+            if query is None:
+                continue
+            entry = totals.setdefault(query, {
+                "fingerprint": query, "calls": 0, "total_s": 0.0, "rows": 0,
+                "slow_calls": 0, "max_s": 0.0, "caller": None,
+            })
+            if sample.name == "db_query_caller":
+                entry["caller"] = entry["caller"] or sample.labels["caller"]
+            elif sample.name in fields:
+                entry[fields[sample.name]] += sample.value
+    return totals
+
+
+async def get_top_queries(limit: int = 20, order_by: str = "total_ms") -> list[dict]:
+    """
+    Топ запросов всех процессов по суммарному времени (или другому полю статистики)
+
+    Счетчики считаются от последнего сброса, max_ms - с запуска процессов.
+    """
+    totals = _collect_totals()
+    baseline = {
+        query.decode(): json.loads(values)
+        for query, values in (await get_redis().hgetall(BASELINE_KEY)).items()
+    }
+
+    entries = []
+    for query, entry in totals.items():
+        calls, total_s, rows, slow_calls = baseline.get(query, (0, 0.0, 0, 0))
+        calls = int(entry["calls"] - calls)
+        if calls <= 0:
+            continue
+        total_ms = (entry["total_s"] - total_s) * 1000
+        entries.append({
+            "fingerprint": query,
+            "calls": calls,
+            "total_ms": round(total_ms, 3),
+            "avg_ms": round(total_ms / calls, 3),
+            "max_ms": round(entry["max_s"] * 1000, 3),
+            "rows": int(entry["rows"] - rows),
+            "slow_calls": int(entry["slow_calls"] - slow_calls),
+            "caller": entry["caller"],
+        })
+
+    entries.sort(key=lambda e: e[order_by], reverse=True)
+    return entries[:limit]
+
+
+async def reset_stats() -> None:
+    """Запоминает текущие счетчики как точку отсчета (счетчики Prometheus не сбрасываются)"""
+    totals = _collect_totals()
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(BASELINE_KEY)
+        if totals:
+            pipe.hset(BASELINE_KEY, mapping={
+                query: json.dumps([entry["calls"], entry["total_s"], entry["rows"], entry["slow_calls"]])
+                for query, entry in totals.items()
+            })
+        await pipe.execute()
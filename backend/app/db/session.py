@@ -1,6 +1,64 @@
+import time
+
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT
+from app.core.redis import get_redis
+from app.db import profiling
+
+logger = get_logger("db.session")
+
+# Отставание реплики в секундах (0 если все полученные WAL уже применены)
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+# Пользователь недавно писал в БД: его чтения идут на primary (ключ с TTL)
+PRIMARY_PIN_PREFIX = "replica:pin:"
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений с замером времени ожидания соединения"""
+
+    label = "primary"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.labels(self.label).observe(time.perf_counter() - start)
+
+
+class ReplicaPool(InstrumentedPool):
+    label = "replica"
+
+
+def _instrument_pool(pool: InstrumentedPool) -> None:
+    """Счетчики открытых и выданных соединений пула"""
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.labels(pool.label, "open").inc()
+
+    @event.listens_for(pool, "close")
+    def _on_close(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.labels(pool.label, "open").dec()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CONNECTIONS.labels(pool.label, "checked_out").inc()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.labels(pool.label, "checked_out").dec()
+
 
 # Create async engine with improved pool settings
 engine = create_async_engine(
@@ -8,12 +66,19 @@ engine = create_async_engine(
     echo=settings.DEBUG,
     future=True,
     pool_pre_ping=True,
+    poolclass=InstrumentedPool,
     pool_size=5,  # Уменьшено для Celery
     max_overflow=10,  # Уменьшено для Celery
     pool_recycle=3600,  # Пересоздавать соединения каждый час
     pool_timeout=30,  # Таймаут получения соединения из пула
 )
 
+if settings.SQL_PROFILING:
+    profiling.install(engine.sync_engine)
+
+_instrument_pool(engine.sync_engine.pool)
+
+
 # Create async session maker
 async_session_maker = async_sessionmaker(
     engine,
@@ -23,6 +88,34 @@ async_session_maker = async_sessionmaker(
     autoflush=False
 )
 
+# Read replica для тяжелых запросов чтения (если настроена)
+replica_engine = None
+replica_session_maker = None
+if settings.REPLICA_DATABASE_URL:
+    replica_engine = create_async_engine(
+        settings.REPLICA_DATABASE_URL,
+        echo=settings.DEBUG,
+        future=True,
+        pool_pre_ping=True,
+        poolclass=ReplicaPool,
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=3600,
+        pool_timeout=30,
+    )
+    _instrument_pool(replica_engine.sync_engine.pool)
+    replica_session_maker = async_sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False
+    )
+    if settings.SQL_PROFILING:
+        profiling.install(replica_engine.sync_engine)
+
+_replica_state = {"checked_at": 0.0, "available": False}
+
 Base = declarative_base()
 
 
@@ -37,3 +130,57 @@ async def get_async_session() -> AsyncSession:
             raise
         finally:
             await session.close()
+
+
+async def _replica_available() -> bool:
+    """Реплика настроена и отстает не больше REPLICA_MAX_LAG_SECONDS (результат кэшируется)"""
+    if replica_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_state["available"]
+    _replica_state["checked_at"] = now
+
+    try:
+        async with replica_engine.connect() as conn:
+            lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        available = lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not available:
+            logger.warning(f"Replica lag {lag}s exceeds limit, reading from primary")
+    except Exception as e:
+        logger.warning(f"Replica unavailable, reading from primary: {e}")
+        available = False
+
+    _replica_state["available"] = available
+    return available
+
+
+async def pin_to_primary(user_id: int) -> None:
+    """
+    После записи чтения пользователя идут на primary, пока реплика может их не содержать
+
+    Реплика используется при отставании до REPLICA_MAX_LAG_SECONDS, а отставание
+    перепроверяется раз в REPLICA_LAG_CHECK_INTERVAL - на это время и закрепляем.
+    """
+    if replica_engine is None:
+        return
+    ttl = settings.REPLICA_MAX_LAG_SECONDS + settings.REPLICA_LAG_CHECK_INTERVAL
+    try:
+        await get_redis().set(f"{PRIMARY_PIN_PREFIX}{user_id}", 1, px=int(ttl * 1000))
+    except Exception as e:
+        logger.warning(f"Failed to pin user {user_id} reads to primary: {e}")
+
+
+async def read_session_maker(user_id: int | None = None) -> async_sessionmaker:
+    """Реплика, либо primary, если реплика отстает или пользователь недавно писал (pin_to_primary)"""
+    if not await _replica_available():
+        return async_session_maker
+    if user_id is not None:
+        try:
+            if await get_redis().exists(f"{PRIMARY_PIN_PREFIX}{user_id}"):
+                return async_session_maker
+        except Exception as e:
+            logger.warning(f"Failed to check primary pin of user {user_id}, reading from primary: {e}")
+            return async_session_maker
+    return replica_session_maker
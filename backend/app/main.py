@@ -1,11 +1,17 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.core.logger import logger
-from app.api.v1 import auth, websites
+from app.core.responses import get_default_response_class
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import CELERY_QUEUE_DEPTH, MetricsMiddleware, render_metrics
+from app.core.redis import close_redis
+from app.services.health import get_queue_depths, get_readiness
+from app.api.v1 import admin, auth, websites
 
 
 @asynccontextmanager
@@ -21,6 +27,7 @@ async def lifespan(app: FastAPI):
     logger.info("=" * 60)
     logger.info("🛑 Application shutting down...")
     logger.info("=" * 60)
+    await close_redis()
 
 
 app = FastAPI(
@@ -28,6 +35,7 @@ app = FastAPI(
     version="2.0.0",
     description="Асинхронный сервис мониторинга веб-сайтов с Celery и Telegram уведомлениями",
     lifespan=lifespan,
+    default_response_class=get_default_response_class(settings.FAST_JSON_RESPONSES),
     docs_url="/docs",
     redoc_url="/redoc"
 )
@@ -42,6 +50,16 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Сжатие больших ответов (список сайтов, история, статистика)
+if settings.RESPONSE_COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE
+    )
+
+# Время обработки запросов по маршрутам
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(
     auth.router,
@@ -53,6 +71,11 @@ app.include_router(
     prefix=f"{settings.API_V1_PREFIX}/websites",
     tags=["Websites"]
 )
+app.include_router(
+    admin.router,
+    prefix=f"{settings.API_V1_PREFIX}/admin",
+    tags=["Admin"]
+)
 
 
 @app.get("/", tags=["Root"])
@@ -73,15 +96,36 @@ async def root():
     }
 
 
+@app.get("/health/live", tags=["Health"])
+async def health_live():
+    """Liveness: процесс запущен и обрабатывает запросы"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["Health"])
 @app.get("/health", tags=["Health"])
-async def health():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "database": "connected",
-        "redis": "connected",
-        "celery": "running"
-    }
+async def health_ready():
+    """Readiness: состояние БД, Redis и воркеров Celery (кэшируется)"""
+    result = await get_readiness()
+    status_code = (
+        status.HTTP_503_SERVICE_UNAVAILABLE
+        if result["status"] == "unhealthy"
+        else status.HTTP_200_OK
+    )
+    return JSONResponse(result, status_code=status_code)
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    try:
+        for queue, depth in (await get_queue_depths()).items():
+            CELERY_QUEUE_DEPTH.labels(queue).set(depth)
+    except Exception as e:
+        logger.warning(f"Failed to read queue depth: {e}")
+
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
 
 
 if __name__ == "__main__":
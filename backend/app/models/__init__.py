@@ -1,5 +1,6 @@
 from app.db.session import Base
 from app.models.user import User
 from app.models.website import Website, WebsiteCheck
+from app.models.notification import NotificationOutbox
 
-__all__ = ["Base", "User", "Website", "WebsiteCheck"]
+__all__ = ["Base", "User", "Website", "WebsiteCheck", "NotificationOutbox"]
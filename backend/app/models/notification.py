@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class NotificationOutbox(Base):
+    """Исходящие уведомления (transactional outbox)
+
+    Строка пишется в той же транзакции, что и результат проверки,
+    а отправляет ее отдельная задача drain_notification_outbox.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    website_id = Column(Integer, ForeignKey("websites.id", ondelete="CASCADE"), nullable=True)
+
+    chat_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # alert, recovery
+    message = Column(Text, nullable=False)
+    summary = Column(String, nullable=True)  # Строка для сводного сообщения (digest)
+
+    status = Column(String, nullable=False, default="pending")  # pending, delivered, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    # Строка доступна для отправки с этого момента (ретраи и аренда при захвате)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_notification_outbox_pending",
+            "available_at",
+            postgresql_where=(status == "pending")
+        ),
+    )
@@ -21,6 +21,7 @@ class Website(Base):
     check_interval = Column(Integer, default=300)  # NEW: Интервал проверки в секундах (5 мин)
     is_active = Column(Boolean, default=True)
     failure_threshold = Column(Integer, default=3)  # NEW: Количество ошибок перед уведомлением
+    http2 = Column(Boolean, default=True, server_default="true", nullable=False)  # HTTP/2 при проверке, False - только HTTP/1.1
 
     # Status
     last_check = Column(DateTime(timezone=True), nullable=True)
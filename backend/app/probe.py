@@ -0,0 +1,187 @@
+"""
+Демон проверок сайтов - альтернатива воркерам Celery для плановых проверок
+
+Процесс сам выбирает сайты, которые пора проверить (та же выборка и та же
+доля на пользователя, что у планировщика Celery), и выполняет тысячи проверок
+одновременно в одном event loop (uvloop, если установлен) с общей curl-сессией.
+Несколько процессов (на одном или разных узлах) делят работу через аренду
+проверок в Redis, поэтому один сайт не проверяется дважды. Расписание
+(app.services.schedule) держится в памяти и перечитывается из БД раз в
+PROBE_SCHEDULE_RELOAD секунд; срок проверенного сайта переносится сразу.
+
+Чтобы Celery не ставил плановые проверки параллельно с демоном, задайте
+CHECK_RUNNER=probe. Ручные проверки (interactive) по-прежнему идут через Celery.
+
+Запуск (из каталога backend):
+    python -m app.probe --processes 2 --concurrency 1000
+
+SIGTERM/SIGINT: демон перестает брать новые сайты и ждет завершения начатых
+проверок до PROBE_DRAIN_TIMEOUT секунд, незавершенные отменяются.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+
+from curl_cffi.requests import AsyncSession as CurlAsyncSession
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.redis import close_redis
+from app.db.session import async_session_maker, engine
+from app.services.check_lease import release_check_lease
+from app.services.schedule import Schedule
+from app.services.scheduler import claim_checks
+from app.tasks.monitor import _check_website, load_current_schedule, probe_session, probe_session_options
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = get_logger("probe")
+
+
+class ProbeDaemon:
+    """Цикл выборки и выполнения проверок в одном процессе"""
+
+    def __init__(self, concurrency: int, poll_interval: float, drain_timeout: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self._stopping = asyncio.Event()
+        self._in_flight: dict[int, asyncio.Task] = {}
+        self._schedule: Schedule | None = None
+        self._schedule_loaded_at = 0.0
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info(f"Stopping probe daemon, draining {len(self._in_flight)} checks")
+            self._stopping.set()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        logger.info(f"Probe daemon started: concurrency={self.concurrency}")
+        try:
+            async with self._session() as client:
+                while not self._stopping.is_set():
+                    try:
+                        await self._dispatch(client)
+                    except Exception as e:
+                        logger.error(f"Error dispatching checks: {e}")
+
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+
+                await self._drain()
+        finally:
+            await engine.dispose()
+            await close_redis()
+            logger.info("Probe daemon stopped")
+
+    def _session(self) -> CurlAsyncSession:
+        """Общая curl-сессия всех проверок процесса (соединения, HTTP/2 multiplexing и DNS-кэш общие)"""
+        return probe_session(**probe_session_options(), max_clients=self.concurrency)
+
+    async def _dispatch(self, client: CurlAsyncSession) -> None:
+        free = self.concurrency - len(self._in_flight)
+        # Выборка сайтов дорогая: не делаем ее ради пары освободившихся слотов
+        if free < max(1, self.concurrency // 10):
+            return
+
+        now = time.time()
+        if self._schedule is None or now - self._schedule_loaded_at >= settings.PROBE_SCHEDULE_RELOAD:
+            async with async_session_maker() as db:
+                self._schedule = await load_current_schedule(db)
+            self._schedule_loaded_at = now
+            logger.debug(f"Schedule reloaded: {len(self._schedule)} websites")
+
+        due = self._schedule.due(now)
+        due = [check for check in due if check.website_id not in self._in_flight]
+        last_checks = {check.website_id: check.last_check for check in due}
+
+        website_ids, _ = await claim_checks(due, free, "probe")
+        for website_id in website_ids:
+            task = asyncio.create_task(self._run_check(website_id, client, last_checks[website_id]))
+            self._in_flight[website_id] = task
+        if website_ids:
+            logger.info(f"Started {len(website_ids)} checks, {len(self._in_flight)} in flight")
+
+    async def _run_check(self, website_id: int, client: CurlAsyncSession, planned_last_check: float | None) -> None:
+        try:
+            await _check_website(website_id, client, planned_last_check)
+        except asyncio.CancelledError:
+            logger.warning(f"Check of website {website_id} cancelled on shutdown")
+        except Exception as e:
+            logger.error(f"Error checking website {website_id}: {e}")
+        finally:
+            self._in_flight.pop(website_id, None)
+            # Пропущенная или упавшая проверка тоже переносится: иначе сайт выбирался бы каждый цикл
+            self._schedule.mark_checked(website_id, time.time())
+            try:
+                await release_check_lease(website_id)
+            except Exception as e:
+                logger.warning(f"Error releasing check lease for website {website_id}: {e}")
+
+    async def _drain(self) -> None:
+        tasks = list(self._in_flight.values())
+        if not tasks:
+            return
+
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning(f"{len(pending)} checks did not finish in {self.drain_timeout}s, cancelling")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def run_process(concurrency: int, poll_interval: float, drain_timeout: float) -> None:
+    """Запускает демон в текущем процессе"""
+    daemon = ProbeDaemon(concurrency, poll_interval, drain_timeout)
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(daemon.run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone website probe daemon")
+    parser.add_argument("--processes", type=int, default=1, help="Число процессов")
+    parser.add_argument("--concurrency", type=int, default=settings.PROBE_CONCURRENCY,
+                        help="Одновременных проверок на процесс")
+    parser.add_argument("--poll-interval", type=float, default=settings.PROBE_POLL_INTERVAL)
+    parser.add_argument("--drain-timeout", type=float, default=settings.PROBE_DRAIN_TIMEOUT)
+    args = parser.parse_args()
+    options = (args.concurrency, args.poll_interval, args.drain_timeout)
+
+    if args.processes <= 1:
+        run_process(*options)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_process, args=options, name=f"probe-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ class WebsiteBase(BaseModel):
     telegram_chat_id: Optional[str] = None
     check_interval: int = Field(default=300, ge=60, le=3600)
     failure_threshold: int = Field(default=3, ge=1, le=10)
+    http2: bool = True
 
 
 class WebsiteCreate(WebsiteBase):
@@ -37,6 +38,7 @@ class WebsiteUpdate(BaseModel):
     telegram_chat_id: Optional[str] = None
     check_interval: Optional[int] = Field(default=None, ge=60, le=3600)
     is_active: Optional[bool] = None
+    http2: Optional[bool] = None
 
 
 class WebsiteResponse(BaseModel):
@@ -48,6 +50,7 @@ class WebsiteResponse(BaseModel):
     telegram_chat_id: Optional[str]
     check_interval: int
     is_active: bool
+    http2: bool
     status: str
     response_time: Optional[float]
     error_message: Optional[str]
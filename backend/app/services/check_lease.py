@@ -0,0 +1,118 @@
+from app.core.config import settings
+from app.core.metrics import CHECKS_DEDUPLICATED
+from app.core.redis import get_redis
+
+# Аренда "проверка в очереди или выполняется" для сайта.
+# Ставится при постановке check_website в очередь и снимается по завершении задачи;
+# TTL страхует от упавшего воркера, после него сайт снова можно поставить в очередь.
+LEASE_PREFIX = "check:inflight:"
+# Источник аренды плановых проверок Celery: проверка может долго ждать в очереди scheduled
+SCHEDULER_SOURCE = "scheduler"
+
+# Захват аренды, свободной или взятой планировщиком (значение ключа - источник)
+TAKE_OVER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[2] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+# Снятие аренды, только если ее держит указанный источник
+RELEASE_OWNED_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _lease_key(website_id: int) -> str:
+    return f"{LEASE_PREFIX}{website_id}"
+
+
+async def acquire_check_leases(website_ids: list[int], source: str) -> list[int]:
+    """
+    Захватывает аренду проверки для сайтов (SET NX с TTL)
+
+    Args:
+        website_ids: ID сайтов, которые нужно поставить в очередь
+        source: Кто ставит проверку (scheduler, manual) - метка метрики
+
+    Returns:
+        list[int]: ID сайтов, для которых аренда получена; остальные уже в очереди
+    """
+    if not website_ids:
+        return []
+
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for website_id in website_ids:
+            pipe.set(_lease_key(website_id), source, nx=True, ex=settings.CHECK_LEASE_TTL)
+        results = await pipe.execute()
+
+    acquired = [website_id for website_id, ok in zip(website_ids, results) if ok]
+    duplicates = len(website_ids) - len(acquired)
+    if duplicates:
+        CHECKS_DEDUPLICATED.labels(source).inc(duplicates)
+    return acquired
+
+
+async def filter_in_flight(website_ids: list[int], source: str) -> list[int]:
+    """Оставляет только сайты без аренды (проверка не в очереди и не выполняется)"""
+    if not website_ids:
+        return []
+
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for website_id in website_ids:
+            pipe.exists(_lease_key(website_id))
+        results = await pipe.execute()
+
+    free = [website_id for website_id, exists in zip(website_ids, results) if not exists]
+    duplicates = len(website_ids) - len(free)
+    if duplicates:
+        CHECKS_DEDUPLICATED.labels(source).inc(duplicates)
+    return free
+
+
+async def take_over_check_lease(website_id: int, source: str) -> bool:
+    """
+    Захватывает аренду для ручной проверки
+
+    Аренду плановой проверки, ждущей в очереди scheduled, ручная проверка забирает себе:
+    иначе "проверить сейчас" ничего не делает, пока очередь не дойдет до сайта.
+    """
+    taken = await get_redis().eval(
+        TAKE_OVER_SCRIPT, 1, _lease_key(website_id), source, SCHEDULER_SOURCE, settings.CHECK_LEASE_TTL
+    )
+    if not taken:
+        CHECKS_DEDUPLICATED.labels(source).inc()
+    return bool(taken)
+
+
+async def extend_check_lease(website_id: int) -> None:
+    """Продлевает аренду (задача уходит на повтор и остается в очереди)"""
+    await get_redis().expire(_lease_key(website_id), settings.CHECK_LEASE_TTL)
+
+
+async def release_check_leases(website_ids: list[int], source: str) -> None:
+    """Снимает аренды, взятые source, но так и не поставленные в очередь (ошибка брокера)"""
+    if not website_ids:
+        return
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for website_id in website_ids:
+            pipe.eval(RELEASE_OWNED_SCRIPT, 1, _lease_key(website_id), source)
+        await pipe.execute()
+
+
+async def release_check_lease(website_id: int, source: str | None = None) -> None:
+    """
+    Снимает аренду после завершения проверки
+
+    С source аренда снимается, только если ее держит этот источник
+    (плановая проверка не снимает аренду, которую забрала ручная).
+    """
+    if source is None:
+        await get_redis().delete(_lease_key(website_id))
+    else:
+        await get_redis().eval(RELEASE_OWNED_SCRIPT, 1, _lease_key(website_id), source)
@@ -0,0 +1,198 @@
+"""
+DNS-кэш проверок сайтов (в процессе воркера)
+
+curl резолвит имя сайта заново почти при каждой проверке, а несуществующий
+домен каждый раз стоит полного таймаута резолвера. Здесь адреса хранятся на TTL
+записи (в пределах DNS_MIN_TTL..DNS_MAX_TTL), NXDOMAIN - DNS_NEGATIVE_TTL секунд.
+Одновременные проверки одного имени ждут одного резолва, разные имена
+резолвятся параллельно. Готовые адреса передаются curl через CURLOPT_RESOLVE.
+
+Резолвер - dnspython (dns.asyncresolver), если он установлен: только он
+возвращает TTL записей. Без него используется getaddrinfo в пуле потоков
+и TTL DNS_DEFAULT_TTL. dnspython не читает /etc/hosts и nsswitch, поэтому
+имя, которого он не нашел, перед негативным кэшированием проверяется getaddrinfo.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import DNS_CACHE_LOOKUPS, DNS_CACHE_SIZE, DNS_RESOLVE_DURATION
+
+logger = get_logger("services.dns_cache")
+
+
+class DNSResolutionError(Exception):
+    """Имя не существует (NXDOMAIN) или у него нет адресов"""
+
+
+class _NotFound(Exception):
+    pass
+
+
+class CachedName(NamedTuple):
+    addresses: tuple[str, ...]
+    expires_at: float  # time.monotonic()
+    error: str | None = None  # NXDOMAIN: адресов нет до expires_at
+
+
+_cache: dict[str, CachedName] = {}
+# Идущие резолвы: имя -> future с CachedName
+_pending: dict[str, asyncio.Future] = {}
+
+
+def cacheable(host: str) -> bool:
+    """IP-адреса, имена без точки и *.localhost (localhost, имена из /etc/hosts) резолвит сам curl"""
+    if "." not in host or host.endswith(".localhost"):
+        return False
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return True
+    return False
+
+
+async def resolve(host: str) -> tuple[tuple[str, ...], float]:
+    """
+    Адреса имени и сколько секунд ждали резолва (0 при попадании в кэш)
+
+    Пустой кортеж - имя не кэшируется (см. cacheable) или резолвер не ответил,
+    тогда имя резолвит curl. DNSResolutionError - имени не существует.
+    """
+    host = host.lower().rstrip(".")
+    if not cacheable(host):
+        return (), 0.0
+
+    entry = _cache.get(host)
+    if entry is not None and entry.expires_at > time.monotonic():
+        if entry.error is not None:
+            DNS_CACHE_LOOKUPS.labels("negative_hit").inc()
+            raise DNSResolutionError(entry.error)
+        DNS_CACHE_LOOKUPS.labels("hit").inc()
+        return entry.addresses, 0.0
+
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    future = _pending.get(host)
+    if future is not None and future.get_loop() is loop:
+        DNS_CACHE_LOOKUPS.labels("shared").inc()
+    else:
+        DNS_CACHE_LOOKUPS.labels("miss").inc()
+        future = loop.create_task(_lookup(host))
+        _pending[host] = future
+        future.add_done_callback(lambda done: _pending.pop(host) if _pending.get(host) is done else None)
+
+    # Отмена одной проверки не прерывает резолв, которого ждут другие
+    entry = await asyncio.shield(future)
+    if entry.error is not None:
+        raise DNSResolutionError(entry.error)
+    return entry.addresses, time.perf_counter() - start
+
+
+def curl_resolve_entry(host: str, port: int, addresses: tuple[str, ...]) -> str:
+    """Строка CURLOPT_RESOLVE: host:port:addr1,[addr6]"""
+    return f"{host}:{port}:" + ",".join(f"[{address}]" if ":" in address else address for address in addresses)
+
+
+def clear() -> None:
+    _cache.clear()
+    DNS_CACHE_SIZE.set(0)
+
+
+async def _lookup(host: str) -> CachedName:
+    """Резолвит имя и кладет результат в кэш; ошибки резолвера (таймаут, SERVFAIL) не кэшируются"""
+    start = time.perf_counter()
+    try:
+        addresses, ttl = await asyncio.wait_for(_query(host), settings.DNS_TIMEOUT)
+    except _NotFound as e:
+        entry = CachedName((), time.monotonic() + settings.DNS_NEGATIVE_TTL, f"{host}: {e}")
+    except Exception as e:
+        logger.debug(f"DNS lookup of {host} failed, leaving it to curl: {e!r}")
+        return CachedName((), 0.0)
+    else:
+        ttl = min(max(ttl, settings.DNS_MIN_TTL), settings.DNS_MAX_TTL)
+        entry = CachedName(addresses, time.monotonic() + ttl)
+    finally:
+        DNS_RESOLVE_DURATION.observe(time.perf_counter() - start)
+
+    _store(host, entry)
+    return entry
+
+
+def _store(host: str, entry: CachedName) -> None:
+    # Обновленное имя переносится в конец: при переполнении вытесняются самые старые записи
+    _cache.pop(host, None)
+    while len(_cache) >= settings.DNS_CACHE_SIZE:
+        del _cache[next(iter(_cache))]
+    _cache[host] = entry
+    DNS_CACHE_SIZE.set(len(_cache))
+
+
+async def _query(host: str) -> tuple[tuple[str, ...], float]:
+    resolver = _resolver()
+    if resolver is None:
+        return await _query_getaddrinfo(host)
+    try:
+        return await _query_dnspython(resolver, host)
+    except _NotFound:
+        # Имя может быть в /etc/hosts или другом источнике nsswitch, которых dnspython не видит
+        return await _query_getaddrinfo(host)
+
+
+@lru_cache(maxsize=1)
+def _resolver() -> Any:
+    """Асинхронный резолвер dnspython или None (нет пакета или /etc/resolv.conf)"""
+    try:
+        import dns.asyncresolver
+        resolver = dns.asyncresolver.Resolver()
+    except ImportError:
+        return None
+    except Exception as e:
+        logger.warning(f"dnspython resolver unavailable, using getaddrinfo: {e}")
+        return None
+    resolver.lifetime = settings.DNS_TIMEOUT
+    return resolver
+
+
+async def _query_dnspython(resolver: Any, host: str) -> tuple[tuple[str, ...], float]:
+    import dns.resolver
+
+    answers = await asyncio.gather(
+        resolver.resolve(host, "A", raise_on_no_answer=False),
+        resolver.resolve(host, "AAAA", raise_on_no_answer=False),
+        return_exceptions=True,
+    )
+    addresses = []
+    ttls = []
+    errors = []
+    for answer in answers:
+        if isinstance(answer, dns.resolver.NXDOMAIN):
+            raise _NotFound("NXDOMAIN")
+        if isinstance(answer, BaseException):
+            errors.append(answer)
+        elif answer.rrset is not None:
+            addresses.extend(record.address for record in answer.rrset)
+            ttls.append(answer.rrset.ttl)
+
+    if addresses:
+        return tuple(addresses), min(ttls)
+    if errors:
+        raise errors[0]
+    raise _NotFound("no A/AAAA records")
+
+
+async def _query_getaddrinfo(host: str) -> tuple[tuple[str, ...], float]:
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)):
+            raise _NotFound(e.strerror)
+        raise
+    addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses:
+        raise _NotFound("no addresses")
+    return addresses, settings.DNS_DEFAULT_TTL
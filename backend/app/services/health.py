@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import text
+
+from app.core.celery_app import (
+    INTERACTIVE_QUEUE,
+    MAINTENANCE_QUEUE,
+    NOTIFICATIONS_QUEUE,
+    SCHEDULED_QUEUE,
+    celery_app,
+)
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.redis import get_redis
+from app.db.session import engine
+
+logger = get_logger("services.health")
+
+# Очереди Celery (списки в Redis)
+CELERY_QUEUES = [INTERACTIVE_QUEUE, SCHEDULED_QUEUE, MAINTENANCE_QUEUE, NOTIFICATIONS_QUEUE]
+
+_cache: dict[str, Any] = {"expires_at": 0.0, "result": None}
+_lock = asyncio.Lock()
+
+
+async def _timed(probe: Callable[[], Awaitable[dict]]) -> dict:
+    """Выполняет проверку с таймаутом и замером задержки"""
+    start = time.perf_counter()
+    try:
+        details = await asyncio.wait_for(probe(), timeout=settings.HEALTH_PROBE_TIMEOUT)
+        result = {"status": "up", **details}
+    except asyncio.TimeoutError:
+        result = {"status": "down", "error": f"Timeout after {settings.HEALTH_PROBE_TIMEOUT}s"}
+    except Exception as e:
+        result = {"status": "down", "error": str(e)}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+async def _probe_database() -> dict:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    pool = engine.pool
+    return {
+        "pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+    }
+
+
+async def get_queue_depths() -> dict[str, int]:
+    """Количество задач в каждой очереди брокера"""
+    redis = get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        for queue in CELERY_QUEUES:
+            pipe.llen(queue)
+        depths = await pipe.execute()
+    return dict(zip(CELERY_QUEUES, depths))
+
+
+async def _probe_redis() -> dict:
+    await get_redis().ping()
+    return {"queue_depth": await get_queue_depths()}
+
+
+async def _probe_celery() -> dict:
+    # control.ping блокирующий, выполняем его в отдельном потоке
+    replies = await asyncio.to_thread(
+        celery_app.control.ping, timeout=settings.HEALTH_PROBE_TIMEOUT / 2
+    )
+    workers = sorted(name for reply in replies for name in reply)
+    if not workers:
+        raise RuntimeError("No Celery workers responded")
+    return {"workers": workers}
+
+
+async def _collect() -> dict:
+    database, redis, celery = await asyncio.gather(
+        _timed(_probe_database),
+        _timed(_probe_redis),
+        _timed(_probe_celery),
+    )
+
+    # API не может работать без БД и Redis; без воркеров проверки лишь откладываются
+    if database["status"] != "up" or redis["status"] != "up":
+        status = "unhealthy"
+    elif celery["status"] != "up":
+        status = "degraded"
+    else:
+        status = "healthy"
+
+    return {
+        "status": status,
+        "checked_at": time.time(),
+        "dependencies": {
+            "database": database,
+            "redis": redis,
+            "celery": celery,
+        }
+    }
+
+
+async def get_readiness() -> dict:
+    """
+    Состояние зависимостей сервиса
+
+    Результат кэшируется на HEALTH_CACHE_TTL секунд, а одновременные запросы
+    ожидают одну общую проверку, чтобы частые пробы балансировщика
+    не создавали нагрузку на БД, Redis и воркеры.
+    """
+    if _cache["result"] is not None and time.monotonic() < _cache["expires_at"]:
+        return _cache["result"]
+
+    async with _lock:
+        if _cache["result"] is not None and time.monotonic() < _cache["expires_at"]:
+            return _cache["result"]
+
+        result = await _collect()
+        if result["status"] != "healthy":
+            logger.warning(f"Readiness check: {result['status']} {result['dependencies']}")
+
+        _cache["result"] = result
+        _cache["expires_at"] = time.monotonic() + settings.HEALTH_CACHE_TTL
+        return result
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.core.redis import get_redis
+
+# Token bucket в Redis: общий для всех процессов и воркеров.
+# Возвращает 0 если токен получен, иначе сколько секунд ждать до следующего токена.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """Распределенный token bucket: rate токенов в секунду, не больше capacity сразу"""
+
+    def __init__(self, name: str, rate: float, capacity: float = 1.0):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._script = None
+
+    async def try_acquire(self, key: str = "") -> float:
+        """Пытается взять токен; возвращает 0 при успехе или время ожидания в секундах"""
+        if self._script is None:
+            self._script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+        bucket_key = f"ratelimit:{self.name}:{key}" if key else f"ratelimit:{self.name}"
+        wait = await self._script(keys=[bucket_key], args=[self.rate, self.capacity], client=get_redis())
+        return float(wait)
+
+    async def acquire(self, key: str = "") -> float:
+        """Ждет токен; возвращает суммарное время ожидания"""
+        waited = 0.0
+        while True:
+            wait = await self.try_acquire(key)
+            if wait <= 0:
+                return waited
+            waited += wait
+            await asyncio.sleep(wait)
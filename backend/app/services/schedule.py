@@ -0,0 +1,161 @@
+"""
+Компактное расписание проверок в памяти
+
+Планировщику от сайта нужны только id, пользователь (для доли на пользователя),
+срок следующей проверки, интервал и ожидаемая стоимость проверки. Вместо
+ORM-объекта Website (килобайты на сайт) эти поля хранятся по столбцам в
+массивах array - около 40 байт на сайт, 1M сайтов умещаются в ~40 МБ.
+
+Расписание загружается потоково (server-side cursor, SCHEDULE_LOAD_BATCH строк
+за раз), сайты идут по возрастанию id, поэтому сайт находится бинарным поиском.
+Выборка просроченных сайтов векторизована через numpy, если он установлен,
+иначе идет циклом по массиву.
+"""
+import math
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import Website
+from app.services.scheduler import MIN_CHECK_COST, DueCheck
+
+try:
+    import numpy
+except ImportError:  # numpy не обязателен
+    numpy = None
+
+# last_check неизвестен (сайт проверен после загрузки расписания) - проверка без условия planned_last_check
+UNKNOWN = math.nan
+
+
+class Schedule:
+    """Расписание проверок: по элементу каждого массива на сайт"""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.user_ids = array("q")
+        self.next_due = array("d")  # Срок следующей проверки (unix)
+        self.intervals = array("i")
+        self.costs = array("f")  # Ожидаемая длительность проверки (секунды)
+        self.last_checks = array("d")  # unix, 0 - еще не проверялся
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Размер массивов в байтах"""
+        columns = (self.ids, self.user_ids, self.next_due, self.intervals, self.costs, self.last_checks)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def append(
+            self,
+            website_id: int,
+            user_id: int,
+            last_check: datetime | None,
+            created_at: datetime | None,
+            interval: int | None,
+            response_time: float | None,
+            timeout: int | None
+    ) -> None:
+        """Добавляет сайт (id должны возрастать)"""
+        interval = interval or settings.DEFAULT_CHECK_INTERVAL
+        self.ids.append(website_id)
+        self.user_ids.append(user_id)
+        self.intervals.append(interval)
+        self.costs.append(_cost(response_time, timeout))
+        if last_check is None:
+            # Еще не проверялся: просрочен с момента создания
+            self.last_checks.append(0.0)
+            self.next_due.append(created_at.timestamp() if created_at else 0.0)
+        else:
+            self.last_checks.append(last_check.timestamp())
+            self.next_due.append(last_check.timestamp() + interval)
+
+    def index(self, website_id: int) -> int | None:
+        position = bisect_left(self.ids, website_id)
+        if position < len(self.ids) and self.ids[position] == website_id:
+            return position
+        return None
+
+    def due(self, now: float) -> list[DueCheck]:
+        """Сайты, срок проверки которых наступил"""
+        if numpy is not None and len(self):
+            next_due = numpy.frombuffer(self.next_due, dtype=numpy.float64)
+            indices = numpy.flatnonzero(next_due <= now).tolist()
+            del next_due  # Освобождаем буфер массива, иначе его нельзя будет расширить
+        else:
+            indices = [i for i, due_at in enumerate(self.next_due) if due_at <= now]
+
+        due = []
+        for i in indices:
+            last_check = self.last_checks[i]
+            due.append(DueCheck(
+                self.ids[i],
+                self.user_ids[i],
+                now - self.next_due[i],
+                self.costs[i],
+                None if math.isnan(last_check) else last_check,
+            ))
+        return due
+
+    def apply_states(self, states: dict[int, dict[str, Any]]) -> None:
+        """Накладывает живое состояние сайтов (SITE_STATE_STORE=redis), еще не записанное в БД"""
+        for website_id, state in states.items():
+            i = self.index(website_id)
+            if i is None or state["last_check"] is None:
+                continue
+            last_check = state["last_check"].timestamp()
+            self.last_checks[i] = last_check
+            self.next_due[i] = last_check + self.intervals[i]
+            if state["response_time"] is not None:
+                self.costs[i] = _cost(state["response_time"], None)
+
+    def mark_checked(self, website_id: int, checked_at: float) -> None:
+        """Переносит срок после проверки, выполненной этим процессом (до следующей загрузки)"""
+        i = self.index(website_id)
+        if i is not None:
+            self.last_checks[i] = UNKNOWN
+            self.next_due[i] = checked_at + self.intervals[i]
+
+
+def _cost(response_time: float | None, timeout: int | None) -> float:
+    # Ожидаемая длительность проверки: последнее время ответа, для недоступных - таймаут
+    if response_time is not None:
+        cost = response_time / 1000
+    else:
+        cost = float(timeout or settings.DEFAULT_TIMEOUT)
+    return max(cost, MIN_CHECK_COST)
+
+
+async def load_schedule(db: AsyncSession, batch_size: int | None = None) -> Schedule:
+    """Загружает расписание всех активных сайтов потоково, без ORM-объектов"""
+    query = (
+        select(
+            Website.id,
+            Website.user_id,
+            Website.last_check,
+            Website.created_at,
+            Website.check_interval,
+            Website.response_time,
+            Website.timeout,
+        )
+        .where(
+            Website.is_active == True,
+            Website.status != "stopped"
+        )
+        .order_by(Website.id)
+        .execution_options(yield_per=batch_size or settings.SCHEDULE_LOAD_BATCH)
+    )
+
+    schedule = Schedule()
+    result = await db.stream(query)
+    async for rows in result.partitions():
+        for row in rows:
+            schedule.append(*row)
+    return schedule
@@ -0,0 +1,228 @@
+"""
+Планирование проверок с учетом загрузки воркеров (backpressure)
+
+Каждый тик check_all_websites ставит в очередь не все сайты, которые пора
+проверить, а столько, сколько воркеры успеют выполнить: в очереди брокера
+держится примерно SCHEDULER_TARGET_BACKLOG секунд работы. Пропускная
+способность воркеров оценивается по счетчику завершенных проверок в Redis.
+При нехватке мощности первыми идут самые просроченные сайты, остальные
+остаются "due" и попадают в следующий тик.
+
+Бюджет тика делится между пользователями по deficit round-robin: за раунд
+каждый пользователь получает SCHEDULER_USER_QUANTUM секунд работы воркера,
+а проверка стоит столько, сколько она обычно длится. Так владелец тысяч
+сайтов (или медленных сайтов) не вытесняет остальных, а число его проверок
+в очереди ограничено SCHEDULER_USER_MAX_IN_FLIGHT.
+"""
+import time
+from collections import defaultdict, deque
+from typing import NamedTuple
+
+from app.core.celery_app import SCHEDULED_QUEUE
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import (
+    SCHEDULER_DEFERRED,
+    SCHEDULER_DUE,
+    SCHEDULER_MAX_OVERDUE,
+    SCHEDULER_THROUGHPUT,
+    SCHEDULER_USER_DEFERRED,
+    SCHEDULER_USER_MAX_OVERDUE,
+    SCHEDULER_USERS_DEFERRED,
+)
+from app.core.redis import get_redis
+from app.services.check_lease import SCHEDULER_SOURCE, acquire_check_leases, filter_in_flight
+from app.services.health import get_queue_depths
+
+logger = get_logger("services.scheduler")
+
+COMPLETED_KEY = "scheduler:completed"
+STATE_KEY = "scheduler:throughput"
+
+# Вес нового замера в скользящей оценке пропускной способности
+RATE_SMOOTHING = 0.3
+
+# Минимальная стоимость проверки (секунды работы воркера)
+MIN_CHECK_COST = 0.1
+
+# Сколько самых отстающих пользователей попадает в метрики (метка rank)
+SCHEDULER_LAG_TOP_USERS = 10
+
+
+class DueCheck(NamedTuple):
+    """Сайт, который пора проверить"""
+    website_id: int
+    user_id: int
+    overdue: float  # На сколько секунд просрочена проверка
+    cost: float  # Ожидаемая длительность проверки (секунды)
+    last_check: float | None  # last_check на момент выборки (unix, 0 - еще не проверялся, None - неизвестен)
+
+
+async def record_check_completed() -> None:
+    """Учитывает завершенную проверку (для оценки пропускной способности воркеров)"""
+    await get_redis().incr(COMPLETED_KEY)
+
+
+async def estimate_throughput(depth: int) -> float:
+    """
+    Оценка пропускной способности воркеров, проверок в секунду
+
+    Если очередь не пустела между тиками, воркеры были загружены полностью
+    и замер отражает их предел - оценка сглаживается к нему. Иначе воркеры
+    простаивали, и замер может только поднять оценку.
+    """
+    redis = get_redis()
+    now = time.time()
+    completed = int(await redis.get(COMPLETED_KEY) or 0)
+    state = {key.decode(): float(value) for key, value in (await redis.hgetall(STATE_KEY)).items()}
+
+    rate = state.get("rate", 0.0)
+    elapsed = now - state["ts"] if "ts" in state else 0.0
+    if elapsed > 0:
+        measured = max(completed - state["completed"], 0) / elapsed
+        if state["depth"] > 0 and depth > 0:
+            rate = measured if rate == 0 else RATE_SMOOTHING * measured + (1 - RATE_SMOOTHING) * rate
+        else:
+            rate = max(rate, measured)
+
+    await redis.hset(STATE_KEY, mapping={"ts": now, "completed": completed, "depth": depth, "rate": rate})
+    return rate
+
+
+def dispatch_budget(depth: int, rate: float) -> int:
+    """Сколько проверок можно поставить в очередь на этом тике"""
+    if rate <= 0:
+        # Оценки еще нет: ограничиваемся минимумом, пока очередь не разберут
+        budget = settings.SCHEDULER_MAX_DISPATCH if depth == 0 else settings.SCHEDULER_MIN_DISPATCH
+    else:
+        target = rate * settings.SCHEDULER_TARGET_BACKLOG
+        budget = int(target - depth)
+        if depth == 0:
+            # Очередь пуста - воркеры недогружены, оценка занижена
+            budget = max(int(target * 2), settings.SCHEDULER_MIN_DISPATCH)
+    return min(max(budget, 0), settings.SCHEDULER_MAX_DISPATCH)
+
+
+def fair_share(candidates: list[DueCheck], budget: int, in_flight: dict[int, int]) -> list[DueCheck]:
+    """
+    Deficit round-robin по пользователям
+
+    Args:
+        candidates: Проверки без аренды, отсортированные по просрочке (самые старые первыми)
+        budget: Сколько проверок можно выбрать
+        in_flight: Сколько проверок каждого пользователя уже в очереди или выполняется
+
+    Returns:
+        list[DueCheck]: Выбранные проверки в порядке постановки в очередь
+    """
+    # Пользователь с самой просроченной проверкой обслуживается в раунде первым
+    queues: dict[int, deque[DueCheck]] = {}
+    for check in candidates:
+        queues.setdefault(check.user_id, deque()).append(check)
+
+    cap = settings.SCHEDULER_USER_MAX_IN_FLIGHT
+    in_flight = defaultdict(int, in_flight)
+    deficit: dict[int, float] = defaultdict(float)
+    selected: list[DueCheck] = []
+
+    active = [user_id for user_id in queues if in_flight[user_id] < cap]
+    while active and len(selected) < budget:
+        next_round = []
+        for user_id in active:
+            queue = queues[user_id]
+            deficit[user_id] += settings.SCHEDULER_USER_QUANTUM
+            while queue and deficit[user_id] >= queue[0].cost and in_flight[user_id] < cap:
+                if len(selected) >= budget:
+                    return selected
+                check = queue.popleft()
+                deficit[user_id] -= check.cost
+                in_flight[user_id] += 1
+                selected.append(check)
+            if queue and in_flight[user_id] < cap:
+                next_round.append(user_id)
+        active = next_round
+    return selected
+
+
+def _report_user_lag(due: list[DueCheck], selected: list[DueCheck]) -> None:
+    """
+    Метрики отставания по пользователям: SCHEDULER_LAG_TOP_USERS самых отстающих по rank
+
+    Все ранги пишутся на каждом тике (свободные - нулями), поэтому число серий
+    не зависит от числа пользователей. Кто именно отстает - в логе.
+    """
+    max_overdue: dict[int, float] = {}
+    deferred: dict[int, int] = defaultdict(int)
+    chosen = {check.website_id for check in selected}
+    for check in due:
+        max_overdue[check.user_id] = max(max_overdue.get(check.user_id, 0.0), check.overdue)
+        if check.website_id not in chosen:
+            deferred[check.user_id] += 1
+
+    top = sorted(max_overdue, key=max_overdue.get, reverse=True)[:SCHEDULER_LAG_TOP_USERS]
+    for rank in range(SCHEDULER_LAG_TOP_USERS):
+        user_id = top[rank] if rank < len(top) else None
+        SCHEDULER_USER_MAX_OVERDUE.labels(str(rank + 1)).set(max_overdue[user_id] if user_id is not None else 0)
+        SCHEDULER_USER_DEFERRED.labels(str(rank + 1)).set(deferred[user_id] if user_id is not None else 0)
+    SCHEDULER_USERS_DEFERRED.set(len(deferred))
+
+    if deferred:
+        logger.info(
+            "Most lagging users: "
+            + ", ".join(f"{user_id} ({max_overdue[user_id]:.0f}s, {deferred[user_id]} deferred)" for user_id in top)
+        )
+
+
+async def claim_checks(due: list[DueCheck], budget: int, source: str) -> tuple[list[int], int]:
+    """
+    Выбирает до budget проверок (доля каждого пользователя, самые просроченные) и берет на них аренду
+
+    Returns:
+        tuple[list[int], int]: ID сайтов с арендой и число отложенных проверок
+    """
+    # Самые просроченные - первыми
+    due = sorted(due, key=lambda check: check.overdue, reverse=True)
+    waiting = set(await filter_in_flight([check.website_id for check in due], source))
+    candidates = [check for check in due if check.website_id in waiting]
+
+    # Проверки в очереди почти всегда просрочены, поэтому их число по пользователю
+    # оценивается по его сайтам из due, у которых есть аренда
+    in_flight: dict[int, int] = defaultdict(int)
+    for check in due:
+        if check.website_id not in waiting:
+            in_flight[check.user_id] += 1
+
+    chosen = fair_share(candidates, budget, in_flight)
+    selected = await acquire_check_leases([check.website_id for check in chosen], source)
+    deferred = len(candidates) - len(selected)
+
+    SCHEDULER_DUE.set(len(due))
+    SCHEDULER_DEFERRED.set(deferred)
+    SCHEDULER_MAX_OVERDUE.set(due[0].overdue if due else 0)
+    _report_user_lag(due, chosen)
+    return selected, deferred
+
+
+async def plan_dispatch(due: list[DueCheck]) -> list[int]:
+    """
+    Выбирает сайты для постановки в очередь Celery на этом тике
+
+    Args:
+        due: Все сайты, которые пора проверить
+
+    Returns:
+        list[int]: ID сайтов, для которых взята аренда проверки - их нужно поставить в очередь
+    """
+    depth = (await get_queue_depths()).get(SCHEDULED_QUEUE, 0)
+    rate = await estimate_throughput(depth)
+    budget = dispatch_budget(depth, rate)
+
+    selected, deferred = await claim_checks(due, budget, SCHEDULER_SOURCE)
+    SCHEDULER_THROUGHPUT.set(rate)
+
+    if deferred:
+        logger.warning(
+            f"Backpressure: queue depth {depth}, throughput {rate:.1f}/s, "
+            f"dispatching {len(selected)} of {len(selected) + deferred} due checks - consider adding workers"
+        )
+    return selected
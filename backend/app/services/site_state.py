@@ -0,0 +1,407 @@
+"""
+Живое состояние сайтов в Redis (SITE_STATE_STORE=redis)
+
+Каждая проверка переписывала строку websites (status, last_check, счетчики),
+а эту таблицу постоянно читает API. В режиме redis результат проверки пишется
+в hash site:state:<id>, строка websites обновляется пачками задачей
+flush_site_state, а история проверок по-прежнему пишется в website_checks.
+
+    site:state:<id>     hash с полями STATE_FIELDS и version (растет при каждом изменении),
+                        check_id и undo_* - последняя записанная проверка и состояние до нее
+    site:state:dirty    set ID сайтов, состояние которых еще не записано в БД
+
+Postgres + dirty-сайты из Redis = актуальное состояние: API и выборка сайтов
+для проверки накладывают hash поверх строки из БД. Записанные в БД hash'и
+живут SITE_STATE_TTL секунд, а несохраненные не истекают.
+"""
+from datetime import datetime, timezone
+from typing import Any, Iterable, NamedTuple
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.core.metrics import SITE_STATE_DIRTY, SITE_STATE_FLUSHED
+from app.core.redis import get_redis
+from app.models import Website
+
+STATE_PREFIX = "site:state:"
+DIRTY_KEY = "site:state:dirty"
+
+# Поля Website, которые хранятся в Redis
+STATE_FIELDS = (
+    "status",
+    "last_check",
+    "response_time",
+    "error_message",
+    "consecutive_failures",
+    "total_checks",
+    "failed_checks",
+    "last_notification_sent",
+)
+_DATETIME_FIELDS = {"last_check", "last_notification_sent"}
+_INT_FIELDS = {"consecutive_failures", "total_checks", "failed_checks"}
+
+# Результат проверки: счетчики меняются в Redis, а не читаются и пишутся обратно.
+# Если hash'а нет, он сначала заполняется состоянием из БД (ARGV[7:]).
+# ARGV[6] - ID проверки (задачи Celery): повтор той же проверки сначала откатывает
+# ее прошлую запись (undo_*), поэтому проверка не считается дважды
+RECORD_CHECK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 7))
+end
+if ARGV[6] ~= '' and redis.call('HGET', KEYS[1], 'check_id') == ARGV[6] then
+    local undo = redis.call('HMGET', KEYS[1], 'undo_status', 'undo_last_check', 'undo_response_time',
+        'undo_error_message', 'undo_consecutive_failures', 'undo_failed')
+    redis.call('HSET', KEYS[1], 'status', undo[1], 'last_check', undo[2], 'response_time', undo[3],
+        'error_message', undo[4], 'consecutive_failures', undo[5])
+    redis.call('HINCRBY', KEYS[1], 'total_checks', -1)
+    redis.call('HINCRBY', KEYS[1], 'failed_checks', -tonumber(undo[6]))
+end
+local before = redis.call('HMGET', KEYS[1], 'status', 'last_check', 'response_time', 'error_message',
+    'consecutive_failures')
+redis.call('HSET', KEYS[1], 'check_id', ARGV[6], 'undo_status', before[1] or '', 'undo_last_check', before[2] or '',
+    'undo_response_time', before[3] or '', 'undo_error_message', before[4] or '',
+    'undo_consecutive_failures', before[5] or '0', 'undo_failed', ARGV[2] == 'online' and '0' or '1')
+local previous = before[1]
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'last_check', ARGV[3], 'response_time', ARGV[4], 'error_message', ARGV[5])
+local total = redis.call('HINCRBY', KEYS[1], 'total_checks', 1)
+local failed, consecutive
+if ARGV[2] == 'online' then
+    failed = tonumber(redis.call('HGET', KEYS[1], 'failed_checks'))
+    consecutive = 0
+    redis.call('HSET', KEYS[1], 'consecutive_failures', 0)
+else
+    failed = redis.call('HINCRBY', KEYS[1], 'failed_checks', 1)
+    consecutive = redis.call('HINCRBY', KEYS[1], 'consecutive_failures', 1)
+end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[1])
+return {previous, total, failed, consecutive, redis.call('HGET', KEYS[1], 'last_notification_sent')}
+"""
+
+# Изменение состояния вне проверки (остановка, запуск): только если hash уже есть,
+# иначе актуальное состояние и так в БД
+UPDATE_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Снимает отметку dirty, если после чтения состояние не менялось
+MARK_FLUSHED_SCRIPT = """
+local prefix = ARGV[1]
+local ttl = tonumber(ARGV[2])
+local flushed = 0
+for i = 3, #ARGV, 2 do
+    local key = prefix .. ARGV[i]
+    if redis.call('HGET', key, 'version') == ARGV[i + 1] then
+        redis.call('SREM', KEYS[1], ARGV[i])
+        redis.call('EXPIRE', key, ttl)
+        flushed = flushed + 1
+    end
+end
+return flushed
+"""
+
+_scripts: dict[str, Any] = {}
+
+
+class RecordedCheck(NamedTuple):
+    """Состояние сайта после записи результата проверки"""
+    previous_status: str | None
+    total_checks: int
+    failed_checks: int
+    consecutive_failures: int
+    last_notification_sent: datetime | None
+
+
+def enabled() -> bool:
+    return settings.SITE_STATE_STORE == "redis"
+
+
+def _state_key(website_id: int) -> str:
+    return f"{STATE_PREFIX}{website_id}"
+
+
+def _script(source: str):
+    if source not in _scripts:
+        _scripts[source] = get_redis().register_script(source)
+    return _scripts[source]
+
+
+def _encode(field: str, value: Any) -> str:
+    if value is None:
+        return "0" if field in _INT_FIELDS else ""
+    if field in _DATETIME_FIELDS:
+        return repr(value.timestamp())
+    return str(value)
+
+
+def _decode(field: str, raw: bytes | None) -> Any:
+    if raw is None or raw == b"":
+        return None
+    value = raw.decode()
+    if field in _DATETIME_FIELDS:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    if field in _INT_FIELDS:
+        return int(value)
+    if field == "response_time":
+        return float(value)
+    return value
+
+
+def _decode_state(raw: list[bytes | None]) -> dict[str, Any] | None:
+    """Значения HMGET STATE_FIELDS; None - hash'а нет"""
+    if raw[0] is None:  # status есть в каждом hash'е
+        return None
+    return {field: _decode(field, value) for field, value in zip(STATE_FIELDS, raw)}
+
+
+async def load_states(website_ids: Iterable[int]) -> dict[int, dict[str, Any]]:
+    """Живое состояние сайтов, у которых есть hash"""
+    website_ids = list(website_ids)
+    if not website_ids:
+        return {}
+
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for website_id in website_ids:
+            pipe.hmget(_state_key(website_id), STATE_FIELDS)
+        results = await pipe.execute()
+
+    states = {}
+    for website_id, raw in zip(website_ids, results):
+        state = _decode_state(raw)
+        if state is not None:
+            states[website_id] = state
+    return states
+
+
+async def load_dirty_states() -> dict[int, dict[str, Any]]:
+    """Состояние сайтов, которое еще не записано в БД"""
+    website_ids = [int(member) for member in await get_redis().smembers(DIRTY_KEY)]
+    return await load_states(website_ids)
+
+
+def apply_state(website: Website, state: dict[str, Any]) -> None:
+    """Накладывает живое состояние на объект Website, не помечая его измененным"""
+    for field, value in state.items():
+        set_committed_value(website, field, value)
+
+
+async def overlay_live_state(websites: Iterable[Website]) -> None:
+    """Подставляет в сайты состояние из Redis (для ответов API)"""
+    if not enabled():
+        return
+    websites = list(websites)
+    states = await load_states(website.id for website in websites)
+    for website in websites:
+        state = states.get(website.id)
+        if state is not None:
+            apply_state(website, state)
+
+
+async def record_check(
+        db: AsyncSession,
+        website: Website,
+        status: str,
+        checked_at: datetime,
+        response_time: float | None,
+        error_message: str | None,
+        check_id: str | None = None
+) -> RecordedCheck:
+    """
+    Записывает результат проверки и возвращает новое состояние сайта
+
+    Счетчики увеличиваются атомарно на стороне хранилища: в Postgres - одним
+    UPDATE ... RETURNING (в транзакции db, commit делает вызывающий), в Redis -
+    скриптом над hash'ем. Предыдущий статус (для уведомления о восстановлении)
+    возвращается тем же запросом. Новое состояние подставляется в website
+    без пометки объекта измененным.
+
+    check_id (режим redis) - ID проверки, одинаковый у ее повторов: запись в Redis
+    не откатывается вместе с транзакцией, и повтор заменяет прошлую запись, а не добавляет вторую.
+    """
+    if enabled():
+        recorded = await _record_check_redis(website, status, checked_at, response_time, error_message, check_id)
+    else:
+        recorded = await _record_check_db(db, website.id, status, checked_at, response_time, error_message)
+
+    apply_state(website, {
+        "status": status,
+        "last_check": checked_at,
+        "response_time": response_time,
+        "error_message": error_message,
+        "total_checks": recorded.total_checks,
+        "failed_checks": recorded.failed_checks,
+        "consecutive_failures": recorded.consecutive_failures,
+        "last_notification_sent": recorded.last_notification_sent,
+    })
+    return recorded
+
+
+async def _record_check_db(
+        db: AsyncSession,
+        website_id: int,
+        status: str,
+        checked_at: datetime,
+        response_time: float | None,
+        error_message: str | None
+) -> RecordedCheck:
+    failed = status != "online"
+    # Строка блокируется в подзапросе, поэтому previous.status - статус непосредственно до этого UPDATE
+    previous = (
+        select(Website.id, Website.status)
+        .where(Website.id == website_id)
+        .with_for_update()
+        .subquery("previous")
+    )
+    statement = (
+        update(Website)
+        .where(Website.id == previous.c.id)
+        .values(
+            status=status,
+            last_check=checked_at,
+            response_time=response_time,
+            error_message=error_message,
+            total_checks=func.coalesce(Website.total_checks, 0) + 1,
+            failed_checks=func.coalesce(Website.failed_checks, 0) + int(failed),
+            consecutive_failures=func.coalesce(Website.consecutive_failures, 0) + 1 if failed else 0,
+        )
+        .returning(
+            previous.c.status,
+            Website.total_checks,
+            Website.failed_checks,
+            Website.consecutive_failures,
+            Website.last_notification_sent,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    row = (await db.execute(statement)).one()
+    return RecordedCheck(*row)
+
+
+async def _record_check_redis(
+        website: Website,
+        status: str,
+        checked_at: datetime,
+        response_time: float | None,
+        error_message: str | None,
+        check_id: str | None
+) -> RecordedCheck:
+    seed = []
+    for field in STATE_FIELDS:
+        seed += [field, _encode(field, getattr(website, field))]
+    args = [
+        website.id,
+        status,
+        _encode("last_check", checked_at),
+        _encode("response_time", response_time),
+        _encode("error_message", error_message),
+        check_id or "",
+        *seed,
+    ]
+    previous, total, failed, consecutive, notified = await _script(RECORD_CHECK_SCRIPT)(
+        keys=[_state_key(website.id), DIRTY_KEY], args=args, client=get_redis()
+    )
+    return RecordedCheck(
+        _decode("status", previous or None),
+        int(total),
+        int(failed or 0),
+        int(consecutive),
+        _decode("last_notification_sent", notified or None),
+    )
+
+
+async def recorded_check_id(website_id: int) -> str | None:
+    """ID последней проверки, записанной в Redis (см. record_check)"""
+    if not enabled():
+        return None
+    raw = await get_redis().hget(_state_key(website_id), "check_id")
+    return raw.decode() if raw else None
+
+
+async def update_state(website_id: int, **fields: Any) -> None:
+    """Меняет поля живого состояния вне проверки (API остановил или запустил мониторинг)"""
+    if not enabled():
+        return
+    args = [website_id]
+    for field, value in fields.items():
+        args += [field, _encode(field, value)]
+    await _script(UPDATE_IF_EXISTS_SCRIPT)(keys=[_state_key(website_id), DIRTY_KEY], args=args, client=get_redis())
+
+
+async def discard_state(website_id: int) -> None:
+    """Удаляет состояние удаленного сайта"""
+    if not enabled():
+        return
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(_state_key(website_id))
+        pipe.srem(DIRTY_KEY, website_id)
+        await pipe.execute()
+
+
+async def flush_states(session_maker, batch_size: int | None = None, max_batches: int = 100) -> int:
+    """
+    Записывает измененное состояние сайтов в БД пачками
+
+    Пачка читается из Redis вместе с version, пишется одним executemany UPDATE,
+    и после commit отметка dirty снимается только у сайтов, version которых
+    не изменилась (их снова проверили - запишутся следующим проходом).
+
+    Returns:
+        int: сколько сайтов записано
+    """
+    batch_size = batch_size or settings.SITE_STATE_FLUSH_BATCH
+    redis = get_redis()
+    statement = (
+        update(Website.__table__)
+        .where(Website.__table__.c.id == bindparam("b_id"))
+        .values({field: bindparam(f"b_{field}") for field in STATE_FIELDS})
+    )
+
+    flushed = 0
+    for _ in range(max_batches):
+        website_ids = [int(member) for member in await redis.srandmember(DIRTY_KEY, batch_size)]
+        if not website_ids:
+            break
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for website_id in website_ids:
+                pipe.hmget(_state_key(website_id), [*STATE_FIELDS, "version"])
+            results = await pipe.execute()
+
+        rows, versions, missing = [], [], []
+        for website_id, raw in zip(website_ids, results):
+            state = _decode_state(raw[:-1])
+            if state is None:
+                missing.append(website_id)
+                continue
+            rows.append({"b_id": website_id, **{f"b_{field}": value for field, value in state.items()}})
+            versions += [website_id, raw[-1]]
+
+        if rows:
+            async with session_maker() as db:
+                await db.execute(statement, rows)
+                await db.commit()
+            flushed += await _script(MARK_FLUSHED_SCRIPT)(
+                keys=[DIRTY_KEY],
+                args=[STATE_PREFIX, settings.SITE_STATE_TTL, *versions],
+                client=redis
+            )
+        if missing:
+            await redis.srem(DIRTY_KEY, *missing)
+
+        if len(website_ids) < batch_size:
+            break
+
+    SITE_STATE_FLUSHED.inc(flushed)
+    SITE_STATE_DIRTY.set(await redis.scard(DIRTY_KEY))
+    return flushed
@@ -1,29 +1,115 @@
-import httpx
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import TYPE_CHECKING
+
 from app.core.config import settings
 from app.core.logger import get_logger
+from app.core.metrics import TELEGRAM_SEND_DURATION
+from app.core.redis import get_redis
+from app.services.rate_limit import TokenBucket
+
+# httpx загружается при первом обращении к Telegram API
+if TYPE_CHECKING:
+    import httpx
 
 logger = get_logger("services.telegram")
 
+# Максимальная длина текста сообщения в Telegram (в единицах UTF-16, см. telegram_length)
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Ключи кэша проверки chat ID в Redis
+CHAT_VALIDATION_PREFIX = "telegram:chat_valid:"
+
+# Символы разметки Telegram Markdown (parse_mode=Markdown)
+_MARKDOWN_SPECIAL = re.compile(r"([_*`\[])")
+
+
+class TelegramRetryAfter(Exception):
+    """Telegram ответил 429: повторить отправку через retry_after секунд"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too Many Requests: retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ChatRateLimited(TelegramRetryAfter):
+    """Лимит сообщений в чат (chat_bucket) исчерпан: отправить позже, не дожидаясь токена"""
+
+    def __init__(self, retry_after: float):
+        Exception.__init__(self, f"Chat rate limit: retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# Общий лимит бота (~30 сообщений/с) и лимит на один чат (~1 сообщение/с)
+global_bucket = TokenBucket("telegram", settings.TELEGRAM_GLOBAL_RATE, settings.TELEGRAM_GLOBAL_RATE)
+chat_bucket = TokenBucket("telegram:chat", settings.TELEGRAM_CHAT_RATE, 1)
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+# Идущие проверки chat ID: chat_id -> задача getChat
+_pending_validations: dict[str, asyncio.Future] = {}
+
+
+def get_telegram_client() -> httpx.AsyncClient:
+    """Постоянный keep-alive клиент Telegram API для текущего event loop"""
+    import httpx
+
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            base_url=f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/",
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+        )
+        _client_loop = loop
+    return _client
+
+
+def telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: эмодзи вне BMP - две единицы UTF-16"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def escape_markdown(text: str) -> str:
+    """
+    Экранирует разметку в подставляемом в сообщение тексте (имя сайта, URL, ошибка)
+
+    Один непарный _ или * делает сообщение невалидным, и Telegram отклоняет его целиком.
+    """
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def _normalize_chat_id(chat_id: str) -> str:
+    if chat_id.startswith("100"):
+        return f'-{chat_id}'
+    return chat_id
+
 
-async def send_telegram_notification(chat_id: str, message: str) -> bool:
+async def send_telegram_notification(chat_id: str, message: str, wait_for_chat: bool = True) -> bool:
     """
-    Отправляет уведомление в Telegram
+    Отправляет уведомление в Telegram с учетом лимитов Telegram API
 
     Args:
         chat_id: ID чата/пользователя в Telegram
         message: Текст сообщения (поддерживает Markdown)
+        wait_for_chat: ждать токен лимита чата; False - сразу ChatRateLimited
 
     Returns:
         bool: True если сообщение отправлено успешно
+
+    Raises:
+        TelegramRetryAfter: Telegram вернул 429, отправку нужно повторить позже
+        ChatRateLimited: лимит чата исчерпан (только при wait_for_chat=False)
     """
     if not settings.TELEGRAM_BOT_TOKEN:
         logger.warning("Telegram bot token not configured")
         return False
 
-    if chat_id.startswith("100"):
-        chat_id = f'-{chat_id}'
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-
+    chat_id = _normalize_chat_id(chat_id)
     payload = {
         "chat_id": chat_id,
         "text": message,
@@ -31,27 +117,74 @@ async def send_telegram_notification(chat_id: str, message: str) -> bool:
         "disable_web_page_preview": True
     }
 
+    if wait_for_chat:
+        await chat_bucket.acquire(chat_id)
+    else:
+        wait = await chat_bucket.try_acquire(chat_id)
+        if wait > 0:
+            raise ChatRateLimited(wait)
+    await global_bucket.acquire()
+
+    start = time.perf_counter()
+    result = "error"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Telegram notification sent to {chat_id}")
-            return True
-
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Failed to send Telegram notification: {e.response.status_code}")
-        logger.error(f"Response: {e.response.text}")
-        return False
+        response = await get_telegram_client().post("sendMessage", json=payload)
+
+        if response.status_code == 429:
+            result = "429"
+            retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            logger.warning(f"Telegram rate limit hit for {chat_id}, retry after {retry_after}s")
+            raise TelegramRetryAfter(retry_after)
+
+        if response.is_error:
+            result = str(response.status_code)
+            logger.error(f"Failed to send Telegram notification: {response.status_code}")
+            logger.error(f"Response: {response.text}")
+            return False
+
+        result = "sent"
+        logger.info(f"Telegram notification sent to {chat_id}")
+        return True
+
+    except TelegramRetryAfter:
+        raise
 
     except Exception as e:
         logger.error(f"Error sending Telegram notification: {e}")
         return False
 
+    finally:
+        TELEGRAM_SEND_DURATION.labels(result).observe(time.perf_counter() - start)
+
+
+async def _get_cached_validation(chat_id: str) -> bool | None:
+    try:
+        cached = await get_redis().get(f"{CHAT_VALIDATION_PREFIX}{chat_id}")
+    except Exception as e:
+        logger.warning(f"Chat ID cache unavailable: {e}")
+        return None
+    if cached is None:
+        return None
+    return cached == b"1"
+
+
+async def _cache_validation(chat_id: str, is_valid: bool) -> None:
+    ttl = settings.TELEGRAM_CHAT_CACHE_TTL if is_valid else settings.TELEGRAM_CHAT_NEGATIVE_TTL
+    try:
+        await get_redis().set(f"{CHAT_VALIDATION_PREFIX}{chat_id}", "1" if is_valid else "0", ex=ttl)
+    except Exception as e:
+        logger.warning(f"Chat ID cache unavailable: {e}")
+
 
 async def validate_telegram_chat_id(chat_id: str) -> bool:
     """
     Проверяет валидность Telegram Chat ID
 
+    Результат кэшируется в Redis (общий кэш для всех реплик API): валидные ID
+    на TELEGRAM_CHAT_CACHE_TTL, отклоненные Telegram - на TELEGRAM_CHAT_NEGATIVE_TTL.
+    "chat not found" (пользователь еще не написал боту), сетевые ошибки и ответы
+    5xx/429 не кэшируются. Одновременные проверки одного чата ждут одного getChat.
+
     Args:
         chat_id: ID чата для проверки
 
@@ -61,15 +194,46 @@ async def validate_telegram_chat_id(chat_id: str) -> bool:
     if not settings.TELEGRAM_BOT_TOKEN:
         return False
 
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/getChat"
-    if chat_id.startswith("100"):
-        chat_id = f'-{chat_id}'
+    chat_id = _normalize_chat_id(chat_id)
+    cached = await _get_cached_validation(chat_id)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    future = _pending_validations.get(chat_id)
+    if future is None or future.get_loop() is not loop:
+        future = loop.create_task(_request_validation(chat_id))
+        _pending_validations[chat_id] = future
+        future.add_done_callback(
+            lambda done: _pending_validations.pop(chat_id) if _pending_validations.get(chat_id) is done else None
+        )
+    # Отмена одного запроса не прерывает проверку, которой ждут другие
+    return await asyncio.shield(future)
+
+
+async def _request_validation(chat_id: str) -> bool:
+    """Запрос getChat и запись результата в кэш"""
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(url, params={"chat_id": chat_id})
-            response.raise_for_status()
-            return True
-
+        response = await get_telegram_client().get("getChat", params={"chat_id": chat_id})
     except Exception as e:
-        logger.warning(f"Invalid Telegram chat ID {chat_id}: {e}")
+        logger.warning(f"Could not validate Telegram chat ID {chat_id}: {e}")
+        return False
+
+    if response.is_success:
+        await _cache_validation(chat_id, True)
+        return True
+
+    # 400/403/404 - Telegram не знает чат или бот не имеет к нему доступа
+    logger.warning(f"Invalid Telegram chat ID {chat_id}: {response.status_code}")
+    if response.status_code in (400, 403, 404) and not _chat_not_found(response):
+        await _cache_validation(chat_id, False)
+    return False
+
+
+def _chat_not_found(response: httpx.Response) -> bool:
+    """Чат станет доступен, как только пользователь напишет боту: такой ответ не кэшируется"""
+    try:
+        description = response.json().get("description", "")
+    except Exception:
         return False
+    return "chat not found" in description.lower()
@@ -0,0 +1,11 @@
+import asyncio
+
+
+# Создаем единый event loop для всех задач Celery
+def get_or_create_eventloop():
+    try:
+        return asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
@@ -0,0 +1,43 @@
+"""
+Постановка задач мониторинга в очередь по имени
+
+API ставит задачи через send_task и не импортирует app.tasks.monitor
+(код проверки, curl_cffi) - модули задач загружают только воркеры.
+"""
+import time
+
+from app.core.celery_app import INTERACTIVE_QUEUE, celery_app
+from app.services.check_lease import release_check_lease, take_over_check_lease
+
+CHECK_WEBSITE_TASK = "app.tasks.monitor.check_website"
+STOP_MONITORING_TASK = "app.tasks.monitor.stop_website_monitoring"
+
+
+async def schedule_check(website_id: int, source: str = "manual") -> bool:
+    """
+    Ставит проверку сайта в очередь interactive, если она еще не в очереди и не выполняется
+
+    Плановая проверка, ждущая в очереди scheduled, не мешает: ручная забирает ее аренду.
+
+    Returns:
+        bool: True если проверка поставлена, False если это был бы дубль
+    """
+    if not await take_over_check_lease(website_id, source):
+        return False
+    try:
+        celery_app.send_task(
+            CHECK_WEBSITE_TASK,
+            args=(website_id,),
+            kwargs={"enqueued_at": time.time()},
+            queue=INTERACTIVE_QUEUE
+        )
+    except Exception:
+        # Задача не поставлена: без этого сайт нельзя проверить до истечения CHECK_LEASE_TTL
+        await release_check_lease(website_id, source)
+        raise
+    return True
+
+
+def stop_website_monitoring(website_id: int) -> None:
+    """Ставит остановку мониторинга сайта в очередь (maintenance, по task_routes)"""
+    celery_app.send_task(STOP_MONITORING_TASK, args=(website_id,))
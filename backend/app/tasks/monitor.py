@@ -1,27 +1,121 @@
-import httpx
+from __future__ import annotations
+
 import asyncio
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.celery_app import celery_app
-from app.core.logger import get_logger
+from app.core.celery_app import INTERACTIVE_QUEUE, celery_app
+from app.core.config import settings
+from app.core.logger import SAMPLED, get_logger
+from app.core.metrics import (
+    CHECK_LATENCY,
+    CHECK_SLO_VIOLATIONS,
+    CHECKS_TOTAL,
+    PROBE_CONNECTIONS,
+    PROBE_DURATION,
+    PROBE_HTTP2_FALLBACKS,
+    SCHEDULER_LAG,
+)
+from app.core.tracing import record_span, span
 from app.db.session import async_session_maker, engine
-from app.models import User, Website, WebsiteCheck
-from app.services.telegram import send_telegram_notification
-
-from curl_cffi.requests import AsyncSession as CurlAsyncSession
+from app.models import User, Website, WebsiteCheck, NotificationOutbox
+from app.services import dns_cache, site_state
+from app.services.check_lease import (
+    SCHEDULER_SOURCE,
+    extend_check_lease,
+    release_check_lease,
+    release_check_leases,
+)
+from app.services.schedule import Schedule, load_schedule
+from app.services.scheduler import DueCheck, plan_dispatch, record_check_completed
+from app.services.telegram import escape_markdown
+from app.tasks.base import get_or_create_eventloop
+from app.tasks.dispatch import CHECK_WEBSITE_TASK, STOP_MONITORING_TASK
+
+# curl_cffi загружается при первой проверке: воркеры обслуживания и уведомлений его не используют
+if TYPE_CHECKING:
+    from curl_cffi.requests import AsyncSession as CurlAsyncSession
 
 logger = get_logger("tasks.monitor")
 
+# Ошибки протокола HTTP/2 (CURLE_HTTP2, CURLE_HTTP2_STREAM), после которых проверка повторяется по HTTP/1.1
+HTTP2_ERRORS = (16, 92)
+# Сколько секунд origin после такой ошибки проверяется только по HTTP/1.1
+HTTP2_FALLBACK_TTL = 3600
 
-# Создаем единый event loop для всех задач Celery
-def get_or_create_eventloop():
-    try:
-        return asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop
+# CURLINFO_HTTP_VERSION -> метка метрики
+HTTP_VERSIONS = {1: "1.0", 2: "1.1", 3: "2", 30: "3"}
+
+# origin -> до какого момента (monotonic) проверять его по HTTP/1.1
+_http1_origins: dict[str, float] = {}
+
+# Адреса сайта из DNS-кэша для запроса текущей проверки (CURLOPT_RESOLVE, см. probe_session)
+_resolve_entries: ContextVar[list[str] | None] = ContextVar("resolve_entries", default=None)
+
+
+@lru_cache(maxsize=1)
+def probe_timings() -> list:
+    """Тайминги curl (в секундах от начала запроса), из которых считаются фазы проверки, и число новых соединений"""
+    from curl_cffi import CurlInfo
+
+    return [
+        CurlInfo.NAMELOOKUP_TIME,
+        CurlInfo.CONNECT_TIME,
+        CurlInfo.APPCONNECT_TIME,
+        CurlInfo.STARTTRANSFER_TIME,
+        CurlInfo.TOTAL_TIME,
+        CurlInfo.NUM_CONNECTS,
+    ]
+
+
+def probe_session_options() -> dict:
+    """
+    Параметры общей curl-сессии (демон app.probe)
+
+    С PIPEWAIT одновременные проверки одного origin не открывают каждая свое
+    соединение, а ждут уже открываемое и, если сервер согласовал HTTP/2,
+    мультиплексируются в нем.
+    """
+    from curl_cffi import CurlOpt
+
+    return {
+        "curl_infos": probe_timings(),
+        "curl_options": {CurlOpt.PIPEWAIT: 1} if settings.PROBE_HTTP2 else None,
+    }
+
+
+def probe_session(**kwargs) -> CurlAsyncSession:
+    """
+    curl-сессия для проверок
+
+    Имя сайта резолвит DNS-кэш процесса (app.services.dns_cache) в _fetch,
+    а curl получает готовые адреса через CURLOPT_RESOLVE.
+    """
+    return _probe_session_class()(**kwargs)
+
+
+@lru_cache(maxsize=1)
+def _probe_session_class() -> type:
+    from curl_cffi import CurlOpt
+    from curl_cffi.requests import AsyncSession
+
+    class ProbeSession(AsyncSession):
+        async def pop_curl(self):
+            # Список RESOLVE handle очищается после запроса (release_curl)
+            curl = await super().pop_curl()
+            entries = _resolve_entries.get()
+            if entries:
+                curl.setopt(CurlOpt.RESOLVE, entries)
+            return curl
+
+    return ProbeSession
 
 
 @celery_app.task(name="app.tasks.monitor.check_all_websites")
@@ -35,33 +129,47 @@ def check_all_websites():
         loop.run_until_complete(engine.dispose())
 
 
-async def _check_all_websites():
-    """Async implementation"""
-    async with async_session_maker() as db:
-        try:
-            now = datetime.now(timezone.utc)
+async def load_current_schedule(db: AsyncSession) -> Schedule:
+    """Расписание всех активных сайтов с учетом результатов, еще не записанных в БД"""
+    schedule = await load_schedule(db)
+    if site_state.enabled():
+        schedule.apply_states(await site_state.load_dirty_states())
+    return schedule
 
-            # Находим все активные сайты, которые нужно проверить
-            query = select(Website).where(
-                Website.is_active == True,
-                Website.status != "stopped"
-            )
 
-            result = await db.execute(query)
-            websites = result.scalars().all()
+async def collect_due_checks(db: AsyncSession) -> list[DueCheck]:
+    """Все активные сайты, которые пора проверить"""
+    schedule = await load_current_schedule(db)
+    return schedule.due(time.time())
 
-            tasks = []
-            for website in websites:
-                if website.last_check is None:
-                    should_check = True
-                else:
-                    time_since_check = (now - website.last_check).total_seconds()
-                    should_check = time_since_check >= website.check_interval
 
-                if should_check:
-                    tasks.append(check_website.delay(website.id))
+async def _check_all_websites():
+    """Async implementation"""
+    if settings.CHECK_RUNNER == "probe":
+        # Проверки выполняет демон app.probe, он сам выбирает сайты из БД
+        logger.debug("CHECK_RUNNER=probe, skipping Celery dispatch")
+        return
+
+    async with async_session_maker() as db:
+        try:
+            due = await collect_due_checks(db)
+
+            # Сколько ставить и кого первым решает планировщик (backpressure, доля каждого
+            # пользователя, самые просроченные), сайты, проверка которых еще в очереди или выполняется, пропускаются
+            scheduled = await plan_dispatch(due)
+            last_checks = {check.website_id: check.last_check for check in due}
+            enqueued_at = time.time()
+            dispatched = 0
+            try:
+                for website_id in scheduled:
+                    check_website.delay(website_id, enqueued_at=enqueued_at, planned_last_check=last_checks[website_id])
+                    dispatched += 1
+            except Exception:
+                # Не поставленные в очередь сайты не должны ждать истечения CHECK_LEASE_TTL
+                await release_check_leases(scheduled[dispatched:], SCHEDULER_SOURCE)
+                raise
 
-            logger.info(f"Scheduled {len(tasks)} website checks")
+            logger.info(f"Scheduled {len(scheduled)} of {len(due)} due website checks")
 
         except Exception as e:
             logger.error(f"Error in check_all_websites: {e}")
@@ -70,48 +178,221 @@ async def _check_all_websites():
             await db.close()
 
 
-@celery_app.task(name="app.tasks.monitor.check_website", bind=True, max_retries=3)
-def check_website(self, website_id: int):
-    """Проверяет конкретный сайт"""
+@celery_app.task(name=CHECK_WEBSITE_TASK, bind=True, max_retries=3)
+def check_website(
+        self,
+        website_id: int,
+        enqueued_at: float | None = None,
+        planned_last_check: float | None = None
+):
+    """
+    Проверяет конкретный сайт
+
+    enqueued_at - время постановки в очередь (unix), для замера задержки до результата
+    planned_last_check - last_check, по которому планировщик выбрал сайт (см. _check_website)
+    """
     loop = get_or_create_eventloop()
+    retrying = False
+    queue = (self.request.delivery_info or {}).get("routing_key") or "unknown"
+    with span("check_website", website_id=website_id, queue=queue, retries=self.request.retries):
+        if enqueued_at is not None:
+            record_span("queue_wait", enqueued_at, time.time())
+        try:
+            loop.run_until_complete(
+                _check_website(website_id, planned_last_check=planned_last_check, check_id=self.request.id)
+            )
+        except Exception as exc:
+            logger.error(f"Error checking website {website_id}: {exc}")
+            # Повтор остается в очереди - аренду не снимаем, а продлеваем
+            retrying = self.request.retries < self.max_retries
+            if retrying:
+                loop.run_until_complete(extend_check_lease(website_id))
+            raise self.retry(exc=exc, countdown=60)
+        finally:
+            try:
+                if not retrying:
+                    # Аренду плановой проверки могла забрать ручная (schedule_check) - ее не трогаем
+                    owner = None if queue == INTERACTIVE_QUEUE else SCHEDULER_SOURCE
+                    loop.run_until_complete(release_check_lease(website_id, owner))
+                    # Пропускную способность планировщик оценивает только по плановым проверкам
+                    if queue != INTERACTIVE_QUEUE:
+                        loop.run_until_complete(record_check_completed())
+                    if enqueued_at is not None:
+                        _observe_check_latency(queue, website_id, time.time() - enqueued_at)
+            except Exception as e:
+                logger.warning(f"Error releasing check lease for website {website_id}: {e}")
+            # Dispose engine для освобождения соединений
+            try:
+                loop.run_until_complete(engine.dispose())
+            except Exception as e:
+                logger.warning(f"Error disposing engine: {e}")
+
+
+def _observe_check_latency(queue: str, website_id: int, latency: float):
+    CHECK_LATENCY.labels(queue).observe(latency)
+    if queue == INTERACTIVE_QUEUE and latency > settings.INTERACTIVE_CHECK_SLO:
+        CHECK_SLO_VIOLATIONS.labels(queue).inc()
+        logger.warning(f"Interactive check of website {website_id} took {latency:.1f}s (SLO {settings.INTERACTIVE_CHECK_SLO}s)")
+
+
+def _observe_probe_phases(response, dns_cache_time: float = 0.0) -> dict[str, float]:
+    """
+    Записывает длительность фаз HTTP запроса (dns, connect, tls, ttfb, transfer) и возвращает их в мс
+
+    dns_cache_time - сколько проверка ждала DNS-кэша до запроса (0 при попадании в кэш);
+    curl, получивший адрес из кэша, тратит на резолв около нуля.
+    """
+    from curl_cffi import CurlInfo
+
+    infos = response.infos
+    dns = infos.get(CurlInfo.NAMELOOKUP_TIME) or 0.0
+    connect = infos.get(CurlInfo.CONNECT_TIME) or dns
+    tls = infos.get(CurlInfo.APPCONNECT_TIME) or connect  # 0 для http://
+    ttfb = infos.get(CurlInfo.STARTTRANSFER_TIME) or tls
+    total = infos.get(CurlInfo.TOTAL_TIME) or ttfb
+
+    phases = {
+        "dns": dns_cache_time + dns,
+        "connect": max(connect - dns, 0.0),
+        "tls": max(tls - connect, 0.0),
+        "ttfb": max(ttfb - tls, 0.0),
+        "transfer": max(total - ttfb, 0.0),
+        "total": dns_cache_time + total,
+    }
+    for phase, duration in phases.items():
+        PROBE_DURATION.labels(phase).observe(duration)
+
+    http_version = HTTP_VERSIONS.get(response.http_version, "unknown")
+    connects = infos.get(CurlInfo.NUM_CONNECTS) or 0
+    if connects:
+        PROBE_CONNECTIONS.labels(http_version).inc(connects)
+    return {
+        **{f"{phase}_ms": round(duration * 1000, 3) for phase, duration in phases.items()},
+        "http_version": http_version,
+        "new_connections": connects,
+    }
+
+
+async def _fetch(http: CurlAsyncSession, website: Website) -> tuple:
+    """
+    GET сайта для проверки; возвращает ответ и время ожидания DNS-кэша (секунды)
+
+    Несуществующее имя (в т.ч. из негативного кэша) - dns_cache.DNSResolutionError
+    без запроса. Адреса из кэша подставляются только в сессию probe_session.
+    """
+    parts = urlsplit(website.url)
+    dns_time = 0.0
+    token = None
+    if settings.DNS_CACHE_ENABLED and parts.hostname:
+        addresses, dns_time = await dns_cache.resolve(parts.hostname)
+        if addresses:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            token = _resolve_entries.set([dns_cache.curl_resolve_entry(parts.hostname, port, addresses)])
     try:
-        loop.run_until_complete(_check_website(website_id))
-    except Exception as exc:
-        logger.error(f"Error checking website {website_id}: {exc}")
-        raise self.retry(exc=exc, countdown=60)
+        return await _request(http, website, f"{parts.scheme}://{parts.netloc}"), dns_time
     finally:
-        # Dispose engine для освобождения соединений
-        try:
-            loop.run_until_complete(engine.dispose())
-        except Exception as e:
-            logger.warning(f"Error disposing engine: {e}")
+        if token is not None:
+            _resolve_entries.reset(token)
+
+
+async def _request(http: CurlAsyncSession, website: Website, origin: str):
+    """
+    GET сайта по HTTP/2 или HTTP/1.1
 
+    HTTP/2 согласуется через ALPN (https), если он не отключен для сайта (Website.http2)
+    или глобально (PROBE_HTTP2). При ошибке протокола HTTP/2 запрос повторяется
+    по HTTP/1.1, и origin HTTP2_FALLBACK_TTL секунд проверяется только по HTTP/1.1.
+    """
+    from curl_cffi import CurlHttpVersion
+    from curl_cffi.requests.exceptions import RequestException
+
+    timeout = website.timeout or settings.DEFAULT_TIMEOUT
+
+    if settings.PROBE_HTTP2 and website.http2 and _http1_origins.get(origin, 0.0) < time.monotonic():
+        try:
+            return await http.get(website.url, impersonate="chrome", timeout=timeout)
+        except RequestException as e:
+            if e.code not in HTTP2_ERRORS:
+                raise
+            logger.warning(f"HTTP/2 error for {origin}, falling back to HTTP/1.1: {e}")
+            _http1_origins[origin] = time.monotonic() + HTTP2_FALLBACK_TTL
+            PROBE_HTTP2_FALLBACKS.inc()
+
+    return await http.get(website.url, impersonate="chrome", timeout=timeout, http_version=CurlHttpVersion.V1_1)
+
+
+async def _check_website(
+        website_id: int,
+        client: CurlAsyncSession | None = None,
+        planned_last_check: float | None = None,
+        check_id: str | None = None
+):
+    """
+    Async implementation of website check
+
+    client - общая curl-сессия (демон app.probe); без нее создается своя на одну проверку
+    planned_last_check - last_check сайта (unix, 0 - не проверялся), по которому планировщик
+    решил, что проверка нужна. Если он изменился, предыдущая проверка завершилась между
+    выборкой и арендой - повторная проверка пропускается. None - проверять без условий
+    check_id - ID проверки, одинаковый у повторов задачи (id задачи Celery): повтор заменяет
+    запись проверки в Redis (SITE_STATE_STORE=redis), а не считает проверку второй раз
+    """
+    with span("check", website_id=website_id) as check_span:
+        status = await _run_website_check(website_id, client, planned_last_check, check_id)
+        check_span.set(result=status or "skipped")
+
+
+async def _run_website_check(
+        website_id: int,
+        client: CurlAsyncSession | None,
+        planned_last_check: float | None,
+        check_id: str | None = None
+) -> str | None:
+    """Проверка сайта; возвращает статус или None, если проверка пропущена"""
+    from curl_cffi.requests.exceptions import RequestException, Timeout
 
-async def _check_website(website_id: int):
-    """Async implementation of website check"""
     async with async_session_maker() as db:
         try:
             # Получаем сайт
-            result = await db.execute(
-                select(Website).where(Website.id == website_id)
-            )
-            website = result.scalar_one_or_none()
+            with span("db.acquire"):
+                await db.connection()
+            with span("db.load"):
+                result = await db.execute(
+                    select(Website).where(Website.id == website_id)
+                )
+                website = result.scalar_one_or_none()
 
             if not website or not website.is_active:
-                return
-
-            logger.info(f'Checking website: {website.url} with "{website.valid_word}"')
+                return None
+
+            if site_state.enabled():
+                # Состояние сайта пишется в Redis, строка websites не обновляется
+                db.expunge(website)
+                live = await site_state.load_states([website_id])
+                if website_id in live:
+                    site_state.apply_state(website, live[website_id])
+
+            if planned_last_check is not None:
+                last_check = website.last_check.timestamp() if website.last_check else 0.0
+                # Прошлая попытка этой же задачи успела записать проверку в Redis,
+                # но не в БД (commit упал, воркер умер) - повтор ее доделывает
+                if last_check != planned_last_check and not (
+                        check_id and await site_state.recorded_check_id(website_id) == check_id
+                ):
+                    logger.debug(f"Website {website_id} already checked since it was planned, skipping")
+                    return None
+
+            # Не держим соединение с БД, пока ждем ответа сайта (expire_on_commit=False)
+            await db.commit()
 
-            # Сохраняем предыдущий статус для проверки восстановления
-            previous_status = website.status
+            logger.info(f'Checking website: {website.url} with "{website.valid_word}"', extra=SAMPLED)
 
-            # Инициализируем значения если None
-            if website.consecutive_failures is None:
-                website.consecutive_failures = 0
-            if website.total_checks is None:
-                website.total_checks = 0
-            if website.failed_checks is None:
-                website.failed_checks = 0
+            # Насколько позже срока началась проверка (ручные проверки до срока не учитываем)
+            if website.last_check is not None:
+                due_at = website.last_check + timedelta(seconds=website.check_interval)
+                lag = (datetime.now(timezone.utc) - due_at).total_seconds()
+                if lag >= 0:
+                    SCHEDULER_LAG.observe(lag)
 
             status = "offline"
             response_time = None
@@ -119,43 +400,46 @@ async def _check_website(website_id: int):
             error_message = None
             start_time = datetime.now(timezone.utc)
 
-            try:
-                # async with httpx.AsyncClient(timeout=website.timeout) as client:
-                async with CurlAsyncSession() as client:
-                    # response = await client.get(website.url, follow_redirects=True)
-                    response = await client.get(website.url, impersonate="chrome")
-                    logger.debug(f'Checking website: {website.url} response succeed...')
-                    response_time = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
-                    status_code = response.status_code
-
-                    # Проверяем наличие валидного слова
-                    if website.valid_word in response.text:
-                        status = "online"
-                        website.consecutive_failures = 0
-                    else:
-                        status = "offline"
-                        error_message = f"Valid word '{website.valid_word}' not found"
-                        website.consecutive_failures += 1
-
-            except httpx.TimeoutException:
-                error_message = f"Timeout after {website.timeout}s"
-                website.consecutive_failures += 1
-            except httpx.RequestError as e:
-                error_message = f"Request error: {str(e)}"
-                website.consecutive_failures += 1
-            except Exception as e:
-                error_message = f"Unknown error: {str(e)}"
-                website.consecutive_failures += 1
-
-            # Обновляем статус сайта
-            website.status = status
-            website.last_check = datetime.now(timezone.utc)
-            website.response_time = response_time
-            website.error_message = error_message
-            website.total_checks += 1
-
-            if status != "online":
-                website.failed_checks += 1
+            with span("http.probe", url=website.url) as probe_span:
+                try:
+                    # async with httpx.AsyncClient(timeout=website.timeout) as client:
+                    session = probe_session(curl_infos=probe_timings()) if client is None else nullcontext(client)
+                    async with session as http:
+                        # response = await client.get(website.url, follow_redirects=True)
+                        response, dns_time = await _fetch(http, website)
+                        logger.debug(f'Checking website: {website.url} response succeed...')
+                        response_time = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
+                        status_code = response.status_code
+                        probe_span.set(status_code=status_code, **_observe_probe_phases(response, dns_time))
+
+                        # Проверяем наличие валидного слова
+                        if website.valid_word in response.text:
+                            status = "online"
+                        else:
+                            status = "offline"
+                            error_message = f"Valid word '{website.valid_word}' not found"
+
+                except Timeout:
+                    error_message = f"Timeout after {website.timeout}s"
+                except dns_cache.DNSResolutionError as e:
+                    error_message = f"DNS error: {e}"
+                except RequestException as e:
+                    error_message = f"Request error: {str(e)}"
+                except Exception as e:
+                    error_message = f"Unknown error: {str(e)}"
+
+                if error_message:
+                    probe_span.set(error_message=error_message)
+
+            # Обновляем статус сайта и счетчики одной атомарной операцией (без чтения
+            # счетчиков заранее): параллельная ручная проверка не теряет инкременты.
+            # В режиме redis запись идемпотентна по check_id: если commit ниже упадет,
+            # повтор задачи заменит ее, а строки проверки и outbox не задвоятся
+            with span("state.record"):
+                recorded = await site_state.record_check(
+                    db, website, status, datetime.now(timezone.utc), response_time, error_message, check_id
+                )
+            previous_status = recorded.previous_status
 
             # Сохраняем историю проверки
             check = WebsiteCheck(
@@ -166,20 +450,33 @@ async def _check_website(website_id: int):
                 error_message=error_message
             )
             db.add(check)
-            await db.commit()
 
-            # Проверяем восстановление сайта
+            # Уведомления пишутся в outbox в той же транзакции, что и результат проверки,
+            # а отправляет их drain_notification_outbox
+            alerted = False
             if status == "online" and previous_status in ["offline", "error"]:
-                await _send_recovery_notification(website)
-
-            # Отправляем уведомление при падении сайта
+                _queue_recovery_notification(website, db)
             elif status != "online" and website.telegram_chat_id:
-                await _send_alert_if_needed(website, db)
+                alerted = _queue_alert_if_needed(website, db)
 
+            with span("db.commit"):
+                await db.commit()
+            # Время уведомления попадает в Redis только после того, как строка outbox зафиксирована.
+            # Проверка уже сохранена: ошибка здесь не должна приводить к повтору задачи
+            if alerted:
+                try:
+                    await site_state.update_state(website_id, last_notification_sent=website.last_notification_sent)
+                except Exception as e:
+                    logger.warning(f"Failed to store notification time of website {website_id}: {e}")
+            CHECKS_TOTAL.labels(status).inc()
+
+            # Сбои и смена статуса пишутся всегда, повторные успешные проверки - выборочно
             logger.info(
                 f"Website {website.url} check completed: "
-                f"status={status}, response_time={response_time}ms, failures={website.consecutive_failures}"
+                f"status={status}, response_time={response_time}ms, failures={website.consecutive_failures}",
+                extra=SAMPLED if status == previous_status == "online" else None
             )
+            return status
 
         except Exception as e:
             logger.error(f"Error in _check_website: {e}")
@@ -189,32 +486,34 @@ async def _check_website(website_id: int):
             await db.close()
 
 
-async def _send_recovery_notification(website: Website):
-    """Отправляет уведомление о восстановлении сайта"""
+def _queue_recovery_notification(website: Website, db: AsyncSession):
+    """Добавляет в outbox уведомление о восстановлении сайта"""
     if not website.telegram_chat_id:
         return
 
     # Отправляем уведомление о восстановлении
+    name = escape_markdown(website.name or website.url)
     message = (
         f"✅ *Website Recovered*\n\n"
-        f"*Website:* {website.name or website.url}\n"
-        f"*URL:* {website.url}\n"
+        f"*Website:* {name}\n"
+        f"*URL:* {escape_markdown(website.url)}\n"
         f"*Status:* {website.status}\n"
         f"*Response Time:* {website.response_time:.2f}ms\n"
         f"*Time:* {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC"
     )
 
-    success = await send_telegram_notification(
-        website.telegram_chat_id,
-        message
-    )
-
-    if success:
-        logger.info(f"Recovery notification sent for website {website.id}")
+    db.add(NotificationOutbox(
+        website_id=website.id,
+        chat_id=website.telegram_chat_id,
+        kind="recovery",
+        message=message,
+        summary=f"✅ {name} - {website.response_time:.0f}ms"
+    ))
+    logger.info(f"Recovery notification queued for website {website.id}")
 
 
-async def _send_alert_if_needed(website: Website, db: AsyncSession):
-    """Отправляет уведомление если необходимо"""
+def _queue_alert_if_needed(website: Website, db: AsyncSession) -> bool:
+    """Добавляет в outbox уведомление о падении если необходимо; возвращает True, если добавлено"""
     # Отправляем уведомление только после 3 последовательных сбоев
     # И не чаще чем раз в 30 минут
     should_notify = False
@@ -233,25 +532,27 @@ async def _send_alert_if_needed(website: Website, db: AsyncSession):
                 should_notify = True
 
     if should_notify:
+        name = escape_markdown(website.name or website.url)
+        error = escape_markdown(website.error_message or "Unknown")
         message = (
             f"🚨 *Website Down Alert*\n\n"
-            f"*Website:* {website.name or website.url}\n"
-            f"*URL:* {website.url}\n"
+            f"*Website:* {name}\n"
+            f"*URL:* {escape_markdown(website.url)}\n"
             f"*Status:* {website.status}\n"
             f"*Consecutive Failures:* {website.consecutive_failures}\n"
-            f"*Error:* {website.error_message or 'Unknown'}\n"
+            f"*Error:* {error}\n"
             f"*Time:* {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC"
         )
-        logger.info(f"Sending notification to {website.telegram_chat_id}")
-        success = await send_telegram_notification(
-            website.telegram_chat_id,
-            message
-        )
-
-        if success:
-            website.last_notification_sent = datetime.now(timezone.utc)
-            await db.commit()
-            logger.info(f"Alert sent for website {website.id}")
+        db.add(NotificationOutbox(
+            website_id=website.id,
+            chat_id=website.telegram_chat_id,
+            kind="alert",
+            message=message,
+            summary=f"🚨 {name} - {error}"
+        ))
+        website.last_notification_sent = datetime.now(timezone.utc)
+        logger.info(f"Alert queued for website {website.id} to {website.telegram_chat_id}")
+    return should_notify
 
 
 @celery_app.task(name="app.tasks.monitor.cleanup_old_checks")
@@ -274,8 +575,17 @@ async def _cleanup_old_checks():
                     WebsiteCheck.checked_at < cutoff_date
                 )
             )
+            outbox_result = await db.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status != "pending",
+                    NotificationOutbox.created_at < cutoff_date
+                )
+            )
             await db.commit()
-            logger.info(f"Cleaned up {result.rowcount} old check records")
+            logger.info(
+                f"Cleaned up {result.rowcount} old check records "
+                f"and {outbox_result.rowcount} old notifications"
+            )
         except Exception as e:
             logger.error(f"Error in cleanup_old_checks: {e}")
             await db.rollback()
@@ -284,7 +594,24 @@ async def _cleanup_old_checks():
             await db.close()
 
 
-@celery_app.task(name="app.tasks.monitor.stop_website_monitoring")
+@celery_app.task(name="app.tasks.monitor.flush_site_state")
+def flush_site_state():
+    """Записывает в БД состояние сайтов из Redis (SITE_STATE_STORE=redis)"""
+    if not site_state.enabled():
+        return
+    loop = get_or_create_eventloop()
+    try:
+        flushed = loop.run_until_complete(site_state.flush_states(async_session_maker))
+        if flushed:
+            logger.debug(f"Flushed state of {flushed} websites")
+    except Exception as e:
+        logger.error(f"Error in flush_site_state: {e}")
+        raise
+    finally:
+        loop.run_until_complete(engine.dispose())
+
+
+@celery_app.task(name=STOP_MONITORING_TASK)
 def stop_website_monitoring(website_id: int):
     """Останавливает мониторинг сайта"""
     loop = get_or_create_eventloop()
@@ -307,6 +634,7 @@ async def _stop_website_monitoring(website_id: int):
                 website.status = "stopped"
                 website.is_active = False
                 await db.commit()
+                await site_state.update_state(website_id, status="stopped")
                 logger.info(f"Stopped monitoring for website {website_id}")
         except Exception as e:
             logger.error(f"Error in stop_website_monitoring: {e}")
@@ -0,0 +1,230 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import select, update, func
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import TELEGRAM_DELIVERY_LATENCY
+from app.core.redis import get_redis
+from app.core.tracing import span
+from app.db.session import async_session_maker, engine
+from app.models import NotificationOutbox
+from app.services.telegram import (
+    TELEGRAM_MESSAGE_LIMIT,
+    TelegramRetryAfter,
+    send_telegram_notification,
+    telegram_length,
+)
+from app.tasks.base import get_or_create_eventloop
+
+logger = get_logger("tasks.notifications")
+
+# Один drainer за раз: beat запускает drain каждые 5 секунд, и долгий проход
+# не должен копить за собой новые
+DRAIN_LOCK_KEY = "notifications:drain:lock"
+
+# Снимает блокировку, только если она еще наша (не истекла и не перехвачена)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@celery_app.task(name="app.tasks.notifications.drain_notification_outbox")
+def drain_notification_outbox():
+    """Отправляет накопившиеся уведомления из notification_outbox"""
+    loop = get_or_create_eventloop()
+    try:
+        loop.run_until_complete(_drain_notification_outbox())
+    finally:
+        loop.run_until_complete(engine.dispose())
+
+
+async def _claim_batch() -> list[NotificationOutbox]:
+    """
+    Захватывает пачку готовых к отправке уведомлений
+
+    Берутся только чаты, у которых самое старое ожидающее уведомление старше
+    NOTIFICATION_DIGEST_WINDOW: за это окно события одного чата накапливаются
+    и уходят одной сводкой. Пачка - до NOTIFICATION_BATCH_SIZE чатов (самые давно
+    ждущие) со всеми их готовыми строками, чтобы события одного чата не делились
+    между пачками и не уходили несколькими сводками. Строки выбираются
+    с FOR UPDATE SKIP LOCKED, поэтому несколько drainer'ов не получат одну
+    и ту же строку. Захват сдвигает available_at на время аренды: если процесс
+    упадет до отметки о доставке, строка снова станет доступна.
+    """
+    async with async_session_maker() as db:
+        pending = (
+            NotificationOutbox.status == "pending",
+            NotificationOutbox.available_at <= func.now()
+        )
+        ready_chats = (
+            select(NotificationOutbox.chat_id)
+            .where(*pending)
+            .group_by(NotificationOutbox.chat_id)
+            .having(
+                func.min(NotificationOutbox.created_at)
+                <= func.now() - timedelta(seconds=settings.NOTIFICATION_DIGEST_WINDOW)
+            )
+            .order_by(func.min(NotificationOutbox.created_at))
+            .limit(settings.NOTIFICATION_BATCH_SIZE)
+        )
+        claimable = (
+            select(NotificationOutbox.id)
+            .where(*pending, NotificationOutbox.chat_id.in_(ready_chats.scalar_subquery()))
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(claimable.scalar_subquery()))
+            .values(
+                available_at=func.now() + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS),
+                attempts=NotificationOutbox.attempts + 1
+            )
+            .returning(NotificationOutbox)
+            .execution_options(synchronize_session=False)
+        )
+        rows = list(result.scalars().all())
+        await db.commit()
+        return sorted(rows, key=lambda row: row.id)
+
+
+def _build_digest(notifications: list[NotificationOutbox]) -> str:
+    """
+    Сводное сообщение по нескольким событиям одного чата
+
+    Если строки по всем сайтам не помещаются в лимит Telegram (длина в единицах
+    UTF-16, как ее считает Telegram), сообщение сокращается до счетчиков и тех строк, что поместились.
+    """
+    if len(notifications) == 1:
+        return notifications[0].message
+
+    down = sum(1 for n in notifications if n.kind == "alert")
+    recovered = sum(1 for n in notifications if n.kind == "recovery")
+    header = (
+        f"📋 *Monitoring Digest*\n"
+        f"*Down:* {down}  *Recovered:* {recovered}\n"
+        f"*Time:* {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC\n"
+    )
+    lines = [n.summary or n.message.split("\n", 1)[0] for n in notifications]
+
+    message = header + "\n" + "\n".join(lines)
+    if telegram_length(message) <= TELEGRAM_MESSAGE_LIMIT:
+        return message
+
+    # Не помещается: оставляем счетчики и столько строк, сколько влезает
+    reserve = len("\n...and 00000 more")
+    message = header + "\n"
+    length = telegram_length(message)
+    for shown, line in enumerate(lines):
+        line_length = telegram_length(line) + 1
+        if length + line_length + reserve > TELEGRAM_MESSAGE_LIMIT:
+            return message + f"...and {len(lines) - shown} more"
+        message += line + "\n"
+        length += line_length
+    return message
+
+
+async def _deliver(notifications: list[NotificationOutbox]) -> dict:
+    """Отправляет уведомления одного чата (одной сводкой) и возвращает изменения для строк outbox"""
+    first = notifications[0]
+    attempts = max(n.attempts for n in notifications)
+    now = datetime.now(timezone.utc)
+    with span("telegram.send", chat_id=first.chat_id, notifications=len(notifications)) as send_span:
+        try:
+            # Лимит чата не ждем: чат с большой очередью не задерживает остальные
+            success = await send_telegram_notification(
+                first.chat_id, _build_digest(notifications), wait_for_chat=False
+            )
+        except TelegramRetryAfter as e:
+            # Лимит Telegram или чата: попытка не считается
+            send_span.set(result="rate_limited", retry_after=e.retry_after)
+            return {
+                "available_at": now + timedelta(seconds=e.retry_after),
+                "attempts": NotificationOutbox.attempts - 1,
+                "last_error": str(e)
+            }
+        send_span.set(result="delivered" if success else "failed")
+
+    if success:
+        for notification in notifications:
+            TELEGRAM_DELIVERY_LATENCY.observe((now - notification.created_at).total_seconds())
+        return {"status": "delivered", "delivered_at": now, "last_error": None}
+
+    if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        logger.error(f"Notifications to {first.chat_id} failed after {attempts} attempts")
+        return {"status": "failed", "last_error": "Delivery failed"}
+
+    # Экспоненциальная задержка перед следующей попыткой
+    backoff = settings.NOTIFICATION_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return {"available_at": now + timedelta(seconds=backoff), "last_error": "Delivery failed"}
+
+
+async def _deliver_and_record(notifications: list[NotificationOutbox], semaphore: asyncio.Semaphore) -> int:
+    """Отправляет уведомления одного чата и сразу фиксирует результат; возвращает число доставленных"""
+    async with semaphore:
+        changes = await _deliver(notifications)
+
+    # Фиксируем каждую доставку сразу, чтобы сбой не привел к повторам всей пачки
+    async with async_session_maker() as db:
+        await db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_([n.id for n in notifications]))
+            .values(**changes)
+        )
+        await db.commit()
+    return len(notifications) if changes.get("status") == "delivered" else 0
+
+
+async def _drain_notification_outbox():
+    """Async implementation"""
+    token = uuid4().hex
+    lock_ttl = settings.NOTIFICATION_LEASE_SECONDS
+    if not await get_redis().set(DRAIN_LOCK_KEY, token, nx=True, ex=lock_ttl):
+        logger.debug("Outbox drain already running, skipping")
+        return
+
+    try:
+        # Новые пачки не захватываем после половины TTL блокировки, чтобы она не истекла во время прохода
+        await _drain(deadline=time.monotonic() + lock_ttl / 2)
+    finally:
+        await get_redis().eval(RELEASE_LOCK_SCRIPT, 1, DRAIN_LOCK_KEY, token)
+
+
+async def _drain(deadline: float):
+    """
+    Отправляет захваченные пачки, разные чаты - параллельно
+
+    Чат, у которого исчерпан лимит сообщений, не ждет токена: его строки
+    откладываются до следующего прохода, поэтому один чат с большой очередью
+    не задерживает остальные.
+    """
+    semaphore = asyncio.Semaphore(settings.NOTIFICATION_SEND_CONCURRENCY)
+    delivered = 0
+    while time.monotonic() < deadline:
+        batch = await _claim_batch()
+        if not batch:
+            break
+
+        by_chat: dict[str, list[NotificationOutbox]] = {}
+        for notification in batch:
+            by_chat.setdefault(notification.chat_id, []).append(notification)
+
+        results = await asyncio.gather(
+            *(_deliver_and_record(notifications, semaphore) for notifications in by_chat.values()),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        delivered += sum(result for result in results if not isinstance(result, BaseException))
+        if errors:
+            logger.error(f"Error in drain_notification_outbox: {errors[0]}")
+            raise errors[0]
+
+    if delivered:
+        logger.info(f"Delivered {delivered} notifications from outbox")
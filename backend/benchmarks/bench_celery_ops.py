@@ -0,0 +1,137 @@
+"""
+Бенчмарк операций Redis на одну задачу Celery.
+
+Публикует пачку пустых задач и выполняет их встроенным воркером (pool=solo),
+считая команды Redis на стороне клиента: отдельно при постановке в очередь
+(API, планировщик) и в воркере (получение, подтверждение, результат).
+Сравниваются прежние настройки (хранение результатов, STARTED, брокер без
+пула соединений) и текущая конфигурация celery_app.
+
+Нужен Redis из настроек (REDIS_HOST/REDIS_PORT). Задачи идут в отдельную
+очередь, рабочие очереди не затрагиваются.
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_celery_ops
+"""
+import collections
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from redis import connection as redis_connection
+
+TASKS = 500
+QUEUE = "bench_celery_ops"
+
+# Настройки до отключения результатов
+PROFILES = {
+    "legacy": {
+        "task_track_started": True,
+        "task_ignore_result": False,
+        "broker_pool_limit": None,
+    },
+    "current": {},
+}
+
+_ops: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+_lpush_bytes: list[int] = []
+_phase = threading.local()
+_lock = threading.Lock()
+
+
+def _install_counter() -> None:
+    """Считает каждую команду, отправленную клиентом redis-py (в том числе в pipeline)"""
+    for serializer in (redis_connection.PythonRespSerializer, redis_connection.HiredisRespSerializer):
+        pack = serializer.pack
+
+        def counting_pack(self, *args, _pack=pack):
+            # Потоки воркера фазу не задают
+            phase = getattr(_phase, "name", "worker")
+            if phase is not None:
+                command = str(args[0]).upper()
+                with _lock:
+                    _ops[phase][command] += 1
+                    if command == "LPUSH":
+                        _lpush_bytes.append(sum(len(a) for a in args[2:] if isinstance(a, (bytes, str))))
+            return _pack(self, *args)
+
+        serializer.pack = counting_pack
+
+
+def run_profile(name: str, tasks: int = TASKS) -> dict:
+    """Выполняет задачи с настройками профиля и возвращает счетчики команд"""
+    _install_counter()
+
+    from celery.contrib.testing.worker import start_worker
+
+    from app.core.celery_app import celery_app
+
+    celery_app.conf.update(PROFILES[name])
+
+    @celery_app.task(name="benchmarks.noop")
+    def noop(value):
+        return value
+
+    _phase.name = "publish"
+    start = time.perf_counter()
+    for i in range(tasks):
+        noop.apply_async((i,), queue=QUEUE)
+    publish_seconds = time.perf_counter() - start
+    _phase.name = None
+
+    start = time.perf_counter()
+    with start_worker(celery_app, pool="solo", perform_ping_check=False, queues=[QUEUE], shutdown_timeout=30):
+        with celery_app.connection_for_read() as conn:
+            client = conn.default_channel.client
+            while client.llen(QUEUE):
+                time.sleep(0.05)
+        # Последняя задача могла быть взята, но еще не подтверждена
+        time.sleep(0.5)
+    consume_seconds = time.perf_counter() - start
+
+    return {
+        "profile": name,
+        "tasks": tasks,
+        "publish": dict(_ops["publish"]),
+        "worker": dict(_ops["worker"]),
+        "message_bytes": sum(_lpush_bytes) / max(len(_lpush_bytes), 1),
+        "publish_seconds": publish_seconds,
+        "consume_seconds": consume_seconds,
+    }
+
+
+def main():
+    results = []
+    for name in PROFILES:
+        # Каждый профиль в отдельном процессе: настройки Celery и пулы соединений не пересекаются
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_celery_ops", name],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Задач: {TASKS}\n")
+    for result in results:
+        tasks = result["tasks"]
+        publish = sum(result["publish"].values()) / tasks
+        worker = sum(result["worker"].values()) / tasks
+        print(f"[{result['profile']}]")
+        print(f"  команд Redis на задачу: {publish + worker:.1f} (постановка {publish:.1f}, воркер {worker:.1f})")
+        print(f"  размер сообщения:       {result['message_bytes']:.0f} байт")
+        print(f"  постановка {tasks} задач:  {result['publish_seconds'] * 1000:.0f} мс")
+        for phase in ("publish", "worker"):
+            counts = ", ".join(
+                f"{command} {count / tasks:.2f}"
+                for command, count in sorted(result[phase].items(), key=lambda item: -item[1])
+            )
+            print(f"  {phase}: {counts}")
+        print()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(json.dumps(run_profile(sys.argv[1])))
+    else:
+        main()
@@ -0,0 +1,190 @@
+"""
+DNS-кэш проверок (app.services.dns_cache): запросы к резолверу и время DNS на проверку.
+
+Локальный DNS-сервер (UDP) отвечает на имена site-N.bench.test адресом 127.0.0.1
+с TTL --ttl и задержкой --latency, на dead-N.bench.test - NXDOMAIN с задержкой
+--nx-latency (медленный ответ по несуществующему домену). Проверки идут
+по кругу по --sites именам, доля --dead из них несуществующие, в режимах:
+
+    uncached    резолв при каждой проверке, как curl без кэша
+    cached      dns_cache.resolve: TTL, негативный кэш NXDOMAIN, общий резолв одного имени
+
+Для каждого режима печатаются запросы, дошедшие до DNS-сервера, время DNS
+на проверку (p50/p95/max) и доля попаданий в кэш по метрике DNS_CACHE_LOOKUPS.
+Сервер работает в отдельном потоке того же процесса.
+
+Нужен dnspython (он же дает TTL записей в dns_cache):
+    pip install dnspython
+
+Запуск (из каталога backend, нужны переменные окружения из .env):
+    python -m benchmarks.bench_dns
+    python -m benchmarks.bench_dns --sites 2000 --checks 20000 --dead 0.05 --nx-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+ZONE = "bench.test."
+MODES = ("uncached", "cached")
+
+
+class FakeDNS(asyncio.DatagramProtocol):
+    """Авторитетный сервер зоны bench.test: A для site-*, NXDOMAIN для остальных имен"""
+
+    def __init__(self, ttl: int, latency: float, nx_latency: float):
+        self.ttl = ttl
+        self.latency = latency
+        self.nx_latency = nx_latency
+        self.queries: Counter = Counter()
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        asyncio.get_running_loop().create_task(self._answer(data, addr))
+
+    async def _answer(self, data: bytes, addr) -> None:
+        import dns.flags
+        import dns.message
+        import dns.rcode
+        import dns.rdatatype
+        import dns.rrset
+
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        name = question.name.to_text()
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+
+        if name.startswith("site-") and name.endswith(ZONE):
+            self.queries["answer"] += 1
+            await asyncio.sleep(self.latency)
+            if question.rdtype == dns.rdatatype.A:
+                response.answer.append(dns.rrset.from_text(name, self.ttl, "IN", "A", "127.0.0.1"))
+        else:
+            self.queries["nxdomain"] += 1
+            await asyncio.sleep(self.nx_latency)
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        self.transport.sendto(response.to_wire(), addr)
+
+
+def start_server(server: FakeDNS) -> tuple[int, asyncio.AbstractEventLoop]:
+    """Запускает DNS-сервер в отдельном потоке; возвращает порт и loop сервера"""
+    loop = asyncio.new_event_loop()
+    transport, _ = loop.run_until_complete(
+        loop.create_datagram_endpoint(lambda: server, local_addr=("127.0.0.1", 0))
+    )
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return transport.get_extra_info("sockname")[1], loop
+
+
+def _lookups() -> dict[str, float]:
+    from prometheus_client import REGISTRY
+
+    return {
+        result: REGISTRY.get_sample_value("website_probe_dns_cache_lookups_total", {"result": result}) or 0.0
+        for result in ("hit", "negative_hit", "miss", "shared")
+    }
+
+
+async def run_mode(mode: str, server: FakeDNS, args) -> dict:
+    from app.services import dns_cache
+
+    dead = int(args.sites * args.dead)
+    hosts = [f"dead-{i}.bench.test" if i < dead else f"site-{i}.bench.test" for i in range(args.sites)]
+    dns_cache.clear()
+    server.queries.clear()
+    before = _lookups()
+
+    durations: list[float] = []
+    results: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def check(index: int) -> None:
+        host = hosts[index % len(hosts)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if mode == "cached":
+                    addresses, _ = await dns_cache.resolve(host)
+                else:
+                    addresses, _ = await dns_cache._query_dnspython(dns_cache._resolver(), host)
+                results["ok" if addresses else "curl"] += 1
+            except (dns_cache.DNSResolutionError, dns_cache._NotFound):
+                results["nxdomain"] += 1
+            except Exception as e:
+                results[type(e).__name__] += 1
+            durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(check(i) for i in range(args.checks)))
+    elapsed = time.perf_counter() - start
+
+    after = _lookups()
+    lookups = {result: int(after[result] - before[result]) for result in after}
+    total = sum(lookups.values())
+    cuts = statistics.quantiles(durations, n=100, method="inclusive") if len(durations) > 1 else [0.0] * 99
+    return {
+        "checks": args.checks,
+        "results": dict(results),
+        "server_queries": dict(server.queries),
+        "lookups": lookups,
+        "hit_rate": round((lookups["hit"] + lookups["negative_hit"]) / total, 4) if total else None,
+        "dns_p50_ms": round(cuts[49] * 1000, 3),
+        "dns_p95_ms": round(cuts[94] * 1000, 3),
+        "dns_max_ms": round(max(durations, default=0.0) * 1000, 3),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe DNS cache benchmark against a local DNS server")
+    parser.add_argument("--sites", type=int, default=1000, help="Разных имен")
+    parser.add_argument("--checks", type=int, default=10000, help="Проверок (по кругу по именам)")
+    parser.add_argument("--dead", type=float, default=0.05, help="Доля несуществующих имен")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--ttl", type=int, default=300, help="TTL записей A")
+    parser.add_argument("--latency", type=float, default=0.005, help="Задержка ответа (секунды)")
+    parser.add_argument("--nx-latency", type=float, default=0.2, help="Задержка ответа NXDOMAIN")
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=list(MODES))
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    from app.core.logger import logger
+    from app.services import dns_cache
+
+    logger.setLevel("ERROR")
+    resolver = dns_cache._resolver()
+    if resolver is None:
+        raise SystemExit("bench_dns needs the dnspython package: pip install dnspython")
+
+    server = FakeDNS(args.ttl, args.latency, args.nx_latency)
+    port, server_loop = start_server(server)
+    resolver.nameservers = ["127.0.0.1"]
+    resolver.port = port
+
+    report = {}
+    for mode in args.modes:
+        report[mode] = asyncio.run(run_mode(mode, server, args))
+        result = report[mode]
+        queries = sum(result["server_queries"].values())
+        hit_rate = f"{result['hit_rate']:.1%}" if result["hit_rate"] is not None else "-"
+        print(
+            f"{mode:<9} server queries {queries:<6} hit rate {hit_rate:<6} "
+            f"dns p50 {result['dns_p50_ms']:.2f} ms p95 {result['dns_p95_ms']:.2f} ms max {result['dns_max_ms']:.2f} ms  "
+            f"{result['checks']} checks in {result['elapsed_s']:.2f}s  {result['results']}"
+        )
+    server_loop.call_soon_threadsafe(server_loop.stop)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк сериализации ответа /history на 1000 записей.
+
+Повторяет путь FastAPI для response_model (валидированные модели -> dump в
+JSON-совместимые типы -> рендер классом ответа) и сравнивает JSONResponse
+с FastJSONResponse, а также размер тела без сжатия, с gzip и с brotli.
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_history_serialization
+"""
+import gzip
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core.responses import FastJSONResponse, orjson
+from app.core.compression import brotli
+from app.schemas.website import WebsiteCheckResponse
+
+ROWS = 1000
+ROUNDS = 50
+
+
+def make_history(rows: int = ROWS) -> list[WebsiteCheckResponse]:
+    """Синтетическая история проверок, похожая на реальную"""
+    now = datetime.now(timezone.utc)
+    history = []
+    for i in range(rows):
+        failed = i % 17 == 0
+        history.append(WebsiteCheckResponse(
+            id=1_000_000 + i,
+            website_id=42,
+            status="offline" if failed else "online",
+            response_time=None if failed else 120.0 + (i % 250) * 1.37,
+            status_code=None if failed else 200,
+            error_message="Timeout after 30s" if failed else None,
+            checked_at=now - timedelta(minutes=5 * i)
+        ))
+    return history
+
+
+def measure(render, content, rounds: int = ROUNDS) -> float:
+    """Среднее время одного рендера в миллисекундах"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        render(content)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    history = make_history()
+    adapter = TypeAdapter(list[WebsiteCheckResponse])
+    content = adapter.dump_python(history, mode="json")
+
+    dump_ms = measure(lambda items: adapter.dump_python(items, mode="json"), history)
+    default_ms = measure(lambda data: JSONResponse(data).body, content)
+    fast_ms = measure(lambda data: FastJSONResponse(data).body, content)
+    body = JSONResponse(content).body
+
+    print(f"History response: {ROWS} rows, {ROUNDS} rounds")
+    print(f"  model dump (shared):  {dump_ms:8.2f} ms")
+    print(f"  JSONResponse render:  {default_ms:8.2f} ms  total {dump_ms + default_ms:8.2f} ms")
+    if orjson is not None:
+        print(
+            f"  FastJSONResponse:     {fast_ms:8.2f} ms  total {dump_ms + fast_ms:8.2f} ms"
+            f"  (render x{default_ms / fast_ms:.1f})"
+        )
+    else:
+        print("  FastJSONResponse:     orjson not installed, falls back to json")
+
+    print("Bytes on the wire:")
+    print(f"  identity: {len(body):>8} B")
+    gzipped = gzip.compress(body, compresslevel=6)
+    print(f"  gzip(6):  {len(gzipped):>8} B  ({len(gzipped) / len(body):.1%})")
+    if brotli is not None:
+        compressed = brotli.compress(body, quality=4)
+        print(f"  br(4):    {len(compressed):>8} B  ({len(compressed) / len(body):.1%})")
+    else:
+        print("  br(4):    brotli not installed")
+
+
+if __name__ == "__main__":
+    main()
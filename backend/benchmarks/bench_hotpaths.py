@@ -0,0 +1,433 @@
+"""
+Микробенчмарки горячих путей с сохранением базовых значений.
+
+Случаи:
+    keyword/*      поиск ключевого слова в ответе (response.text curl_cffi, как в _check_website)
+    fair_share/*   дележ бюджета тика между пользователями
+    history/*      сериализация ответа /history (1000 записей) через JSONResponse и orjson
+    jwt/decode     разбор токена
+    due/*          collect_due_checks на 10k/100k/1M сайтов                 (БД)
+    insert/*       запись 1000 WebsiteCheck: ORM add, bulk insert, COPY       (БД)
+    auth/*         _authenticate: разбор токена и загрузка пользователя      (БД)
+
+Результат каждого случая - лучшее время одной операции по нескольким
+повторам (минимум меньше всего зависит от фонового шума). С --save результаты записываются как базовые (baselines/hotpaths.json,
+для каждого случая свой допуск), без него сравниваются с базовыми: случай,
+ставший медленнее базового больше чем на допуск, считается регрессией, и
+процесс завершается с кодом 1. Базовые значения имеют смысл только для той
+машины, на которой сняты.
+
+Случаи с БД создают свои данные и удаляют их после себя, но collect_due_checks
+читает все сайты базы - нужна отдельная пустая база с примененными миграциями:
+    docker run --rm -d --name bench-db -p 55432:5432 -e POSTGRES_USER=bench \\
+        -e POSTGRES_PASSWORD=bench -e POSTGRES_DB=bench postgres:16
+    export POSTGRES_HOST=localhost POSTGRES_PORT=55432 POSTGRES_USER=bench \\
+        POSTGRES_PASSWORD=bench POSTGRES_DB=bench SECRET_KEY=bench
+    alembic upgrade head
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_hotpaths --save              # снять базовые значения
+    python -m benchmarks.bench_hotpaths                     # сравнить с базовыми
+    python -m benchmarks.bench_hotpaths --no-db --only keyword,history
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple
+
+BASELINE = Path(__file__).parent / "baselines" / "hotpaths.json"
+
+# Допуск по умолчанию: насколько случай может стать медленнее базового
+DEFAULT_THRESHOLD = 0.2
+# Случаи с БД шумнее
+DB_THRESHOLD = 0.35
+
+USER_PREFIX = "bench_hotpaths_"
+
+
+class Case(NamedTuple):
+    """Один микробенчмарк"""
+    name: str
+    run: Callable[[], Awaitable[int]]  # Выполняет пачку операций и возвращает их число
+    rounds: int = 7
+    threshold: float = DEFAULT_THRESHOLD
+
+
+async def measure(case: Case) -> dict:
+    """Прогрев и case.rounds замеров; время одной операции в микросекундах"""
+    await case.run()
+    per_op = []
+    for _ in range(case.rounds):
+        start = time.perf_counter()
+        ops = await case.run()
+        per_op.append((time.perf_counter() - start) / ops * 1e6)
+    return {
+        "per_op_us": min(per_op),
+        "median_us": statistics.median(per_op),
+        "stdev_us": statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+        "ops": ops,
+        "rounds": case.rounds,
+        "threshold": case.threshold,
+    }
+
+
+def _sync(fn: Callable[[], int]) -> Callable[[], Awaitable[int]]:
+    async def run() -> int:
+        return fn()
+    return run
+
+
+# Случаи без БД
+
+def keyword_cases() -> list[Case]:
+    from curl_cffi.requests import Response
+
+    cases = []
+    filler = "<p>lorem ipsum dolor sit amet, привет мир</p>\n"
+    for size in (16 * 1024, 256 * 1024, 2 * 1024 * 1024):
+        text = (filler * (size // len(filler) + 1))[:size]
+        for placement, body in (("hit_end", text + "farm-ok"), ("miss", text)):
+            content = body.encode()
+            repeat = max(1, 2 * 1024 * 1024 // size)
+
+            def run(content=content, repeat=repeat) -> int:
+                for _ in range(repeat):
+                    response = Response()
+                    response.content = content
+                    _ = "farm-ok" in response.text
+                return repeat
+
+            cases.append(Case(f"keyword/{size // 1024}k/{placement}", _sync(run)))
+    return cases
+
+
+def fair_share_cases() -> list[Case]:
+    from app.services.scheduler import DueCheck, fair_share
+
+    rng = random.Random(1)
+    cases = []
+    for size in (10_000, 100_000):
+        due = sorted(
+            (
+                DueCheck(i, rng.randrange(size // 50), rng.uniform(0, 600), rng.uniform(0.1, 5.0), 0.0)
+                for i in range(size)
+            ),
+            key=lambda check: check.overdue, reverse=True
+        )
+
+        def run(due=due) -> int:
+            fair_share(due, len(due) // 2, {})
+            return 1
+
+        cases.append(Case(f"fair_share/{size // 1000}k", _sync(run), rounds=5))
+    return cases
+
+
+def history_cases() -> list[Case]:
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    from app.core.responses import FastJSONResponse
+    from app.models import WebsiteCheck
+    from app.schemas.website import WebsiteCheckResponse
+
+    now = datetime.now(timezone.utc)
+    checks = [
+        WebsiteCheck(
+            id=i, website_id=1, status="online" if i % 10 else "offline",
+            response_time=123.456 + i, status_code=200 if i % 10 else None,
+            error_message=None if i % 10 else "Timeout after 30s",
+            checked_at=now - timedelta(minutes=5 * i),
+        )
+        for i in range(1000)
+    ]
+    # То же, что делает FastAPI для response_model=List[WebsiteCheckResponse]
+    adapter = TypeAdapter(list[WebsiteCheckResponse])
+
+    cases = []
+    for name, response_class in (("json", JSONResponse), ("orjson", FastJSONResponse)):
+        def run(response_class=response_class) -> int:
+            content = adapter.dump_python(adapter.validate_python(checks, from_attributes=True), mode="json")
+            response_class(content)
+            return 1
+
+        cases.append(Case(f"history/1000/{name}", _sync(run)))
+    return cases
+
+
+def jwt_cases() -> list[Case]:
+    from jose import jwt
+
+    from app.core.config import settings
+    from app.core.security import create_access_token
+
+    token = create_access_token({"sub": "1"})
+
+    def run() -> int:
+        for _ in range(1000):
+            jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return 1000
+
+    return [Case("jwt/decode", _sync(run))]
+
+
+# Случаи с БД
+
+async def _create_users(db, count: int) -> list[int]:
+    from sqlalchemy import insert
+
+    from app.models import User
+
+    result = await db.execute(
+        insert(User).returning(User.id),
+        [
+            {"email": f"{USER_PREFIX}{i}@example.com", "username": f"{USER_PREFIX}{i}", "hashed_password": "-"}
+            for i in range(count)
+        ]
+    )
+    return list(result.scalars())
+
+
+async def _copy_records(db, table: str, columns: list[str], records: list[tuple]) -> None:
+    """COPY через asyncpg в текущей транзакции сессии"""
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def cleanup() -> None:
+    from sqlalchemy import delete
+
+    from app.db.session import async_session_maker
+    from app.models import User
+
+    async with async_session_maker() as db:
+        # Сайты и проверки удаляются каскадом
+        await db.execute(delete(User).where(User.username.like(f"{USER_PREFIX}%")))
+        await db.commit()
+
+
+async def due_cases(sizes: list[int]) -> list[Case]:
+    from sqlalchemy import delete, func, select
+
+    from app.db.session import async_session_maker
+    from app.models import User, Website
+    from app.tasks.monitor import collect_due_checks
+
+    bench_users = select(User.id).where(User.username.like(f"{USER_PREFIX}%"))
+    async with async_session_maker() as db:
+        foreign = await db.scalar(
+            select(func.count()).select_from(Website).where(Website.user_id.not_in(bench_users))
+        )
+        users = list((await db.execute(bench_users)).scalars())
+    if foreign:
+        raise SystemExit(f"Database has {foreign} websites: due/* needs an empty database (see module docstring)")
+
+    async def prepare(size: int) -> None:
+        rng = random.Random(size)
+        now = datetime.now(timezone.utc)
+        async with async_session_maker() as db:
+            await db.execute(delete(Website).where(Website.user_id.in_(bench_users)))
+            columns = ["user_id", "url", "valid_word", "timeout", "check_interval", "is_active", "status",
+                       "last_check", "response_time", "total_checks", "failed_checks", "consecutive_failures",
+                       "failure_threshold", "created_at"]
+            # Примерно половина сайтов просрочена
+            records = [
+                (users[i % len(users)], f"https://site-{i}.example.com/", "ok", 30, 300, True, "online",
+                 now - timedelta(seconds=rng.uniform(0, 600)), rng.uniform(50, 900), 0, 0, 0, 3, now)
+                for i in range(size)
+            ]
+            await _copy_records(db, "websites", columns, records)
+            await db.commit()
+
+    async def run() -> int:
+        async with async_session_maker() as db:
+            await collect_due_checks(db)
+        return 1
+
+    prepared = {"size": None}
+    cases = []
+    for size in sizes:
+        # Данные готовятся перед первым (прогревочным) запуском случая
+        async def run_size(size=size) -> int:
+            if prepared["size"] != size:
+                await prepare(size)
+                prepared["size"] = size
+            return await run()
+
+        label = f"{size // 1_000_000}m" if size >= 1_000_000 else f"{size // 1000}k"
+        cases.append(Case(f"due/{label}", run_size, rounds=3 if size >= 1_000_000 else 5, threshold=DB_THRESHOLD))
+    return cases
+
+
+async def insert_cases(website_id: int) -> list[Case]:
+    from sqlalchemy import insert
+
+    from app.db.session import async_session_maker
+    from app.models import WebsiteCheck
+
+    batch = 1000
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"website_id": website_id, "status": "online", "response_time": 100.0 + i,
+         "status_code": 200, "error_message": None, "checked_at": now}
+        for i in range(batch)
+    ]
+
+    async def orm_add() -> int:
+        async with async_session_maker() as db:
+            db.add_all(WebsiteCheck(**row) for row in rows)
+            await db.commit()
+        return batch
+
+    async def bulk() -> int:
+        async with async_session_maker() as db:
+            await db.execute(insert(WebsiteCheck), rows)
+            await db.commit()
+        return batch
+
+    async def copy() -> int:
+        columns = list(rows[0])
+        async with async_session_maker() as db:
+            await _copy_records(db, "website_checks", columns, [tuple(row.values()) for row in rows])
+            await db.commit()
+        return batch
+
+    return [
+        Case("insert/orm_add", orm_add, threshold=DB_THRESHOLD),
+        Case("insert/bulk", bulk, threshold=DB_THRESHOLD),
+        Case("insert/copy", copy, threshold=DB_THRESHOLD),
+    ]
+
+
+async def auth_cases(user_id: int) -> list[Case]:
+    from app.api.deps import _authenticate
+    from app.core.security import create_access_token
+    from app.db.session import async_session_maker
+
+    token = create_access_token({"sub": str(user_id)})
+
+    async def run() -> int:
+        async with async_session_maker() as db:
+            for _ in range(100):
+                await _authenticate(db, token)
+        return 100
+
+    return [Case("auth/get_current_user", run, threshold=DB_THRESHOLD)]
+
+
+# Запуск и сравнение
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """Регрессии относительно базовых значений"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        limit = base["per_op_us"] * (1 + base.get("threshold", DEFAULT_THRESHOLD))
+        if result["per_op_us"] > limit:
+            regressions.append(
+                f"{name}: {result['per_op_us']:.1f} us > {base['per_op_us']:.1f} us "
+                f"+{base.get('threshold', DEFAULT_THRESHOLD):.0%}"
+            )
+    return regressions
+
+
+async def run_cases(args) -> dict:
+    from sqlalchemy import insert
+
+    from app.db.session import async_session_maker, engine
+    from app.models import Website
+
+    selected = lambda name: not args.only or any(name.startswith(prefix) for prefix in args.only)  # noqa: E731
+    results = {}
+
+    async def run_all(cases: list[Case]) -> None:
+        for case in cases:
+            if not selected(case.name):
+                continue
+            results[case.name] = await measure(case)
+            print(f"  {case.name:<28} {results[case.name]['per_op_us']:>12.1f} us/op", flush=True)
+
+    await run_all(keyword_cases() + fair_share_cases() + history_cases() + jwt_cases())
+    if args.no_db:
+        return results
+
+    await cleanup()
+    try:
+        async with async_session_maker() as db:
+            user_ids = await _create_users(db, max(1, max(args.due_sizes) // 1000))
+            website_id = (await db.execute(
+                insert(Website).returning(Website.id),
+                {"user_id": user_ids[0], "url": "https://example.com/", "valid_word": "ok"}
+            )).scalar()
+            await db.commit()
+
+        await run_all(await insert_cases(website_id) + await auth_cases(user_ids[0]))
+        if selected("due/"):
+            await run_all(await due_cases(args.due_sizes))
+    finally:
+        await cleanup()
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path microbenchmarks")
+    parser.add_argument("--only", type=lambda value: value.split(","), default=None,
+                        help="Префиксы случаев через запятую: keyword,due")
+    parser.add_argument("--no-db", action="store_true", help="Только случаи без БД")
+    parser.add_argument("--due-sizes", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="Записать результаты как базовые")
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    from app.core.logger import logger
+
+    logger.setLevel("WARNING")
+    print("Микробенчмарки (лучшее время операции):")
+    results = asyncio.run(run_cases(args))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.node()}",
+        "cases": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+    if args.save:
+        previous = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"cases": {}}
+        # Частичный прогон (--only, --no-db) обновляет только свои случаи
+        report["cases"] = {**previous.get("cases", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}, run with --save first")
+        return
+
+    regressions = compare(results, json.loads(args.baseline.read_text()))
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+HTTP/2 multiplexing проверок одного origin: число соединений и задержка.
+
+Локальный HTTPS-сервер (ALPN h2 и http/1.1) отдает --paths страниц одного
+origin с задержкой --latency. Проверки идут через _fetch из app.tasks.monitor
+в общей curl-сессии, как в демоне app.probe, в режимах:
+
+    http1.1     сайт отказался от HTTP/2 (Website.http2 = False)
+    h2          HTTP/2 без PIPEWAIT: одновременные запросы открывают свои соединения
+    h2-mux      HTTP/2 с PIPEWAIT (probe_session_options) - один origin, одно соединение
+    fallback    сервер сбрасывает потоки HTTP/2 (RST_STREAM PROTOCOL_ERROR):
+                проверка повторяется по HTTP/1.1, origin запоминается как HTTP/1.1
+
+Для каждого режима печатаются соединения, принятые сервером (по протоколу),
+новые соединения по данным curl (NUM_CONNECTS), задержка проверок и ошибки.
+Сервер работает в отдельном потоке того же процесса.
+
+Нужен пакет h2 (только для бенчмарка):
+    pip install h2
+
+Запуск (из каталога backend, нужны переменные окружения из .env):
+    python -m benchmarks.bench_http2
+    python -m benchmarks.bench_http2 --requests 1000 --concurrency 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.target_farm import generate_certificate
+
+KEYWORD = "h2-ok"
+MODES = ("http1.1", "h2", "h2-mux", "fallback")
+
+
+class Origin:
+    """Один HTTPS origin с HTTP/2 и HTTP/1.1"""
+
+    def __init__(self, latency: float, body_size: int):
+        self.latency = latency
+        self.body = (KEYWORD + " " + "x" * max(body_size - len(KEYWORD) - 1, 0)).encode()
+        self.break_h2 = False
+        self.connections: Counter = Counter()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        protocol = writer.get_extra_info("ssl_object").selected_alpn_protocol() or "http/1.1"
+        self.connections[protocol] += 1
+        try:
+            if protocol == "h2":
+                await self._serve_h2(reader, writer)
+            else:
+                await self._serve_http1(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_http1(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if not head:
+                return
+            await asyncio.sleep(self.latency)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                + f"Content-Length: {len(self.body)}\r\n\r\n".encode()
+                + self.body
+            )
+            await writer.drain()
+
+    async def _serve_h2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        import h2.config
+        import h2.connection
+        import h2.errors
+        import h2.events
+
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+        window_open = asyncio.Event()
+
+        async def respond(stream_id: int) -> None:
+            await asyncio.sleep(self.latency)
+            if self.break_h2:
+                connection.reset_stream(stream_id, error_code=h2.errors.ErrorCodes.PROTOCOL_ERROR)
+            else:
+                while connection.local_flow_control_window(stream_id) < len(self.body):
+                    window_open.clear()
+                    await window_open.wait()
+                connection.send_headers(stream_id, [
+                    (":status", "200"),
+                    ("content-type", "text/plain"),
+                    ("content-length", str(len(self.body))),
+                ])
+                connection.send_data(stream_id, self.body, end_stream=True)
+            writer.write(connection.data_to_send())
+
+        tasks = set()
+        while data := await reader.read(65536):
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    task = asyncio.create_task(respond(event.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif isinstance(event, h2.events.WindowUpdated):
+                    window_open.set()
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            writer.write(connection.data_to_send())
+            await writer.drain()
+
+
+def start_server(origin: Origin, cert: Path, key: Path) -> tuple[int, asyncio.AbstractEventLoop]:
+    """Запускает сервер в отдельном потоке; возвращает порт и loop сервера"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(["h2", "http/1.1"])
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(origin.handle, "127.0.0.1", 0, ssl=context, backlog=1024)
+    )
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server.sockets[0].getsockname()[1], loop
+
+
+async def run_mode(mode: str, origin: Origin, port: int, ca: Path, args) -> dict:
+    from curl_cffi import CurlInfo
+    from curl_cffi.requests import AsyncSession as CurlAsyncSession
+
+    from app.tasks import monitor
+
+    options = monitor.probe_session_options()
+    if mode == "h2":
+        options["curl_options"] = None
+    origin.break_h2 = mode == "fallback"
+    origin.connections.clear()
+    monitor._http1_origins.clear()
+
+    latencies: list[float] = []
+    connects = 0
+    errors: Counter = Counter()
+    versions: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def check(http: CurlAsyncSession, index: int) -> None:
+        nonlocal connects
+        website = SimpleNamespace(
+            url=f"https://localhost:{port}/p/{index % args.paths}",
+            timeout=args.timeout,
+            http2=mode != "http1.1",
+        )
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response, _ = await monitor._fetch(http, website)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            connects += response.infos.get(CurlInfo.NUM_CONNECTS) or 0
+            versions[monitor.HTTP_VERSIONS.get(response.http_version, "unknown")] += 1
+            if KEYWORD not in response.text:
+                errors["no_keyword"] += 1
+
+    start = time.perf_counter()
+    async with monitor.probe_session(**options, max_clients=args.concurrency, verify=str(ca)) as http:
+        await asyncio.gather(*(check(http, i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else [0.0] * 99
+    return {
+        "requests": args.requests,
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "http_versions": dict(versions),
+        "server_connections": dict(origin.connections),
+        "client_new_connections": connects,
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 2),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/2 multiplexing benchmark against a local h2 server")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--paths", type=int, default=50, help="Разных страниц на origin")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка ответа сервера (секунды)")
+    parser.add_argument("--body-size", type=int, default=512)
+    parser.add_argument("--timeout", type=int, default=10)
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=list(MODES))
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        raise SystemExit("bench_http2 needs the h2 package: pip install h2")
+
+    from app.core.logger import logger
+
+    logger.setLevel("ERROR")
+
+    with tempfile.TemporaryDirectory() as directory:
+        ca, cert, key = generate_certificate(Path(directory))
+        origin = Origin(args.latency, args.body_size)
+        port, server_loop = start_server(origin, cert, key)
+
+        report = {}
+        for mode in args.modes:
+            report[mode] = asyncio.run(run_mode(mode, origin, port, ca, args))
+            result = report[mode]
+            connections = ", ".join(f"{protocol}={count}" for protocol, count in result["server_connections"].items())
+            print(
+                f"{mode:<9} connections: server {connections or '-'}, curl {result['client_new_connections']:<4} "
+                f"latency p50 {result['p50_ms']:.1f} ms p95 {result['p95_ms']:.1f} ms max {result['max_ms']:.1f} ms  "
+                f"ok {result['ok']}/{result['requests']} in {result['elapsed_s']:.2f}s"
+                + (f"  errors {result['errors']}" if result["errors"] else "")
+            )
+        server_loop.call_soon_threadsafe(server_loop.stop)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
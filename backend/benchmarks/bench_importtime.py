@@ -0,0 +1,128 @@
+"""
+Время импорта точек входа (python -X importtime) с бюджетами.
+
+Каждая точка входа импортируется в отдельном чистом процессе несколько раз,
+берется лучшее время (кэш .pyc прогрет первым запуском). Печатаются самые
+тяжелые модули (собственное время, без вложенных импортов) и суммарное
+время; точка входа дольше своего бюджета считается регрессией, процесс
+завершается с кодом 1.
+
+Дополнительно проверяется, что API не загружает модули, нужные только
+воркеру (curl_cffi, httpx, app.tasks.monitor, app.probe): если такой модуль
+оказался в sys.modules после import app.main, это тоже ошибка.
+
+Бюджеты сняты на машине разработчика; на медленной машине их можно
+масштабировать через --scale.
+
+Запуск (из каталога backend, нужны переменные окружения из .env):
+    python -m benchmarks.bench_importtime
+    python -m benchmarks.bench_importtime --top 30 --repeat 7
+    python -m benchmarks.bench_importtime --scale 2 --json importtime.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Бюджет (мс) на импорт каждой точки входа
+BUDGETS = {
+    "app.main": 1600.0,
+    "app.core.celery_app": 700.0,
+    "app.tasks.monitor": 1100.0,
+    "app.probe": 1200.0,
+}
+
+# Модули, которые не должны загружаться при импорте точки входа
+FORBIDDEN = {
+    "app.main": ["curl_cffi", "httpx", "app.tasks.monitor", "app.probe"],
+    "app.core.celery_app": ["curl_cffi", "fastapi"],
+}
+
+
+def run_import(module: str) -> tuple[float, dict[str, float], list[str]]:
+    """
+    Импортирует модуль в новом процессе
+
+    Возвращает суммарное время (мс), собственное время модулей (мс)
+    и запрещенные модули, оказавшиеся загруженными.
+    """
+    forbidden = FORBIDDEN.get(module, [])
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {forbidden!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=BACKEND_DIR, env=env, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    total = 0.0
+    self_times: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        self_times[name.strip()] = int(own) / 1000
+        # Модули верхнего уровня (без отступа) в сумме дают полное время
+        if not name[1:].startswith(" "):
+            total += int(cumulative) / 1000
+
+    loaded = [m for m in completed.stdout.strip().split(",") if m]
+    return total, self_times, loaded
+
+
+def measure(module: str, repeat: int) -> dict:
+    run_import(module)  # прогрев .pyc
+    runs = [run_import(module) for _ in range(repeat)]
+    total, self_times, loaded = min(runs, key=lambda item: item[0])
+    return {"total_ms": round(total, 1), "self_ms": self_times, "forbidden_loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrypoint import time audit")
+    parser.add_argument("--only", help="Comma separated entrypoints")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Heaviest modules to print")
+    parser.add_argument("--scale", type=float, default=1.0, help="Budget multiplier")
+    parser.add_argument("--json", type=Path, help="Write report to file")
+    args = parser.parse_args()
+
+    modules = args.only.split(",") if args.only else list(BUDGETS)
+    report = {}
+    failed = False
+    for module in modules:
+        result = measure(module, args.repeat)
+        budget = BUDGETS.get(module, float("inf")) * args.scale
+        over = result["total_ms"] > budget
+        failed |= over or bool(result["forbidden_loaded"])
+
+        print(f"\n{module}: {result['total_ms']:.1f} ms (budget {budget:.0f} ms){'  OVER BUDGET' if over else ''}")
+        if result["forbidden_loaded"]:
+            print(f"  unexpected imports: {', '.join(result['forbidden_loaded'])}")
+        heaviest = sorted(result["self_ms"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, ms in heaviest:
+            print(f"  {ms:8.1f} ms  {name}")
+
+        report[module] = {
+            "total_ms": result["total_ms"],
+            "budget_ms": budget,
+            "forbidden_loaded": result["forbidden_loaded"],
+            "heaviest": dict(heaviest),
+        }
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
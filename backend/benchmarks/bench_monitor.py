@@ -0,0 +1,344 @@
+"""
+Сквозной бенчмарк мониторинга на локальной ферме сайтов.
+
+Поднимает benchmarks.target_farm (HTTP и HTTPS, тысячи сайтов с заданными
+задержками, размерами тела, slowloris, сбросами и таймаутами), заводит в БД
+пользователей и сайты, указывающие на ферму, и прогоняет через них настоящий
+путь проверки: демон app.probe выбирает сайты collect_due_checks, делит их
+планировщиком (claim_checks, аренда в Redis) и проверяет _check_website с
+записью результатов в БД.
+
+Отчет: проверок в секунду, перцентили времени ответа сайта и проверки целиком,
+отставание от расписания, записей в БД в секунду и на проверку, CPU на
+проверку, прирост памяти на 1000 сайтов, а также доля online по поведениям
+фермы (ok-сайты, ушедшие в offline, означают перегрузку проверяющего).
+
+У каждого сайта свое имя site-<id>.bench.test: проверки проходят через DNS-кэш
+(имена отдает локальный DNS-сервер из benchmarks.bench_dns с TTL --dns-ttl
+и задержкой --dns-latency), а соединения и TLS не переиспользуются между
+сайтами, как и в реальном мониторинге. Нужен dnspython.
+
+Нужны PostgreSQL и Redis из настроек. Бенчмарк проверяет все активные сайты
+БД, поэтому запускать его нужно на отдельной (пустой) базе с примененными
+миграциями; при наличии чужих активных сайтов он откажется работать.
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_monitor --sites 5000 --duration 120 --json bench_monitor.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from benchmarks.bench_dns import FakeDNS, start_server as start_dns_server
+from benchmarks.target_farm import add_farm_arguments, generate_certificate, parse_mix, site_profile, site_url
+
+USER_PREFIX = "bench_monitor_"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Target farm did not start on port {port}")
+            time.sleep(0.1)
+
+
+def _rss_mb() -> float:
+    """Текущий RSS процесса, МБ (Linux)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98], "max": max(values)}
+
+
+def start_farm(args, http_port: int, https_port: int, cert: Path, key: Path) -> subprocess.Popen:
+    """Запускает ферму в отдельных процессах, чтобы она не делила CPU с проверяющим"""
+    farm = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.target_farm",
+            "--sites", str(args.sites), "--seed", str(args.seed), "--mix", args.mix,
+            "--latency", args.latency, "--body-size", str(args.body_size),
+            "--port", str(http_port), "--https-port", str(https_port),
+            "--cert", str(cert), "--key", str(key), "--processes", str(args.farm_processes),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    _wait_for_port(http_port)
+    _wait_for_port(https_port)
+    return farm
+
+
+async def setup_sites(args, http_port: int, https_port: int) -> dict[int, str]:
+    """
+    Создает пользователей и сайты фермы
+
+    Returns:
+        dict[int, str]: ID сайта в БД -> поведение сайта на ферме
+    """
+    from sqlalchemy import delete, func, insert, select
+
+    from app.db.session import async_session_maker
+    from app.models import User, Website
+
+    mix = parse_mix(args.mix)
+    async with async_session_maker() as db:
+        await db.execute(delete(User).where(User.username.like(f"{USER_PREFIX}%")))
+        foreign = await db.scalar(select(func.count()).select_from(Website).where(Website.is_active == True))
+        if foreign and not args.allow_foreign_sites:
+            raise SystemExit(
+                f"Database has {foreign} active websites: the benchmark would check them too. "
+                f"Use an empty database or pass --allow-foreign-sites"
+            )
+
+        user_ids = list((await db.execute(
+            insert(User).returning(User.id),
+            [
+                {"email": f"{USER_PREFIX}{i}@example.com", "username": f"{USER_PREFIX}{i}", "hashed_password": "-"}
+                for i in range(args.users)
+            ]
+        )).scalars())
+
+        rows, behaviours = [], []
+        for site in range(args.sites):
+            profile = site_profile(site, args.seed, mix, args.latency, args.body_size, args.https_share)
+            rows.append({
+                "user_id": user_ids[site % len(user_ids)],
+                "url": site_url(site, https_port if profile.https else http_port, profile.https),
+                "name": f"farm-{site}",
+                "valid_word": "farm-ok",
+                "timeout": args.timeout,
+                "check_interval": args.interval,
+                "status": "pending",
+            })
+            behaviours.append(profile.behaviour)
+
+        website_ids = list((await db.execute(insert(Website).returning(Website.id), rows)).scalars())
+        await db.commit()
+    return dict(zip(website_ids, behaviours))
+
+
+async def cleanup_sites() -> None:
+    from sqlalchemy import delete
+
+    from app.db.session import async_session_maker, engine
+    from app.models import User
+
+    async with async_session_maker() as db:
+        # Сайты и история проверок удаляются каскадом
+        await db.execute(delete(User).where(User.username.like(f"{USER_PREFIX}%")))
+        await db.commit()
+    await engine.dispose()
+
+
+async def run_benchmark(args, sites: dict[int, str], ca: Path) -> dict:
+    from curl_cffi.requests import AsyncSession as CurlAsyncSession
+    from sqlalchemy import event, select
+
+    from app.db.session import async_session_maker, engine
+    from app.models import WebsiteCheck
+    from app.probe import ProbeDaemon
+    from app.tasks.monitor import probe_session, probe_session_options
+
+    class BenchDaemon(ProbeDaemon):
+        """Демон проверок с замером каждой проверки"""
+
+        def __init__(self):
+            super().__init__(args.concurrency, args.poll_interval, drain_timeout=args.timeout * 2)
+            self.durations: list[float] = []
+            self.lags: list[float] = []
+
+        def _session(self) -> CurlAsyncSession:
+            # Сертификат фермы подписан ее собственным корневым сертификатом
+            return probe_session(**probe_session_options(), max_clients=self.concurrency, verify=str(ca))
+
+        async def _run_check(self, website_id: int, client: CurlAsyncSession, planned_last_check: float) -> None:
+            if planned_last_check:
+                # Как SCHEDULER_LAG: насколько позже срока началась проверка
+                self.lags.append(time.time() - planned_last_check - args.interval)
+            start = time.perf_counter()
+            await super()._run_check(website_id, client, planned_last_check)
+            self.durations.append(time.perf_counter() - start)
+
+    writes = Counter()
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_writes(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE"):
+            writes[verb] += len(parameters) if executemany else 1
+
+    daemon = BenchDaemon()
+    peak_rss = baseline_rss = _rss_mb()
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, _rss_mb())
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_memory())
+    asyncio.get_running_loop().call_later(args.duration, daemon.stop)
+    started_at = time.time()
+    cpu_start = _cpu_seconds()
+    await daemon.run()
+    elapsed = time.time() - started_at
+    cpu = _cpu_seconds() - cpu_start
+    sampler.cancel()
+    event.remove(engine.sync_engine, "before_cursor_execute", count_writes)
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(WebsiteCheck.website_id, WebsiteCheck.status, WebsiteCheck.response_time)
+            .where(WebsiteCheck.website_id.in_(list(sites)))
+        )
+        checks = result.all()
+
+    by_behaviour: dict[str, Counter] = defaultdict(Counter)
+    for website_id, status, _ in checks:
+        by_behaviour[sites[website_id]][status] += 1
+    response_times = [response_time / 1000 for _, _, response_time in checks if response_time is not None]
+    total_writes = sum(writes.values())
+
+    return {
+        "sites": len(sites),
+        "duration": elapsed,
+        "checks": len(checks),
+        "checks_per_second": len(checks) / elapsed,
+        "response_time": _percentiles(response_times),
+        "check_duration": _percentiles(daemon.durations),
+        "scheduler_lag": _percentiles(daemon.lags),
+        "db_writes": dict(writes),
+        "db_writes_per_second": total_writes / elapsed,
+        "db_writes_per_check": total_writes / max(len(checks), 1),
+        "cpu_ms_per_check": cpu * 1000 / max(len(checks), 1),
+        "rss_baseline_mb": baseline_rss,
+        "rss_peak_mb": peak_rss,
+        "memory_per_1k_sites_mb": (peak_rss - baseline_rss) * 1000 / len(sites),
+        "by_behaviour": {name: dict(counts) for name, counts in sorted(by_behaviour.items())},
+    }
+
+
+def print_report(result: dict) -> None:
+    def line(title: str, values: dict, unit: str = "мс", scale: float = 1000, digits: int = 0) -> None:
+        if not values:
+            print(f"  {title:<24} нет данных")
+            return
+        parts = ", ".join(f"{name} {value * scale:.{digits}f}" for name, value in values.items())
+        print(f"  {title:<24} {parts} {unit}")
+
+    print(f"Сайтов: {result['sites']}, прогон {result['duration']:.0f} с, проверок {result['checks']}\n")
+    print(f"  {'проверок в секунду':<24} {result['checks_per_second']:.1f}")
+    line("ответ сайта", result["response_time"])
+    line("проверка целиком", result["check_duration"])
+    line("отставание от срока", result["scheduler_lag"], unit="с", scale=1, digits=1)
+    print(f"  {'записей в БД':<24} {result['db_writes_per_second']:.1f}/с, "
+          f"{result['db_writes_per_check']:.2f} на проверку ({result['db_writes']})")
+    print(f"  {'CPU на проверку':<24} {result['cpu_ms_per_check']:.2f} мс")
+    print(f"  {'память на 1000 сайтов':<24} {result['memory_per_1k_sites_mb']:.1f} МБ "
+          f"(RSS {result['rss_baseline_mb']:.0f} -> {result['rss_peak_mb']:.0f} МБ)")
+    print("\n  Результаты по поведению сайтов фермы:")
+    for behaviour, counts in result["by_behaviour"].items():
+        total = sum(counts.values())
+        print(f"    {behaviour:<12} проверок {total:>6}, online {counts.get('online', 0) / total:.0%}")
+
+
+async def main_async(args, ca: Path, http_port: int, https_port: int) -> dict:
+    sites = await setup_sites(args, http_port, https_port)
+    try:
+        return await run_benchmark(args, sites, ca)
+    finally:
+        if not args.keep:
+            await cleanup_sites()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end monitor benchmark against a local target farm")
+    add_farm_arguments(parser)
+    parser.add_argument("--https-share", type=float, default=0.2, help="Доля HTTPS сайтов")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=30, help="check_interval сайтов, секунды")
+    parser.add_argument("--timeout", type=int, default=5, help="Таймаут проверки сайтов, секунды")
+    parser.add_argument("--duration", type=float, default=90, help="Длительность прогона, секунды")
+    parser.add_argument("--concurrency", type=int, default=None, help="По умолчанию PROBE_CONCURRENCY")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--farm-processes", type=int, default=1)
+    parser.add_argument("--dns-ttl", type=int, default=300, help="TTL записей сайтов фермы, секунды")
+    parser.add_argument("--dns-latency", type=float, default=0.002, help="Задержка ответа DNS, секунды")
+    parser.add_argument("--log-level", default="WARNING", help="Уровень логов приложения во время прогона")
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить результат в JSON")
+    parser.add_argument("--keep", action="store_true", help="Не удалять тестовых пользователей и сайты")
+    parser.add_argument("--allow-foreign-sites", action="store_true")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.core.logger import logger
+    from app.services import dns_cache
+
+    logger.setLevel(args.log_level)
+    if args.concurrency is None:
+        args.concurrency = settings.PROBE_CONCURRENCY
+
+    # Имена сайтов фермы резолвит локальный DNS-сервер
+    resolver = dns_cache._resolver()
+    if resolver is None:
+        raise SystemExit("bench_monitor needs the dnspython package: pip install dnspython")
+    dns_port, dns_loop = start_dns_server(FakeDNS(args.dns_ttl, args.dns_latency, args.dns_latency))
+    resolver.nameservers = ["127.0.0.1"]
+    resolver.port = dns_port
+
+    http_port, https_port = _free_port(), _free_port()
+    with tempfile.TemporaryDirectory(prefix="target_farm_") as directory:
+        ca, cert, key = generate_certificate(Path(directory))
+        farm = start_farm(args, http_port, https_port, cert, key)
+        try:
+            try:
+                import uvloop
+                uvloop.install()
+            except ImportError:
+                pass
+            result = asyncio.run(main_async(args, ca, http_port, https_port))
+        finally:
+            farm.terminate()
+            farm.wait()
+            dns_loop.call_soon_threadsafe(dns_loop.stop)
+
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
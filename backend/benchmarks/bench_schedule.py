@@ -0,0 +1,219 @@
+"""
+Память и время тика компактного расписания (app.services.schedule) на 1M сайтов.
+
+Что измеряется:
+    build      заполнение Schedule из строк (как при потоковой загрузке), время и размер массивов
+    due        выборка просроченных сайтов (numpy, если установлен, иначе цикл по array)
+    tick       due + fair_share - вся работа планировщика в памяти за один тик
+    orm        для сравнения: память и время прежней выборки по ORM-объектам Website
+               (меряется на --orm-sample сайтах и пересчитывается на полный размер)
+    load       (--db) load_schedule из БД: потоковое чтение server-side cursor,
+               время и пик памяти Python (tracemalloc)
+
+Для --db нужна отдельная пустая база с примененными миграциями (см. bench_hotpaths):
+сайты создаются COPY и удаляются после замера.
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_schedule
+    python -m benchmarks.bench_schedule --sites 1000000 --db
+    python -m benchmarks.bench_schedule --json schedule.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+
+# Доля сайтов, которые пора проверить, в синтетических данных
+DUE_SHARE = 0.05
+
+
+def synthetic_rows(count: int, users: int, now: datetime, seed: int = 1):
+    """Строки (id, user_id, last_check, created_at, interval, response_time, timeout) как из load_schedule"""
+    rng = random.Random(seed)
+    for website_id in range(1, count + 1):
+        interval = 300
+        # DUE_SHARE сайтов просрочено, остальные проверены недавно
+        if rng.random() < DUE_SHARE:
+            last_check = now - timedelta(seconds=interval + rng.uniform(0, 600))
+        else:
+            last_check = now - timedelta(seconds=rng.uniform(0, interval))
+        yield website_id, website_id % users + 1, last_check, now, interval, rng.uniform(50, 900), 30
+
+
+def best(run, rounds: int) -> tuple[float, object]:
+    """Лучшее время из rounds запусков и результат последнего"""
+    timings = []
+    result = None
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def bench_schedule(sites: int, users: int, budget: int, rounds: int) -> dict:
+    from app.services.schedule import Schedule, numpy
+    from app.services.scheduler import fair_share
+
+    now = datetime.now(timezone.utc)
+
+    # Строки приходят пачками, как из server-side cursor; время генерации не учитывается
+    rows = synthetic_rows(sites, users, now)
+    schedule = Schedule()
+    build_seconds = 0.0
+    while batch := list(islice(rows, 10_000)):
+        start = time.perf_counter()
+        for row in batch:
+            schedule.append(*row)
+        build_seconds += time.perf_counter() - start
+
+    timestamp = now.timestamp()
+    due_seconds, due = best(lambda: schedule.due(timestamp), rounds)
+    tick_seconds, _ = best(lambda: fair_share(schedule.due(timestamp), budget, {}), rounds)
+
+    return {
+        "sites": sites,
+        "due": len(due),
+        "numpy": numpy is not None,
+        "arrays_bytes": schedule.nbytes,
+        "bytes_per_site": round(schedule.nbytes / sites, 1),
+        "build_s": round(build_seconds, 3),
+        "due_ms": round(due_seconds * 1000, 2),
+        "tick_ms": round(tick_seconds * 1000, 2),
+    }
+
+
+def bench_orm(sample: int, sites: int, users: int, rounds: int) -> dict:
+    """Прежний путь: ORM-объекты Website и цикл по ним (collect_due_checks до расписания)"""
+    from app.core.config import settings
+    from app.models import Website
+    from app.services.scheduler import MIN_CHECK_COST, DueCheck
+
+    now = datetime.now(timezone.utc)
+
+    gc.collect()
+    tracemalloc.start()
+    websites = [
+        Website(id=website_id, user_id=user_id, last_check=last_check, created_at=created_at,
+                check_interval=interval, response_time=response_time, timeout=timeout,
+                url=f"https://site-{website_id}.example.com/", valid_word="ok", status="online",
+                name=None, telegram_chat_id=None, is_active=True, failure_threshold=3,
+                error_message=None, total_checks=0, failed_checks=0, consecutive_failures=0)
+        for website_id, user_id, last_check, created_at, interval, response_time, timeout
+        in synthetic_rows(sample, users, now)
+    ]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def collect() -> list:
+        due = []
+        for website in websites:
+            overdue = (now - website.last_check).total_seconds() - website.check_interval
+            if overdue < 0:
+                continue
+            cost = website.response_time / 1000 if website.response_time is not None \
+                else float(website.timeout or settings.DEFAULT_TIMEOUT)
+            due.append(DueCheck(website.id, website.user_id, overdue, max(cost, MIN_CHECK_COST),
+                                website.last_check.timestamp()))
+        return due
+
+    due_seconds, _ = best(collect, rounds)
+    scale = sites / sample
+    # Загруженные из БД объекты тяжелее: у сессии еще identity map и снимки состояния
+    return {
+        "sample": sample,
+        "bytes_per_site": round(current / sample, 1),
+        "estimated_bytes": int(current * scale),
+        "estimated_due_ms": round(due_seconds * scale * 1000, 2),
+    }
+
+
+async def bench_load(sites: int, users: int) -> dict:
+    from app.db.session import async_session_maker, engine
+    from app.services.schedule import load_schedule
+    from benchmarks.bench_hotpaths import _copy_records, _create_users, cleanup
+
+    now = datetime.now(timezone.utc)
+    await cleanup()
+    try:
+        async with async_session_maker() as db:
+            user_ids = await _create_users(db, users)
+            columns = ["user_id", "url", "valid_word", "timeout", "check_interval", "is_active", "status",
+                       "last_check", "response_time", "created_at"]
+            records = [
+                (user_ids[user_id - 1], f"https://site-{website_id}.example.com/", "ok", timeout, interval,
+                 True, "online", last_check, response_time, created_at)
+                for website_id, user_id, last_check, created_at, interval, response_time, timeout
+                in synthetic_rows(sites, users, now)
+            ]
+            await _copy_records(db, "websites", columns, records)
+            await db.commit()
+            del records
+
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        async with async_session_maker() as db:
+            schedule = await load_schedule(db)
+        load_seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "sites": len(schedule),
+            "load_s": round(load_seconds, 3),
+            "load_peak_bytes": peak,
+        }
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact schedule memory and tick benchmark")
+    parser.add_argument("--sites", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--budget", type=int, default=5000, help="Проверок за тик (fair_share)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--orm-sample", type=int, default=20_000)
+    parser.add_argument("--db", action="store_true", help="Замерить load_schedule из БД")
+    parser.add_argument("--json", type=Path, default=None, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    from app.core.logger import logger
+
+    logger.setLevel("WARNING")
+    mb = 1024 * 1024
+
+    report = {"schedule": bench_schedule(args.sites, args.users, args.budget, args.rounds)}
+    schedule = report["schedule"]
+    print(f"Schedule, {schedule['sites']} sites ({schedule['due']} due, numpy={schedule['numpy']}):")
+    print(f"  arrays      {schedule['arrays_bytes'] / mb:8.1f} MB  ({schedule['bytes_per_site']} B/site)")
+    print(f"  build       {schedule['build_s']:8.3f} s")
+    print(f"  due         {schedule['due_ms']:8.2f} ms")
+    print(f"  tick        {schedule['tick_ms']:8.2f} ms  (due + fair_share, budget {args.budget})")
+
+    report["orm"] = bench_orm(min(args.orm_sample, args.sites), args.sites, args.users, args.rounds)
+    orm = report["orm"]
+    print(f"ORM objects (sample {orm['sample']}, scaled to {args.sites}):")
+    print(f"  memory      {orm['estimated_bytes'] / mb:8.1f} MB  ({orm['bytes_per_site']} B/site)")
+    print(f"  due         {orm['estimated_due_ms']:8.2f} ms")
+
+    if args.db:
+        report["load"] = asyncio.run(bench_load(args.sites, args.users))
+        load = report["load"]
+        print(f"load_schedule from DB, {load['sites']} sites:")
+        print(f"  load        {load['load_s']:8.3f} s   (peak {load['load_peak_bytes'] / mb:.1f} MB)")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
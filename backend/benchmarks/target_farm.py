@@ -0,0 +1,392 @@
+"""
+Локальная ферма тестовых сайтов для бенчмарков мониторинга.
+
+Один asyncio-сервер (HTTP и, по желанию, HTTPS) изображает тысячи сайтов:
+у каждого сайта свое имя site-<id>.bench.test (сайт выбирается по заголовку
+Host, без него - по пути /s/<id>), поведение каждого сайта детерминированно
+выводится из его номера и seed, поэтому бенчмарк заранее знает, какой
+результат проверки ожидать. Имена должны резолвиться в адрес фермы
+(bench_monitor поднимает для них DNS-сервер). Поведения:
+
+    ok          - 200, в теле есть ключевое слово
+    no_keyword  - 200 без ключевого слова
+    error       - 500
+    slowloris   - заголовки сразу, тело по байту в секунду (проверка упирается в таймаут)
+    reset       - соединение сбрасывается (RST) после задержки
+    timeout     - запрос принимается, ответа нет
+
+Задержка ответа каждого сайта берется из распределения (--latency):
+fixed:0.1, uniform:0.05,0.5, exp:0.2, lognormal:0.1,0.8 (медиана, sigma) - и
+меняется от запроса к запросу в пределах ±20%. Размер тела - логнормальный
+с медианой --body-size.
+
+Запуск отдельно (из каталога backend):
+    python -m benchmarks.target_farm --sites 5000 --port 8800 --https-port 8843 --processes 2
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import math
+import multiprocessing
+import random
+import signal
+import socket
+import ssl
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+KEYWORD = "farm-ok"
+# Имена сайтов: site-<id>.bench.test
+SITE_DOMAIN = "bench.test"
+SITE_PREFIX = "site-"
+BEHAVIOURS = ("ok", "no_keyword", "error", "slowloris", "reset", "timeout")
+DEFAULT_MIX = "ok=0.85,no_keyword=0.04,error=0.04,slowloris=0.02,reset=0.02,timeout=0.03"
+DEFAULT_LATENCY = "lognormal:0.08,0.7"
+
+# Пауза между байтами тела для slowloris
+SLOWLORIS_INTERVAL = 1.0
+# Размер тела округляется до килобайта, чтобы тела можно было кэшировать
+BODY_STEP = 1024
+
+
+class SiteProfile(NamedTuple):
+    """Поведение одного тестового сайта"""
+    behaviour: str
+    latency: float  # Базовая задержка ответа, секунды
+    body_size: int  # Байт
+    https: bool
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """ok=0.9,timeout=0.1 -> доли поведений (нормируются к 1)"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, share = item.partition("=")
+        name = name.strip()
+        if name not in BEHAVIOURS:
+            raise ValueError(f"Unknown behaviour '{name}', expected one of {', '.join(BEHAVIOURS)}")
+        mix[name] = float(share)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Behaviour mix is empty")
+    return {name: share / total for name, share in mix.items()}
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """Случайная задержка из распределения вида kind:param1,param2"""
+    kind, _, params = spec.partition(":")
+    args = [float(value) for value in params.split(",") if value]
+    if kind == "fixed":
+        return args[0]
+    if kind == "uniform":
+        return rng.uniform(args[0], args[1])
+    if kind == "exp":
+        return rng.expovariate(1 / args[0])
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Unknown latency distribution '{kind}'")
+
+
+def site_profile(
+        site_id: int,
+        seed: int = 1,
+        mix: dict[str, float] | None = None,
+        latency: str = DEFAULT_LATENCY,
+        body_size: int = 16 * 1024,
+        https_share: float = 0.0
+) -> SiteProfile:
+    """Поведение сайта site_id - одинаковое в ферме и в бенчмарке при одинаковых параметрах"""
+    rng = random.Random(seed * 1_000_003 + site_id)
+    mix = mix or parse_mix(DEFAULT_MIX)
+    behaviour = rng.choices(list(mix), weights=list(mix.values()))[0]
+    size = int(rng.lognormvariate(math.log(body_size), 0.8)) if body_size > 0 else 0
+    return SiteProfile(
+        behaviour=behaviour,
+        latency=sample_latency(latency, rng),
+        body_size=max(BODY_STEP, round(size / BODY_STEP) * BODY_STEP) if size else 0,
+        https=rng.random() < https_share,
+    )
+
+
+def site_url(site_id: int, port: int, https: bool) -> str:
+    """URL сайта фермы: свой hostname у каждого сайта, как у настоящих сайтов"""
+    return f"{'https' if https else 'http'}://{SITE_PREFIX}{site_id}.{SITE_DOMAIN}:{port}/"
+
+
+def generate_certificate(directory: Path) -> tuple[Path, Path, Path]:
+    """
+    Корневой сертификат фермы и подписанный им сертификат для 127.0.0.1, localhost и *.bench.test
+
+    Корневой сертификат передается проверяющему как verify=<путь>, и проверка
+    TLS проходит без ее отключения.
+
+    Returns:
+        tuple[Path, Path, Path]: корневой сертификат, сертификат сервера, ключ сервера
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def build(subject: str, issuer: x509.Name, public_key, ca: bool) -> x509.CertificateBuilder:
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)]))
+            .issuer_name(issuer)
+            .public_key(public_key)
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=7))
+            .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+        )
+        if not ca:
+            builder = builder.add_extension(
+                x509.SubjectAlternativeName([
+                    x509.DNSName("localhost"),
+                    x509.DNSName(f"*.{SITE_DOMAIN}"),
+                    x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+                ]),
+                critical=False,
+            )
+        return builder
+
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "target-farm-ca")])
+    ca_cert = build("target-farm-ca", ca_name, ca_key.public_key(), ca=True).sign(ca_key, hashes.SHA256())
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    cert = build("target-farm", ca_name, key.public_key(), ca=False).sign(ca_key, hashes.SHA256())
+
+    directory.mkdir(parents=True, exist_ok=True)
+    ca_path = directory / "farm-ca.crt"
+    cert_path = directory / "farm.crt"
+    key_path = directory / "farm.key"
+    ca_path.write_bytes(ca_cert.public_bytes(serialization.Encoding.PEM))
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    return ca_path, cert_path, key_path
+
+
+class TargetFarm:
+    """HTTP/HTTPS сервер, отвечающий за все тестовые сайты"""
+
+    def __init__(self, sites: int, seed: int, mix: dict[str, float], latency: str, body_size: int):
+        self.sites = sites
+        self.seed = seed
+        self.mix = mix
+        self.latency = latency
+        self.body_size = body_size
+        self._profiles: dict[int, SiteProfile] = {}
+        self._bodies: dict[tuple[int, bool], bytes] = {}
+        self._rng = random.Random(seed)
+
+    def profile(self, site_id: int) -> SiteProfile:
+        profile = self._profiles.get(site_id)
+        if profile is None:
+            profile = site_profile(site_id, self.seed, self.mix, self.latency, self.body_size)
+            self._profiles[site_id] = profile
+        return profile
+
+    def _body(self, size: int, keyword: bool) -> bytes:
+        """Тело ответа; ключевое слово стоит в середине, чтобы поиск просматривал половину тела"""
+        body = self._bodies.get((size, keyword))
+        if body is None:
+            filler = b"<p>lorem ipsum dolor sit amet</p>\n"
+            text = (filler * (size // len(filler) + 1))[:size]
+            if keyword:
+                middle = size // 2
+                text = text[:middle] + KEYWORD.encode() + text[middle + len(KEYWORD):]
+            body = b"<html><body>\n" + text + b"\n</body></html>\n"
+            self._bodies[(size, keyword)] = body
+        return body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                keep_alive = await self._respond(request, reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Отвечает на один запрос; False - соединение нужно закрыть"""
+        try:
+            site_id = self._site_id(request)
+            if not 0 <= site_id < self.sites:
+                raise ValueError
+        except (IndexError, ValueError):
+            await self._write(writer, 404, b"unknown site\n")
+            return True
+
+        profile = self.profile(site_id)
+        if profile.behaviour == "timeout":
+            # Ждем, пока клиент сам закроет соединение по таймауту
+            await reader.read()
+            return False
+
+        await asyncio.sleep(profile.latency * self._rng.uniform(0.8, 1.2))
+
+        if profile.behaviour == "reset":
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            writer.transport.abort()
+            return False
+
+        if profile.behaviour == "error":
+            await self._write(writer, 500, b"internal server error\n")
+            return True
+
+        body = self._body(profile.body_size, keyword=profile.behaviour != "no_keyword")
+        if profile.behaviour == "slowloris":
+            writer.write(self._headers(200, len(body)))
+            for i in range(len(body)):
+                writer.write(body[i:i + 1])
+                await writer.drain()
+                await asyncio.sleep(SLOWLORIS_INTERVAL)
+            return False
+
+        await self._write(writer, 200, body)
+        return True
+
+    @staticmethod
+    def _site_id(request: bytes) -> int:
+        """Номер сайта из Host (site-<id>.bench.test) или, если его там нет, из пути /s/<id>"""
+        lines = request.decode("latin-1").split("\r\n")
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "host":
+                label = value.strip().split(".", 1)[0]
+                if label.startswith(SITE_PREFIX):
+                    return int(label[len(SITE_PREFIX):])
+                break
+        return int(lines[0].split(" ", 2)[1].split("/")[2])
+
+    @staticmethod
+    def _headers(status: int, length: int) -> bytes:
+        reason = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}[status]
+        return (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: text/html; charset=utf-8\r\n"
+            f"Content-Length: {length}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode()
+
+    async def _write(self, writer: asyncio.StreamWriter, status: int, body: bytes) -> None:
+        writer.write(self._headers(status, len(body)) + body)
+        await writer.drain()
+
+
+async def serve(
+        farm: TargetFarm,
+        host: str,
+        port: int,
+        https_port: int | None,
+        cert: Path | None,
+        key: Path | None
+) -> None:
+    """Запускает серверы фермы и работает до SIGTERM/SIGINT"""
+    servers = [await asyncio.start_server(farm.handle, host, port, reuse_port=True, backlog=4096)]
+    if https_port:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        servers.append(await asyncio.start_server(
+            farm.handle, host, https_port, ssl=context, reuse_port=True, backlog=4096
+        ))
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+    for server in servers:
+        server.close()
+
+
+def run_process(options: dict) -> None:
+    """Один процесс фермы (несколько процессов делят порт через SO_REUSEPORT)"""
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+    farm = TargetFarm(
+        options["sites"], options["seed"], parse_mix(options["mix"]), options["latency"], options["body_size"]
+    )
+    asyncio.run(serve(
+        farm, options["host"], options["port"], options["https_port"], options["cert"], options["key"]
+    ))
+
+
+def add_farm_arguments(parser: argparse.ArgumentParser) -> None:
+    """Параметры фермы (общие с бенчмарком, чтобы профили сайтов совпадали)"""
+    parser.add_argument("--sites", type=int, default=2000, help="Число тестовых сайтов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Доли поведений: ok=0.9,timeout=0.1")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="Распределение задержки ответа")
+    parser.add_argument("--body-size", type=int, default=16 * 1024, help="Медиана размера тела, байт")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local synthetic website farm")
+    add_farm_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--https-port", type=int, default=None)
+    parser.add_argument("--cert", type=Path, default=None, help="Сертификат (без него генерируется в --cert-dir)")
+    parser.add_argument("--key", type=Path, default=None)
+    parser.add_argument("--cert-dir", type=Path, default=Path("/tmp/target_farm"))
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    if args.https_port and args.cert is None:
+        ca, args.cert, args.key = generate_certificate(args.cert_dir)
+        print(f"CA certificate: {ca} (pass it as verify to the checker)", flush=True)
+
+    options = {
+        "sites": args.sites, "seed": args.seed, "mix": args.mix, "latency": args.latency,
+        "body_size": args.body_size, "host": args.host, "port": args.port,
+        "https_port": args.https_port, "cert": args.cert, "key": args.key,
+    }
+    print(
+        f"Serving {args.sites} sites on http://{args.host}:{args.port}/s/<id> "
+        f"and as {SITE_PREFIX}<id>.{SITE_DOMAIN} (Host header)",
+        flush=True,
+    )
+
+    if args.processes <= 1:
+        run_process(options)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_process, args=(options,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
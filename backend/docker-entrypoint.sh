@@ -0,0 +1,15 @@
+#!/bin/sh
+# Каталог метрик Prometheus (multiprocess) у каждого контейнера свой:
+# $PROMETHEUS_MULTIPROC_DIR/$METRICS_INSTANCE. prometheus_client требует пустой
+# каталог при запуске, иначе в /metrics попадают *.db прошлых запусков
+# (PID в контейнерах повторяются). /metrics API собирает все подкаталоги.
+set -e
+
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    export PROMETHEUS_MULTIPROC_ROOT="${PROMETHEUS_MULTIPROC_ROOT:-$PROMETHEUS_MULTIPROC_DIR}"
+    export PROMETHEUS_MULTIPROC_DIR="$PROMETHEUS_MULTIPROC_ROOT/${METRICS_INSTANCE:-$(hostname)}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+exec "$@"
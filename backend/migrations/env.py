@@ -18,6 +18,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 # Импортируем ВСЕ модели чтобы Base.metadata их увидел
 from app.models.user import User
 from app.models.website import Website
+from app.models.notification import NotificationOutbox
 
 config = context.config
 
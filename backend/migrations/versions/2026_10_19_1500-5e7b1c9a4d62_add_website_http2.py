@@ -0,0 +1,28 @@
+"""add website http2
+
+Revision ID: 5e7b1c9a4d62
+Revises: 9d3a7f5c2e18
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7b1c9a4d62'
+down_revision: Union[str, Sequence[str], None] = '9d3a7f5c2e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('websites', sa.Column('http2', sa.Boolean(), server_default='true', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('websites', 'http2')
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Настройки читаются при импорте app.core.config: для тестов хватает заглушек
+for name, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "SECRET_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Файл лога (logs/app.log) открывается относительно текущего каталога при импорте логгера:
+# тесты пишут его во временный каталог, а не в дерево репозитория
+os.chdir(tempfile.mkdtemp(prefix="website_monitor_tests_"))
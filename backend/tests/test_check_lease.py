@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import redis as redis_module
+from app.services.check_lease import _lease_key, acquire_check_leases, release_check_lease
+from app.tasks import dispatch
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(redis_module, "_redis", client)
+    return client
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    tasks = []
+    monkeypatch.setattr(dispatch.celery_app, "send_task", lambda name, **kwargs: tasks.append(kwargs))
+    return tasks
+
+
+def test_manual_check_takes_over_queued_scheduled_check(redis, sent):
+    async def run():
+        assert await acquire_check_leases([1], "scheduler") == [1]
+        assert await dispatch.schedule_check(1)
+        # Плановая проверка завершилась раньше ручной: аренда ручной остается
+        await release_check_lease(1, "scheduler")
+        return await redis.get(_lease_key(1))
+
+    assert asyncio.run(run()) == b"manual"
+    assert len(sent) == 1
+
+
+def test_manual_check_is_deduplicated(redis, sent):
+    async def run():
+        return [await dispatch.schedule_check(1), await dispatch.schedule_check(1)]
+
+    assert asyncio.run(run()) == [True, False]
+    assert len(sent) == 1
+
+
+def test_lease_released_when_send_task_fails(redis, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(dispatch.celery_app, "send_task", broken)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await dispatch.schedule_check(1)
+        return await redis.exists(_lease_key(1))
+
+    assert asyncio.run(run()) == 0
+
+
+def test_undispatched_scheduled_leases_are_released(redis, monkeypatch):
+    from app.tasks import monitor
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def close(self):
+            pass
+
+    async def collect_due_checks(db):
+        return [SimpleNamespace(website_id=website_id, last_check=0.0) for website_id in (1, 2, 3)]
+
+    async def plan_dispatch(due):
+        return await acquire_check_leases([check.website_id for check in due], "scheduler")
+
+    queued = []
+
+    def delay(website_id, **kwargs):
+        if len(queued) == 1:
+            raise ConnectionError("broker unavailable")
+        queued.append(website_id)
+
+    monkeypatch.setattr(monitor.settings, "CHECK_RUNNER", "celery")
+    monkeypatch.setattr(monitor, "async_session_maker", Session)
+    monkeypatch.setattr(monitor, "collect_due_checks", collect_due_checks)
+    monkeypatch.setattr(monitor, "plan_dispatch", plan_dispatch)
+    monkeypatch.setattr(monitor.check_website, "delay", delay)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await monitor._check_all_websites()
+        return [await redis.exists(_lease_key(website_id)) for website_id in (1, 2, 3)]
+
+    assert asyncio.run(run()) == [1, 0, 0]
+    assert queued == [1]
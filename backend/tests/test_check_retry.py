@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.db.session import Base
+from app.models import NotificationOutbox, User, Website, WebsiteCheck
+from app.services import site_state
+from app.tasks import monitor
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("aiosqlite")
+
+
+class NoSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def failing_fetch(http, website):
+    raise RuntimeError("connection refused")
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setattr(settings, "SITE_STATE_STORE", "redis")
+    monkeypatch.setattr(redis_module, "_redis", fakeredis.aioredis.FakeRedis())
+    monkeypatch.setattr(site_state, "_scripts", {})
+    monkeypatch.setattr(monitor, "_fetch", failing_fetch)
+    monkeypatch.setattr(monitor, "probe_session", lambda **kwargs: NoSession())
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(monitor, "async_session_maker", session_maker)
+
+    async def setup() -> int:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with session_maker() as db:
+            user = User(email="user@example.com", username="user", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            website = Website(
+                user_id=user.id, url="https://example.com", valid_word="ok", is_active=True,
+                telegram_chat_id="1", status="online", consecutive_failures=2, failure_threshold=3,
+                total_checks=10, failed_checks=2, check_interval=60, timeout=5,
+            )
+            db.add(website)
+            await db.commit()
+            return website.id
+
+    async def count(model) -> int:
+        async with session_maker() as db:
+            return await db.scalar(select(func.count()).select_from(model))
+
+    return setup, count
+
+
+def test_retry_after_failed_commit_records_check_once(env, monkeypatch):
+    setup, count = env
+    commit = AsyncSession.commit
+
+    async def run():
+        website_id = await setup()
+        calls = []
+
+        async def failing_commit(self):
+            calls.append(self)
+            # Первый commit - после загрузки сайта, второй - строка проверки и outbox
+            if len(calls) == 2:
+                raise ConnectionError("database went away")
+            return await commit(self)
+
+        monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+        with pytest.raises(ConnectionError):
+            await monitor._run_website_check(website_id, None, 0.0, "task-1")
+        monkeypatch.setattr(AsyncSession, "commit", commit)
+
+        # Повтор той же задачи не пропускается по planned_last_check и не считает проверку дважды
+        status = await monitor._run_website_check(website_id, None, 0.0, "task-1")
+        state = (await site_state.load_states([website_id]))[website_id]
+        return status, state, await count(WebsiteCheck), await count(NotificationOutbox)
+
+    status, state, checks, outbox = asyncio.run(run())
+    assert status == "offline"
+    assert (state["total_checks"], state["failed_checks"], state["consecutive_failures"]) == (11, 3, 3)
+    assert state["last_notification_sent"] is not None
+    assert checks == 1
+    assert outbox == 1
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.services import dns_cache
+
+dns_resolver = pytest.importorskip("dns.resolver")
+
+
+class NXDomainResolver:
+    """dnspython не знает имени: так он отвечает на имена из /etc/hosts"""
+
+    async def resolve(self, host, rdtype, raise_on_no_answer=True):
+        raise dns_resolver.NXDOMAIN()
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    dns_cache.clear()
+    yield
+    dns_cache.clear()
+
+
+def test_localhost_names_are_left_to_curl():
+    assert not dns_cache.cacheable("localhost")
+    assert not dns_cache.cacheable("app.localhost")
+    assert not dns_cache.cacheable("127.0.0.1")
+    assert dns_cache.cacheable("example.com")
+
+
+def test_hosts_file_names_fall_back_to_getaddrinfo(monkeypatch):
+    async def hosts_file(host):
+        return ("10.0.0.5",), 60.0
+
+    monkeypatch.setattr(dns_cache, "_resolver", lambda: NXDomainResolver())
+    monkeypatch.setattr(dns_cache, "_query_getaddrinfo", hosts_file)
+
+    addresses, _ = asyncio.run(dns_cache.resolve("db.internal.lan"))
+    assert addresses == ("10.0.0.5",)
+
+
+def test_unknown_names_are_cached_as_missing(monkeypatch):
+    async def not_found(host):
+        raise dns_cache._NotFound("Name or service not known")
+
+    monkeypatch.setattr(dns_cache, "_resolver", lambda: NXDomainResolver())
+    monkeypatch.setattr(dns_cache, "_query_getaddrinfo", not_found)
+
+    for _ in range(2):
+        with pytest.raises(dns_cache.DNSResolutionError):
+            asyncio.run(dns_cache.resolve("missing.example"))
+    assert dns_cache._cache["missing.example"].error is not None
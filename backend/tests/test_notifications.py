@@ -0,0 +1,74 @@
+import re
+from types import SimpleNamespace
+
+from app.services.telegram import TELEGRAM_MESSAGE_LIMIT, telegram_length
+from app.tasks.monitor import _queue_alert_if_needed, _queue_recovery_notification
+from app.tasks.notifications import _build_digest
+
+
+class FakeSession:
+    def __init__(self):
+        self.added = []
+
+    def add(self, instance):
+        self.added.append(instance)
+
+
+def make_website(**fields):
+    defaults = dict(
+        id=1,
+        name="my_site",
+        url="https://example.com/a_b",
+        status="offline",
+        telegram_chat_id="123",
+        response_time=120.0,
+        consecutive_failures=3,
+        failure_threshold=3,
+        last_notification_sent=None,
+        error_message="Timeout *after* 10s [curl_28]",
+    )
+    defaults.update(fields)
+    return SimpleNamespace(**defaults)
+
+
+def assert_valid_markdown(text: str) -> None:
+    """Telegram Markdown: после удаления экранированных символов сущности _ * ` должны быть парными"""
+    plain = re.sub(r"\\[_*`\[]", "", text)
+    for char in "_*`":
+        assert plain.count(char) % 2 == 0, f"unbalanced {char!r} in {text!r}"
+    assert "[" not in plain
+
+
+def test_alert_escapes_site_name_and_error():
+    db = FakeSession()
+    assert _queue_alert_if_needed(make_website(), db)
+
+    notification = db.added[0]
+    assert "my\\_site" in notification.message
+    assert "\\*after\\*" in notification.message
+    assert notification.summary == "🚨 my\\_site - Timeout \\*after\\* 10s \\[curl\\_28]"
+    assert_valid_markdown(notification.message)
+
+
+def test_digest_with_markdown_in_names_is_valid():
+    db = FakeSession()
+    _queue_alert_if_needed(make_website(), db)
+    _queue_recovery_notification(make_website(id=2, name="another_site_", status="online"), db)
+    _queue_recovery_notification(make_website(id=3, name=None, url="https://x.test/my_path"), db)
+
+    digest = _build_digest(db.added)
+    assert "my\\_site" in digest
+    assert "another\\_site\\_" in digest
+    assert "my\\_path" in digest
+    assert_valid_markdown(digest)
+
+
+def test_digest_limit_counts_utf16_code_units():
+    # Каждое 🚨 - две единицы UTF-16: по len() сводка помещалась бы в лимит
+    notifications = [
+        SimpleNamespace(kind="alert", summary="🚨" * 40 + f" site-{i}", message="")
+        for i in range(60)
+    ]
+    digest = _build_digest(notifications)
+    assert telegram_length(digest) <= TELEGRAM_MESSAGE_LIMIT
+    assert "more" in digest
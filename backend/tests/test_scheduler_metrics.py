@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Значение метрики в multiprocess-режиме выбирается при импорте prometheus_client,
+# поэтому тики планировщика идут в отдельном процессе
+TICKS = textwrap.dedent("""
+    from app.services.scheduler import DueCheck, _report_user_lag
+
+    for tick in range(5):
+        # На каждом тике отстают другие 50 пользователей
+        due = [DueCheck(tick * 100 + user, tick * 100 + user, float(user), 1.0, None) for user in range(50)]
+        _report_user_lag(due, due[:10])
+""")
+
+
+def test_user_lag_series_are_bounded_in_multiprocess_mode(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PYTHONPATH": str(BACKEND)}
+    # Логи процесса (logs/app.log) остаются во временном каталоге, а не в дереве репозитория
+    subprocess.run([sys.executable, "-c", TICKS], env=env, cwd=tmp_path, check=True)
+
+    from prometheus_client import CollectorRegistry
+    from prometheus_client.multiprocess import MultiProcessCollector
+
+    from app.services.scheduler import SCHEDULER_LAG_TOP_USERS
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(tmp_path))
+    samples = {
+        (metric.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect()
+        for sample in metric.samples
+        if metric.name.startswith("scheduler_user")
+    }
+
+    overdue = [key for key in samples if key[0] == "scheduler_user_max_overdue_seconds"]
+    assert len(overdue) == SCHEDULER_LAG_TOP_USERS
+    assert all(dict(labels).keys() == {"rank"} for _, labels in overdue)
+    assert samples[("scheduler_user_max_overdue_seconds", (("rank", "1"),))] == 49.0
+    assert samples[("scheduler_users_deferred", ())] == 40.0
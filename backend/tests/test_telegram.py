@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import redis as redis_module
+from app.core.config import settings
+from app.services import telegram
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class FakeTelegram:
+    def __init__(self, status_code: int, description: str = ""):
+        self.status_code = status_code
+        self.description = description
+        self.calls = 0
+
+    async def get(self, method, params=None):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(self.status_code, json={"ok": self.status_code == 200, "description": self.description})
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "token")
+    monkeypatch.setattr(redis_module, "_redis", fakeredis.aioredis.FakeRedis())
+
+    def install(status_code: int, description: str = "") -> FakeTelegram:
+        client = FakeTelegram(status_code, description)
+        monkeypatch.setattr(telegram, "get_telegram_client", lambda: client)
+        return client
+
+    return install
+
+
+def test_concurrent_validations_share_one_request(bot):
+    client = bot(200)
+
+    async def run():
+        return await asyncio.gather(*(telegram.validate_telegram_chat_id("123") for _ in range(20)))
+
+    assert all(asyncio.run(run()))
+    assert client.calls == 1
+
+
+def test_chat_not_found_is_not_cached(bot):
+    client = bot(400, "Bad Request: chat not found")
+    assert not asyncio.run(telegram.validate_telegram_chat_id("123"))
+
+    # Пользователь написал боту: следующая проверка снова идет в Telegram
+    client.status_code = 200
+    assert asyncio.run(telegram.validate_telegram_chat_id("123"))
+    assert client.calls == 2
+
+
+def test_rejected_chat_is_cached(bot):
+    client = bot(403, "Forbidden: bot was blocked by the user")
+    assert not asyncio.run(telegram.validate_telegram_chat_id("123"))
+    assert not asyncio.run(telegram.validate_telegram_chat_id("123"))
+    assert client.calls == 1
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Экспортер выбирается по настройкам при импорте, поэтому трасса пишется в отдельном процессе
+TRACE = textwrap.dedent("""
+    from app.core.logger import stop_logging
+    from app.core.tracing import span
+
+    with span("check", website_id=1):
+        with span("http.probe", url="https://example.com"):
+            pass
+    stop_logging()
+""")
+
+
+def test_file_exporter_writes_through_log_queue(tmp_path):
+    trace_file = tmp_path / "traces" / "traces.jsonl"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND),
+        "TRACE_EXPORTER": "file",
+        "TRACE_SAMPLE_RATE": "1",
+        "TRACE_FILE": str(trace_file),
+        "LOG_LEVEL": "WARNING",
+    }
+    subprocess.run([sys.executable, "-c", TRACE], env=env, cwd=tmp_path, check=True)
+
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [record["name"] for record in records] == ["check", "http.probe"]
+    assert records[0]["phases"].keys() >= {"http.probe"}
+    # В обычный лог трассы не попадают
+    app_log = tmp_path / "logs" / "app.log"
+    assert not app_log.exists() or "trace_id" not in app_log.read_text()